@@ -1,11 +1,32 @@
+import abc
+import bisect
+import gzip
+import hashlib
+import heapq
+import itertools
 import json
+import math
+import mmap
+import os
+import pickle
 import re
 import random
+import secrets
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict, deque
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Dict, Optional, List
-from difflib import get_close_matches
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, List, NamedTuple, Set, Tuple
+from difflib import SequenceMatcher, get_close_matches
 
 INTENTS_FILE = "intents.json"
+ARTEFACTO = str(Path(__file__).resolve().with_name("intents.bin"))  # junto al código, no en el directorio actual
 correcciones_rapidas = {
     "zi": "sí",
     "si": "sí",
@@ -17,501 +38,2240 @@ correcciones_rapidas = {
     "nop": "no",
 }
 
-class HotelChatBot:
+# Palabras de fechas: las reconoce RE_FECHAS, así que el corrector no debe cambiarlas
+MESES = ("enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+         "septiembre", "octubre", "noviembre", "diciembre")
+DIAS_SEMANA = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+PALABRAS_FECHA = ("hoy", "ayer", "mañana", "pasado", "próximo", "próxima", "siguiente", "este", "fin",
+                  "semana", "mes", "viene", "que", "noche", "noches", "día", "días", "del", "al", "año")
+
+# Intents que se atienden primero cuando varios coinciden en el mismo mensaje
+PRIORITY_TAGS = ["problema_habitacion", "emergencia_medica", "objetos_perdidos", "asistencia_general"]
+
+
+
+def tabla_sin_acentos() -> Dict[int, Optional[str]]:
+    """Tabla de traducción que quita acentos, diéresis y tildes (ñ -> n) de las
+    letras latinas, y borra las marcas combinantes sueltas (texto en NFD)."""
+    tabla: Dict[int, Optional[str]] = {}
+    for codigo in range(0xC0, 0x250):
+        letra = chr(codigo)
+        base = "".join(c for c in unicodedata.normalize("NFD", letra) if not unicodedata.combining(c))
+        if base != letra:
+            tabla[codigo] = base
+    for codigo in range(0x300, 0x370):
+        tabla[codigo] = None
+    return tabla
+
+
+# Se calcula una vez al importar; normalizar() es un casefold y un translate
+SIN_ACENTOS = tabla_sin_acentos()
+RE_ESCAPE_O_TEXTO = re.compile(r"\\.|[^\\]+")
+
+
+def normalizar(texto: str) -> str:
+    """Forma en que el bot compara texto: sin mayúsculas ni acentos"""
+    return texto.casefold().translate(SIN_ACENTOS)
+
+
+def normalizar_patron(patron: str) -> str:
+    """normalizar() aplicado a una regex sin tocar los escapes (\\D no es \\d)"""
+    return RE_ESCAPE_O_TEXTO.sub(lambda m: m.group() if m.group()[0] == "\\" else normalizar(m.group()), patron)
+
+# Respaldo estadístico: confianza mínima (coseno) para aceptar un intent que ninguna regex reconoció
+UMBRAL_CLASIFICADOR = 0.25
+MAX_EJEMPLOS_PATRON = 32
+RE_PIEZA_PATRON = re.compile(r"\[([^\]]*)\]|\(([^()]*)\)(\?)?|(\\?.)(\?)?")
+# Con estos metacaracteres no se deduce un literal obligatorio; el patrón se revisa siempre
+RE_SIN_LITERAL = re.compile(r"[*+{}.^$\\]")
+
+
+def literal_obligatorio(patron: str) -> Optional[str]:
+    """Subcadena más larga que aparece en todo texto que coincide con el patrón.
+
+    Sólo se toman tramos de letras fuera de clases, grupos y opcionales.
+    Devuelve None cuando el patrón no garantiza ningún literal (alternativas
+    al nivel superior, cuantificadores, anclas, escapes...). El patrón ya debe
+    venir normalizado, igual que el texto en que se buscará.
+    """
+    if RE_SIN_LITERAL.search(patron):
+        return None
+    profundidad = 0
+    for c in patron:
+        profundidad += (c == "(") - (c == ")")
+        if profundidad < 0 or (c == "|" and profundidad == 0):
+            return None
+    if profundidad:
+        return None
+
+    tramos = [""]
+    for clase, grupo, grupo_opcional, letra, letra_opcional in RE_PIEZA_PATRON.findall(patron):
+        if letra and not letra_opcional and letra not in "()[]|?":
+            tramos[-1] += letra
+        else:
+            tramos.append("")
+    return max(tramos, key=len) or None
+
+
+class AutomataLiterales:
+    """Autómata de Aho-Corasick: encuentra en una sola pasada por el texto
+    todos los literales registrados y devuelve las claves asociadas a ellos."""
+
+    def __init__(self, literales: Iterable[Tuple[str, int]]):
+        self.transiciones: List[Dict[str, int]] = [{}]
+        salidas: List[Set[int]] = [set()]
+        for literal, clave in literales:
+            nodo = 0
+            for c in literal:
+                siguiente = self.transiciones[nodo].get(c)
+                if siguiente is None:
+                    siguiente = len(self.transiciones)
+                    self.transiciones[nodo][c] = siguiente
+                    self.transiciones.append({})
+                    salidas.append(set())
+                nodo = siguiente
+            salidas[nodo].add(clave)
+
+        # Enlaces de fallo por niveles; cada nodo hereda las salidas de su sufijo
+        self.fallo = [0] * len(self.transiciones)
+        cola = deque(self.transiciones[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for c, hijo in self.transiciones[nodo].items():
+                cola.append(hijo)
+                f = self.fallo[nodo]
+                while f and c not in self.transiciones[f]:
+                    f = self.fallo[f]
+                destino = self.transiciones[f].get(c, 0)
+                self.fallo[hijo] = destino if destino != hijo else 0
+                salidas[hijo] |= salidas[self.fallo[hijo]]
+        self.salidas: List[FrozenSet[int]] = [frozenset(s) for s in salidas]
+
+    def buscar(self, texto: str) -> Set[int]:
+        transiciones, fallo, salidas = self.transiciones, self.fallo, self.salidas
+        encontradas: Set[int] = set()
+        nodo = 0
+        for c in texto:
+            while nodo and c not in transiciones[nodo]:
+                nodo = fallo[nodo]
+            nodo = transiciones[nodo].get(c, 0)
+            if salidas[nodo]:
+                encontradas |= salidas[nodo]
+        return encontradas
+
+
+class Instrumentacion:
+    """Contadores e histogramas de latencia por etapa del pipeline.
+
+    Es opcional: el bot, el matcher y los correctores reciben None por omisión
+    y entonces no miden ni cuentan nada. Los histogramas usan cubetas fijas
+    (en nanosegundos) para que observar un valor sea un bisect y una suma.
+
+    Los turnos se miden en el hilo del ejecutor y /metricas se lee en el del
+    servidor: un nombre nuevo sólo se agrega bajo el lock, y las lecturas
+    copian bajo el mismo lock, así nunca recorren un dict que cambia de
+    tamaño. Contar u observar en un nombre que ya existe no toma el lock.
+    """
+
+    LIMITES_NS = (5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000,
+                  1_000_000, 2_500_000, 5_000_000, 10_000_000, 50_000_000)
+
     def __init__(self):
+        self.contadores: Dict[str, int] = {}
+        # etapa -> [cubeta_0 .. cubeta_n, +Inf, suma_ns]
+        self.histogramas: Dict[str, List[int]] = {}
+        self.lock = threading.Lock()
+
+    def contar(self, nombre: str, n: int = 1):
+        if nombre in self.contadores:
+            self.contadores[nombre] += n
+        else:
+            with self.lock:
+                self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def observar(self, etapa: str, ns: int):
+        histograma = self.histogramas.get(etapa)
+        if histograma is None:
+            with self.lock:
+                histograma = self.histogramas.setdefault(etapa, [0] * (len(self.LIMITES_NS) + 2))
+        histograma[bisect.bisect_left(self.LIMITES_NS, ns)] += 1
+        histograma[-1] += ns
+
+    def copia_contadores(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.contadores)
+
+    def percentil(self, etapa: str, p: float) -> float:
+        """Percentil p (0-100) estimado del histograma, en segundos, interpolando
+        dentro de la cubeta como histogram_quantile de Prometheus"""
+        histograma = self.histogramas.get(etapa)
+        if not histograma:
+            return 0.0
+        total = sum(histograma[:-1])
+        objetivo = p / 100 * total
+        acumulado = 0
+        for i, cuenta in enumerate(histograma[:-1]):
+            if cuenta and acumulado + cuenta >= objetivo:
+                if i == len(self.LIMITES_NS):
+                    return self.LIMITES_NS[-1] / 1e9  # cubeta +Inf: sólo se sabe el límite inferior
+                inferior = self.LIMITES_NS[i - 1] if i else 0
+                return (inferior + (self.LIMITES_NS[i] - inferior) * (objetivo - acumulado) / cuenta) / 1e9
+            acumulado += cuenta
+        return 0.0
+
+    def etapas(self) -> Dict[str, Dict]:
+        """Histograma acumulado de cada etapa, en segundos como en Prometheus"""
+        resultado = {}
+        with self.lock:
+            histogramas = [(etapa, list(histograma)) for etapa, histograma in self.histogramas.items()]
+        for etapa, histograma in histogramas:
+            cubetas = list(itertools.accumulate(histograma[:-1]))
+            resultado[etapa] = {
+                "cubetas": dict(zip([f"{l / 1e9:g}" for l in self.LIMITES_NS] + ["+Inf"], cubetas)),
+                "suma_s": histograma[-1] / 1e9,
+                "total": cubetas[-1],
+            }
+        return resultado
+
+
+def formato_prometheus(metricas: Dict, prefijo: str = "chatbot") -> str:
+    """Texto de exposición de Prometheus a partir de HotelChatBot.metricas()"""
+    lineas = []
+    for nombre, valor in sorted(metricas["contadores"].items()):
+        lineas.append(f"# TYPE {prefijo}_{nombre}_total counter")
+        lineas.append(f"{prefijo}_{nombre}_total {valor}")
+
+    lineas.append(f"# TYPE {prefijo}_etapa_segundos histogram")
+    for etapa, datos in metricas["etapas"].items():
+        for limite, acumulado in datos["cubetas"].items():
+            lineas.append(f'{prefijo}_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+        lineas.append(f'{prefijo}_etapa_segundos_sum{{etapa="{etapa}"}} {datos["suma_s"]:.9f}')
+        lineas.append(f'{prefijo}_etapa_segundos_count{{etapa="{etapa}"}} {datos["total"]}')
+
+    lineas.append(f"# TYPE {prefijo}_estado_llamadas_total counter")
+    lineas.append(f"# TYPE {prefijo}_estado_segundos_max gauge")
+    for nombre, datos in metricas["estados"].items():
+        lineas.append(f'{prefijo}_estado_llamadas_total{{estado="{nombre}"}} {datos["llamadas"]}')
+        lineas.append(f'{prefijo}_estado_segundos_max{{estado="{nombre}"}} {datos["max_us"] / 1e6:.9f}')
+    return "\n".join(lineas) + "\n"
+
+
+class IntentMatcher:
+    """Índice de patrones compilado una sola vez al cargar los intents.
+
+    Cada intent se compila en una sola regex (alternancia de sus patrones), así
+    un mensaje se revisa con una búsqueda por intent en lugar de una por patrón,
+    sin depender de la caché interna de `re`. En vez de re.IGNORECASE (que es
+    varias veces más lento con alternancias largas) los patrones se normalizan
+    al compilar, y el texto llega ya normalizado (normalizar()) una vez por mensaje.
+
+    Antes de las regex, un autómata de Aho-Corasick busca el literal
+    obligatorio de cada patrón; sólo se ejecutan las regex de los intents con
+    algún literal presente (y las de los que tienen patrones sin literal).
+    """
+
+    def __init__(self, intents: List[Dict]):
+        self.tablas = []
+        literales = []
+        self.siempre: Set[int] = set()  # tablas con algún patrón sin literal obligatorio
+        self.patrones_por_tabla: List[int] = []
+        for intent in intents:
+            patrones = intent.get("patterns", [])
+            if not patrones:
+                continue
+            k = len(self.tablas)
+            patrones = [normalizar_patron(p) for p in patrones]
+            combinada = "|".join(f"(?:{p})" for p in patrones)
+            self.tablas.append((intent, re.compile(combinada)))
+            self.patrones_por_tabla.append(len(patrones))
+            for patron in patrones:
+                literal = literal_obligatorio(patron)
+                if literal is None:
+                    self.siempre.add(k)
+                else:
+                    literales.append((literal, k))
+        self.automata = AutomataLiterales(literales)
+        self.prioridad = {tag: i for i, tag in enumerate(PRIORITY_TAGS)}
+        # Patrones sueltos por intent, sólo para reportar cuál coincidió (se compilan al pedirse)
+        self.sueltos: Dict[int, List] = {}
+
+    def coincidencias(self, text: str, inst: Optional[Instrumentacion] = None) -> List[Dict]:
+        """Todos los intents que coinciden con el texto normalizado, en el orden de intents.json"""
+        candidatas = self.automata.buscar(text)
+        if self.siempre:
+            candidatas |= self.siempre
+        if inst is not None:
+            inst.contar("intents_candidatos", len(candidatas))
+            inst.contar("patrones_probados", sum(self.patrones_por_tabla[k] for k in candidatas))
+        tablas = self.tablas
+        return [tablas[k][0] for k in sorted(candidatas) if tablas[k][1].search(text)]
+
+    def coincidencias_sin_prefiltro(self, text: str) -> List[Dict]:
+        """Como coincidencias(), probando todas las regex; referencia para verificar el prefiltro"""
+        return [intent for intent, regex in self.tablas if regex.search(text)]
+
+    def match(self, text: str, inst: Optional[Instrumentacion] = None) -> Optional[Dict]:
+        matched_intents = self.coincidencias(text, inst)
+        if not matched_intents:
+            return None
+
+        # Prioriza los intents de problemas; si no hay, el primero que coincidió
+        mejor = min(matched_intents, key=lambda i: self.prioridad.get(i["tag"], len(self.prioridad)))
+        return mejor
+
+    def __getstate__(self):
+        # Los patrones sueltos están indexados por id() y no sobreviven a pickle
+        estado = self.__dict__.copy()
+        estado["sueltos"] = {}
+        return estado
+
+    def patron_coincidente(self, intent: Dict, text: str) -> Optional[str]:
+        """Primer patrón del intent (en el orden de intents.json) que coincide con el texto"""
+        sueltos = self.sueltos.get(id(intent))
+        if sueltos is None:
+            sueltos = [(p, re.compile(normalizar_patron(p))) for p in intent.get("patterns", [])]
+            self.sueltos[id(intent)] = sueltos
+        for patron, regex in sueltos:
+            if regex.search(text):
+                return patron
+        return None
+
+
+def ejemplos_patron(patron: str) -> List[str]:
+    """Frases que reconoce un patrón de intents.json, para entrenar el clasificador.
+
+    Los patrones sólo usan clases de letras ([oó]), grupos con alternativas
+    ((la |mi )?) y letras opcionales, así que basta con expandirlos.
+    """
+    piezas = []
+    for clase, grupo, grupo_opcional, letra, letra_opcional in RE_PIEZA_PATRON.findall(normalizar_patron(patron)):
+        if clase:
+            piezas.append([clase[0]])  # normalizadas, las opciones de [oó] son la misma letra
+        elif grupo or grupo_opcional:
+            piezas.append(grupo.split("|") + ([""] if grupo_opcional else []))
+        else:
+            letra = letra[-1]
+            piezas.append([letra, ""] if letra_opcional else [letra])
+    ejemplos = []
+    for combinacion in itertools.islice(itertools.product(*piezas), MAX_EJEMPLOS_PATRON):
+        texto = " ".join("".join(combinacion).split())
+        if texto:
+            ejemplos.append(texto)
+    return ejemplos
+
+
+class ClasificadorNgramas:
+    """Respaldo estadístico para los mensajes que ninguna regex reconoce.
+
+    Cada patrón se expande a frases de ejemplo y se vectoriza con n-gramas de
+    caracteres (TF-IDF sublineal) del texto normalizado. Un mensaje se asigna al intent
+    del ejemplo más parecido (similitud coseno). Los ejemplos se guardan como
+    índice invertido n-grama -> [(ejemplo, peso)], así que clasificar es un
+    solo producto punto disperso sobre los n-gramas del mensaje. Los n-gramas
+    presentes en más de `max_df` de los ejemplos casi no distinguen intents y
+    son los de listas más largas, así que se descartan como palabras vacías.
+    """
+
+    def __init__(self, intents: List[Dict], n_min: int = 2, n_max: int = 4, max_df: float = 0.05):
+        self.n_min, self.n_max = n_min, n_max
+        self.intents = [intent for intent in intents if intent.get("patterns")]
+
+        ejemplos = [(k, self.ngramas(e)) for k, intent in enumerate(self.intents)
+                    for p in intent["patterns"] for e in ejemplos_patron(p)]
+        total = len(ejemplos)
+        frecuencia_doc = Counter(g for _, conteo in ejemplos for g in conteo)
+        self.idf = {g: math.log((1 + total) / (1 + df)) + 1
+                    for g, df in frecuencia_doc.items() if df <= max_df * total}
+        self.vacios = {g for g, df in frecuencia_doc.items() if df > max_df * total}
+        # Peso de un n-grama nunca visto: cuenta en la norma del mensaje, así el
+        # texto que no se parece a nada (tecleo al azar) queda con similitud baja
+        self.idf_desconocido = math.log(1 + total) + 1
+
+        self.intent_de = [k for k, _ in ejemplos]
+        self.indice: Dict[str, List[Tuple[int, float]]] = {}
+        for j, (_, conteo) in enumerate(ejemplos):
+            for g, peso in self.vector(conteo).items():
+                self.indice.setdefault(g, []).append((j, peso))
+
+    def ngramas(self, texto: str) -> Counter:
+        texto = f" {' '.join(texto.split())} "
+        return Counter(texto[i:i + n] for n in range(self.n_min, self.n_max + 1)
+                       for i in range(len(texto) - n + 1))
+
+    def vector(self, conteo: Counter) -> Dict[str, float]:
+        """TF-IDF normalizado sobre los n-gramas del vocabulario (sin palabras vacías)"""
+        vector = {}
+        norma = 0.0
+        for g, tf in conteo.items():
+            if g in self.vacios:
+                continue
+            peso = (1 + math.log(tf)) * self.idf.get(g, self.idf_desconocido)
+            norma += peso * peso
+            if g in self.idf:
+                vector[g] = peso
+        norma = math.sqrt(norma) or 1.0
+        return {g: v / norma for g, v in vector.items()}
+
+    def clasificar(self, texto: str) -> Tuple[Optional[Dict], float]:
+        """(intent más cercano, similitud coseno); (None, 0.0) si no comparte n-gramas con ninguno"""
+        puntajes: Dict[int, float] = defaultdict(float)
+        for g, peso in self.vector(self.ngramas(texto)).items():
+            for j, w in self.indice[g]:
+                puntajes[j] += peso * w
+        if not puntajes:
+            return None, 0.0
+        j = max(puntajes, key=puntajes.get)
+        return self.intents[self.intent_de[j]], puntajes[j]
+
+
+class CorrectorDifflib:
+    """Corrector original: compara cada palabra contra todo el vocabulario"""
+
+    def __init__(self, lista_palabras: List[str], cutoff: float = 0.8):
+        self.lista_palabras = lista_palabras
+        self.cutoff = cutoff
+
+    def buscar(self, palabra: str, inst: Optional[Instrumentacion] = None) -> Optional[str]:
+        if inst is not None:
+            inst.contar("corrector_consultas")
+            inst.contar("corrector_candidatos", len(self.lista_palabras))
+        match = get_close_matches(palabra, self.lista_palabras, n=1, cutoff=self.cutoff)
+        return match[0] if match else None
+
+
+PROFUNDIDAD_MAX_CONSULTA = 4   # borrados por consulta más allá de esto crecen como C(n, k): se compara por largo
+
+
+class CorrectorSymSpell:
+    """Corrector con índice de borrados (estilo SymSpell) construido una vez.
+
+    Da la misma respuesta que get_close_matches(n=1). Si la similitud de difflib
+    entre dos palabras es >= cutoff, ambas se reducen a su subsecuencia común
+    borrando a lo más len*(2-2*cutoff)/(2-cutoff) letras de cada una (un tercio
+    con 0.8). Por eso basta cruzar los borrados de la consulta con los del
+    vocabulario y calcular la similitud exacta sólo a esos pocos candidatos.
+
+    La similitud tampoco llega a cutoff si un largo pasa de (2-cutoff)/cutoff
+    veces el otro: una consulta más larga que eso respecto a la palabra más
+    larga del vocabulario (un correo, una URL) no se corrige. Las consultas
+    largas, que tendrían demasiados borrados, se comparan sólo contra las
+    palabras de largo compatible.
+    """
+
+    def __init__(self, lista_palabras: List[str], cutoff: float = 0.8):
+        self.cutoff = cutoff
+        self.vocabulario = set(lista_palabras)
+        self.por_largo: Dict[int, List[str]] = {}
+        for palabra in self.vocabulario:
+            self.por_largo.setdefault(len(palabra), []).append(palabra)
+        largo_max = max(self.por_largo, default=0)
+        self.largo_consulta_max = int(largo_max * (2 - cutoff) / cutoff + 1e-9) if cutoff > 0 else sys.maxsize
+        indice: Dict[str, List[str]] = {}
+        for palabra in self.vocabulario:
+            for borrado in self.borrados(palabra):
+                indice.setdefault(borrado, []).append(palabra)
+        # La mayoría de los borrados vienen de una sola palabra: se guarda la palabra
+        # sola y una tupla sólo cuando son varias (menos memoria y carga más rápida)
+        self.indice: Dict[str, object] = {
+            borrado: palabras[0] if len(palabras) == 1 else tuple(palabras)
+            for borrado, palabras in indice.items()
+        }
+
+    def profundidad(self, largo: int) -> int:
+        return int(largo * (2 - 2 * self.cutoff) / (2 - self.cutoff) + 1e-9)
+
+    def borrados(self, palabra: str) -> set:
+        """La palabra y todas sus variantes con hasta el máximo de letras borradas"""
+        resultado = {palabra}
+        frontera = {palabra}
+        for _ in range(self.profundidad(len(palabra))):
+            frontera = {p[:i] + p[i + 1:] for p in frontera for i in range(len(p))}
+            resultado |= frontera
+        return resultado
+
+    def buscar(self, palabra: str, inst: Optional[Instrumentacion] = None) -> Optional[str]:
+        if inst is not None:
+            inst.contar("corrector_consultas")
+        if palabra in self.vocabulario:
+            return palabra
+        if len(palabra) > self.largo_consulta_max:
+            return None
+
+        if self.profundidad(len(palabra)) > PROFUNDIDAD_MAX_CONSULTA:
+            minimo = math.ceil(len(palabra) * self.cutoff / (2 - self.cutoff) - 1e-9)
+            candidatos = [x for largo in range(minimo, self.largo_consulta_max + 1)
+                          for x in self.por_largo.get(largo, ())]
+        else:
+            candidatos = set()
+            for borrado in self.borrados(palabra):
+                encontrados = self.indice.get(borrado)
+                if encontrados is None:
+                    continue
+                if isinstance(encontrados, str):
+                    candidatos.add(encontrados)
+                else:
+                    candidatos.update(encontrados)
+        if inst is not None:
+            inst.contar("corrector_candidatos", len(candidatos))
+
+        s = SequenceMatcher()
+        s.set_seq2(palabra)
+        mejor = None
+        # Mismos filtros y desempate (mayor similitud, luego mayor palabra) que get_close_matches
+        for x in candidatos:
+            s.set_seq1(x)
+            if s.real_quick_ratio() >= self.cutoff and s.quick_ratio() >= self.cutoff:
+                score = s.ratio()
+                if score >= self.cutoff and (mejor is None or (score, x) > mejor):
+                    mejor = (score, x)
+        return mejor[1] if mejor else None
+
+
+CORRECTORES = {
+    "difflib": CorrectorDifflib,
+    "symspell": CorrectorSymSpell,
+}
+
+
+class ModeloChatBot:
+    """Parte inmutable del bot, cargada una vez y compartida por todas las sesiones:
+    intents, patrones compilados, vocabulario e índice del corrector."""
+
+    def __init__(self, corrector: str = "symspell"):
+        self.nombre_corrector = corrector
         self.intents = []
-        self.state: Optional[str] = None
-        self.context: Dict = {}
+        self.matcher = IntentMatcher([])
+        self.clasificador = ClasificadorNgramas([])
+        self.huella: Optional[str] = None  # sha1 de intents.json; identifica la versión del modelo
         self.load_intents()
         self.lista_palabras = self.cargar_palabras_clave(self.intents)
+        self.corrector = CORRECTORES[corrector](self.lista_palabras)
 
     def load_intents(self):
         if not Path(INTENTS_FILE).exists():
             print(f"No encontré {INTENTS_FILE}")
             return
-        raw = json.load(open(INTENTS_FILE, encoding="utf-8"))
-        self.intents = raw.get("intents", [])
+        datos = Path(INTENTS_FILE).read_bytes()
+        self.huella = hashlib.sha1(datos).hexdigest()
+        raw = json.loads(datos.decode("utf-8"))
+        self.intents = self.validar_estructura(raw)
+        self.matcher = IntentMatcher(self.intents)
+        self.clasificador = ClasificadorNgramas(self.intents)
+
+    @staticmethod
+    def validar_estructura(raw) -> List[Dict]:
+        """Los intents de intents.json; ValueError si no tiene la forma {"intents": [{...}, ...]}"""
+        if not isinstance(raw, dict):
+            raise ValueError(f"{INTENTS_FILE} debe ser un objeto JSON, no {type(raw).__name__}")
+        intents = raw.get("intents", [])
+        if not isinstance(intents, list):
+            raise ValueError(f"'intents' en {INTENTS_FILE} debe ser una lista")
+        for i, intent in enumerate(intents):
+            if not isinstance(intent, dict):
+                raise ValueError(f"El intent #{i} de {INTENTS_FILE} no es un objeto")
+            for campo in ("patterns", "responses"):
+                valores = intent.get(campo, [])
+                if not isinstance(valores, list) or not all(isinstance(v, str) for v in valores):
+                    raise ValueError(f"El intent #{i} ({intent.get('tag', '?')}): "
+                                     f"'{campo}' debe ser una lista de textos")
+        return intents
+
+    def validar(self):
+        """Lanza ValueError si el modelo no sirve para atender huéspedes"""
+        if not self.intents:
+            raise ValueError(f"{INTENTS_FILE} no tiene intents")
+        for i, intent in enumerate(self.intents):
+            faltan = [campo for campo in ("tag", "patterns", "responses") if not intent.get(campo)]
+            if faltan:
+                raise ValueError(f"El intent #{i} ({intent.get('tag', '?')}) no tiene: {', '.join(faltan)}")
+
+    def cargar_palabras_clave(self, intents) -> List[str]:
+        """Vocabulario normalizado; self.formas guarda cómo se escribe cada palabra (con acentos)"""
+        self.formas: Dict[str, str] = {}
+        for intent in intents:
+            for pattern in intent.get("patterns", []):
+                # Solo añadimos palabras "normales", no regex con []
+                if not re.search(r"[\[\]\(\)\|]", pattern):
+                    for palabra in pattern.lower().split():
+                        self.formas.setdefault(normalizar(palabra), palabra)
+        for palabra in MESES + DIAS_SEMANA + PALABRAS_FECHA:
+            self.formas.setdefault(normalizar(palabra), palabra)
+        return list(self.formas)
+
+
+def cargar_modelo_validado(corrector: str = "symspell") -> ModeloChatBot:
+    """Carga y valida un modelo nuevo; lanza ValueError si intents.json no sirve"""
+    try:
+        modelo = ModeloChatBot(corrector)
+    except re.error as e:
+        raise ValueError(f"Patrón inválido en {INTENTS_FILE}: {e}") from e
+    except (TypeError, AttributeError, KeyError) as e:
+        # Una forma que validar_estructura no previó no debe matar al hilo que recarga
+        raise ValueError(f"{INTENTS_FILE} con estructura inesperada: {e!r}") from e
+    modelo.validar()
+    return modelo
+
+
+# ------------------------------------ Artefacto compilado ------------------------------------ #
+
+MAGIA_ARTEFACTO = b"HTLBOT\r\n"
+FORMATO_ARTEFACTO = 3
+
+
+def huella_codigo() -> str:
+    """sha1 de este módulo: un artefacto compilado con otra versión del código no se usa"""
+    return hashlib.sha1(Path(__file__).read_bytes()).hexdigest()
+
+
+def compilar_artefacto(corrector: str = "symspell", ruta: str = ARTEFACTO) -> Dict:
+    """Escribe el modelo ya construido (vocabulario, índice del corrector, tablas
+    de patrones y respuestas) en un archivo binario que carga en milisegundos.
+
+    Formato: magia | largo del encabezado (uint32) | encabezado JSON | pickle del modelo.
+    El encabezado se lee sin deserializar el resto para saber si está al día, y
+    trae el sha256 del pickle para comprobarlo antes de deserializarlo.
+    """
+    inicio = time.perf_counter()
+    modelo = cargar_modelo_validado(corrector)
+    carga = pickle.dumps(modelo, protocol=5)
+    encabezado = json.dumps({
+        "formato": FORMATO_ARTEFACTO,
+        "huella": modelo.huella,
+        "corrector": corrector,
+        "python": list(sys.version_info[:2]),
+        "codigo": huella_codigo(),
+        "carga": hashlib.sha256(carga).hexdigest(),
+    }).encode("utf-8")
+
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(MAGIA_ARTEFACTO + struct.pack("<I", len(encabezado)) + encabezado)
+        f.write(carga)
+    os.replace(temporal, ruta)
+    return {"ruta": ruta, "bytes": len(carga) + len(encabezado), "huella": modelo.huella,
+            "ms": (time.perf_counter() - inicio) * 1e3}
+
+
+def artefacto_confiable(f) -> bool:
+    """Deserializar un pickle ejecuta código: sólo se acepta un archivo nuestro que nadie más pueda escribir"""
+    if not hasattr(os, "getuid"):
+        return True
+    st = os.fstat(f.fileno())
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def leer_artefacto(ruta: str = ARTEFACTO, corrector: str = "symspell") -> Optional[ModeloChatBot]:
+    """El modelo guardado en el artefacto, o None si no existe o ya no corresponde a intents.json"""
+    if not Path(ruta).exists():
+        return None
+    try:
+        with open(ruta, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if not artefacto_confiable(f):
+                raise ValueError("otro usuario puede escribirlo")
+            if mm[:len(MAGIA_ARTEFACTO)] != MAGIA_ARTEFACTO:
+                raise ValueError("no es un artefacto del bot")
+            inicio = len(MAGIA_ARTEFACTO) + 4
+            largo, = struct.unpack_from("<I", mm, len(MAGIA_ARTEFACTO))
+            encabezado = json.loads(mm[inicio:inicio + largo].decode("utf-8"))
+
+            esperado = {
+                "formato": FORMATO_ARTEFACTO,
+                "huella": hashlib.sha1(Path(INTENTS_FILE).read_bytes()).hexdigest(),
+                "corrector": corrector,
+                "python": list(sys.version_info[:2]),
+                "codigo": huella_codigo(),
+            }
+            distintos = [campo for campo, valor in esperado.items() if encabezado.get(campo) != valor]
+            if distintos:
+                print(f"{ruta} desactualizado ({', '.join(distintos)}), se usa {INTENTS_FILE}", file=sys.stderr)
+                return None
+
+            with memoryview(mm) as vista:
+                datos = vista[inicio + largo:]
+                try:
+                    if hashlib.sha256(datos).hexdigest() != encabezado.get("carga"):
+                        raise ValueError("el contenido no corresponde al encabezado")
+                    modelo = pickle.loads(datos)
+                finally:
+                    datos.release()
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+        print(f"No se pudo leer {ruta} ({e}), se usa {INTENTS_FILE}", file=sys.stderr)
+        return None
+    return modelo
+
+
+def cargar_modelo(corrector: str = "symspell", artefacto: Optional[str] = ARTEFACTO) -> ModeloChatBot:
+    """Usa el artefacto compilado si está al día con intents.json; si no, construye desde el JSON"""
+    modelo = leer_artefacto(artefacto, corrector) if artefacto else None
+    return modelo or ModeloChatBot(corrector)
+
+
+class RecargadorIntents(threading.Thread):
+    """Vigila intents.json y, si cambia, arma el modelo nuevo en segundo plano.
+
+    El bot lo toma al empezar su siguiente turno, así ningún mensaje se procesa
+    con dos modelos a la vez y las sesiones en curso no se pierden. Si el
+    archivo nuevo no es válido se conserva el modelo anterior.
+    """
+
+    def __init__(self, bot: "HotelChatBot", intervalo: float = 2.0):
+        super().__init__(name="recargador-intents", daemon=True)
+        self.bot = bot
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+        self.firma = self.firma_archivo()
+
+    @staticmethod
+    def firma_archivo():
+        try:
+            st = Path(INTENTS_FILE).stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def run(self):
+        while not self.detener.wait(self.intervalo):
+            firma = self.firma_archivo()
+            if firma is not None and firma != self.firma:
+                self.firma = firma
+                self.bot.recargar()
+
+
+# Marca de una entrada de caché cuyo intent todavía no se ha calculado
+SIN_RESOLVER = object()
+
+
+class CacheDecisiones:
+    """Caché LRU (con TTL opcional) de texto -> texto corregido e intent.
+
+    Cada entrada es [corregido, normalizado, intent, momento]: el texto corregido
+    como se muestra, el mismo ya normalizado para comparar, y el intent, que se resuelve la primera
+    vez que se necesita, porque en los estados especiales no se usa. Si cambia la
+    huella del modelo (otro intents.json) se vacía completa.
+    """
+
+    def __init__(self, max_entradas: int = 4096, ttl: Optional[float] = None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.entradas: OrderedDict = OrderedDict()
+        self.huella: Optional[str] = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expirados = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave: str, huella: Optional[str]) -> Optional[list]:
+        if huella != self.huella:
+            if self.entradas:
+                self.invalidaciones += 1
+            self.entradas.clear()
+            self.huella = huella
+
+        entrada = self.entradas.get(clave)
+        if entrada is not None and self.ttl is not None and time.monotonic() - entrada[3] > self.ttl:
+            del self.entradas[clave]
+            self.expirados += 1
+            entrada = None
+        if entrada is None:
+            self.fallos += 1
+            return None
+        self.entradas.move_to_end(clave)
+        self.aciertos += 1
+        return entrada
+
+    def guardar(self, clave: str, corregido: str, normalizado: str) -> list:
+        entrada = [corregido, normalizado, SIN_RESOLVER, time.monotonic() if self.ttl is not None else 0.0]
+        if self.max_entradas <= 0:
+            return entrada
+        self.entradas[clave] = entrada
+        if len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+            self.desalojos += 1
+        return entrada
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {
+            "entradas": len(self.entradas),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+            "expirados": self.expirados,
+            "invalidaciones": self.invalidaciones,
+        }
+
+
+class SesionChat:
+    """Estado de una conversación: lo único que cambia de un huésped a otro"""
+
+    __slots__ = ("state", "context")
+
+    def __init__(self):
+        self.state: Optional[str] = None
+        self.context: Dict = {}
+
+    def serializar(self) -> str:
+        return json.dumps([self.state, self.context], ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def deserializar(cls, datos: str) -> "SesionChat":
+        sesion = cls()
+        sesion.state, sesion.context = json.loads(datos)
+        return sesion
+
+
+class AlmacenSesiones(abc.ABC):
+    """Dónde viven las sesiones fuera del proceso del bot.
+
+    El bot carga una sesión la primera vez que la necesita y la guarda al final
+    de cada turno; cada implementación decide cuándo escribe de verdad.
+    """
+
+    @abc.abstractmethod
+    def cargar(self, session_id: str) -> Optional[SesionChat]:
+        """La sesión guardada, o None si no hay"""
+
+    @abc.abstractmethod
+    def guardar(self, session_id: str, sesion: SesionChat):
+        """Guarda la sesión al final de un turno"""
+
+    @abc.abstractmethod
+    def borrar(self, session_id: str):
+        """Olvida la sesión"""
+
+    def vaciar(self):
+        """Escribe lo que esté pendiente"""
+
+    def cerrar(self):
+        self.vaciar()
+
+
+class AlmacenMemoria(AlmacenSesiones):
+    """Sesiones serializadas en un diccionario: sobreviven al bot, no al proceso"""
+
+    def __init__(self):
+        self.datos: Dict[str, str] = {}
+
+    def cargar(self, session_id: str) -> Optional[SesionChat]:
+        datos = self.datos.get(session_id)
+        return SesionChat.deserializar(datos) if datos is not None else None
+
+    def guardar(self, session_id: str, sesion: SesionChat):
+        self.datos[session_id] = sesion.serializar()
+
+    def borrar(self, session_id: str):
+        self.datos.pop(session_id, None)
+
+
+class AlmacenSQLite(AlmacenSesiones):
+    """Sesiones en un archivo SQLite (modo WAL), escritas por lotes.
+
+    guardar() sólo deja la sesión serializada en un búfer; varias
+    actualizaciones de la misma sesión se funden en una. El búfer se escribe en
+    una sola transacción al juntar `lote` sesiones, y en el primer guardar()
+    después de `intervalo` segundos desde la última escritura. El almacén no
+    tiene un hilo propio: si dejan de llegar turnos, lo pendiente sólo llega a
+    disco cuando alguien llama a vaciar() (el servidor y los trabajadores lo
+    hacen cada `intervalo` segundos) o a cerrar(). Con eso, un fallo del
+    proceso pierde a lo más `lote` sesiones o `intervalo` segundos. Con lote=1
+    cada turno queda en disco antes de responder, que es lo que hace falta si
+    varios procesos atienden la misma sesión sin afinidad.
+    """
+
+    def __init__(self, ruta: str = "sesiones.db", lote: int = 256, intervalo: float = 1.0):
+        self.ruta = ruta
+        self.lote = lote
+        self.intervalo = intervalo
+        self.conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute("CREATE TABLE IF NOT EXISTS sesiones ("
+                              "id TEXT PRIMARY KEY, datos TEXT NOT NULL, actualizada REAL NOT NULL) WITHOUT ROWID")
+        # session_id -> sesión serializada, o None si hay que borrarla
+        self.pendientes: Dict[str, Optional[str]] = {}
+        self.ultima_escritura = time.monotonic()
+        self.lock = threading.Lock()
+
+    def cargar(self, session_id: str) -> Optional[SesionChat]:
+        with self.lock:
+            if session_id in self.pendientes:
+                datos = self.pendientes[session_id]
+            else:
+                fila = self.conexion.execute("SELECT datos FROM sesiones WHERE id = ?", (session_id,)).fetchone()
+                datos = fila[0] if fila else None
+        return SesionChat.deserializar(datos) if datos is not None else None
+
+    def guardar(self, session_id: str, sesion: SesionChat):
+        self.pendiente(session_id, sesion.serializar())
+
+    def borrar(self, session_id: str):
+        self.pendiente(session_id, None)
+
+    def pendiente(self, session_id: str, datos: Optional[str]):
+        with self.lock:
+            self.pendientes[session_id] = datos
+            if len(self.pendientes) < self.lote and time.monotonic() - self.ultima_escritura < self.intervalo:
+                return
+            self.escribir()
+
+    def vaciar(self):
+        with self.lock:
+            self.escribir()
+
+    def escribir(self):
+        """Escribe el búfer en una transacción; se llama con el lock tomado"""
+        self.ultima_escritura = time.monotonic()
+        if not self.pendientes:
+            return
+        ahora = time.time()
+        guardar = [(sid, datos, ahora) for sid, datos in self.pendientes.items() if datos is not None]
+        borrar = [(sid,) for sid, datos in self.pendientes.items() if datos is None]
+        with self.conexion:
+            self.conexion.execute("BEGIN")
+            self.conexion.executemany("INSERT OR REPLACE INTO sesiones (id, datos, actualizada) VALUES (?, ?, ?)",
+                                      guardar)
+            self.conexion.executemany("DELETE FROM sesiones WHERE id = ?", borrar)
+        self.pendientes.clear()
+
+    def cerrar(self):
+        self.vaciar()
+        self.conexion.close()
+
+
+class GrabadorTranscripciones:
+    """Guarda cada turno como una línea JSON compacta, escrita desde un hilo aparte.
+
+    registrar() sólo agrega una tupla a una deque: el turno no espera ni al
+    disco ni a json.dumps. El hilo escritor despierta cada `intervalo` segundos
+    (o al juntarse `lote` turnos), serializa lo pendiente y lo escribe de una
+    vez. Si el disco no da abasto y se acumulan max_pendientes, los turnos
+    nuevos se descartan y se cuentan, en vez de frenar al bot. Con ruta .gz
+    se comprime.
+
+    Cada línea tiene s (sesión), t (epoch), i (entrada), c (corregida),
+    a y b (estado antes y después), g (tag del intent que respondió, o null si
+    respondió un estado), r (mensajes) y o (opciones). Antes del primer turno de
+    cada apertura va una línea con el formato y las huellas del modelo y del código.
+    """
+
+    CAMPOS = ("s", "t", "i", "c", "a", "b", "g", "r", "o")
+    FORMATO = 1
+
+    def __init__(self, ruta: str = "transcripciones.jsonl", lote: int = 1024, intervalo: float = 0.5,
+                 max_pendientes: int = 100_000):
+        self.ruta = ruta
+        self.lote = lote
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self.pendientes: deque = deque()
+        self.despertar = threading.Event()
+        self.cerrado = False
+        self.escritos = 0
+        self.descartados = 0
+        # La pone el bot que lo usa; va en el encabezado, que se escribe con el primer lote
+        self.huella_modelo: Optional[str] = None
+        self.encabezado_escrito = False
+        # Un solo codificador: json.dumps con opciones arma uno nuevo en cada llamada
+        self.codificar = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+        self.archivo = gzip.open(ruta, "at", encoding="utf-8") if ruta.endswith(".gz") \
+            else open(ruta, "a", encoding="utf-8")
+        self.hilo = threading.Thread(target=self.escribir_continuamente, name="grabador-transcripciones",
+                                     daemon=True)
+        self.hilo.start()
+
+    def registrar(self, turno: tuple):
+        """Turno en el orden de CAMPOS; no bloquea"""
+        if len(self.pendientes) >= self.max_pendientes:
+            self.descartados += 1
+            return
+        self.pendientes.append(turno)
+        if len(self.pendientes) >= self.lote:
+            self.despertar.set()
+
+    def vaciar(self):
+        """Escribe todo lo pendiente (lo llama el hilo escritor)"""
+        n = len(self.pendientes)
+        if not n:
+            return
+        lineas = []
+        if not self.encabezado_escrito:
+            lineas.append(self.codificar({"formato": self.FORMATO, "modelo": self.huella_modelo,
+                                          "codigo": huella_codigo(), "inicio": time.time()}))
+            self.encabezado_escrito = True
+        campos, codificar, pendientes = self.CAMPOS, self.codificar, self.pendientes
+        for _ in range(n):
+            lineas.append(codificar(dict(zip(campos, pendientes.popleft()))))
+        self.archivo.write("\n".join(lineas) + "\n")
+        self.archivo.flush()
+        self.escritos += n
+
+    def escribir_continuamente(self):
+        while not self.cerrado:
+            self.despertar.wait(self.intervalo)
+            self.despertar.clear()
+            self.vaciar()
+
+    def cerrar(self):
+        self.cerrado = True
+        self.despertar.set()
+        self.hilo.join()
+        self.vaciar()
+        self.archivo.close()
+
+
+class RespuestaBot(NamedTuple):
+    """Resultado de un turno: lo que el bot dice, el estado en que queda la
+    sesión y las opciones de seguimiento que se le ofrecieron al huésped"""
+    mensajes: List[str]
+    estado: Optional[str]
+    opciones: List[str]
+
+
+# Sesión que usa run() y quien llame a respond() sin indicar session_id
+SESION_CLI = "cli"
+
+
+# ------------------------------------------ Fechas ------------------------------------------ #
+
+_MESES_RE = "|".join(MESES)
+_DIAS_RE = "|".join(normalizar(d) for d in DIAS_SEMANA)
+_ANIO_RE = r"(?: (?:de |del )?(?:ano )?(\d{4}))?"
+
+# Todas las formas de fecha en una sola regex: cada alternativa tiene sus grupos con
+# nombre y finditer recorre el texto (ya normalizado) una vez. El orden importa:
+# en una misma posición gana la primera alternativa, así que van de la más larga
+# ("15 al 20 de enero") a la más corta ("enero"). El lookahead inicial descarta de
+# un vistazo las posiciones donde no empieza ninguna alternativa (su primera letra).
+RE_FECHAS = re.compile(r"\b(?=[\dadefhjlmnopsv])(?:" + "|".join([
+    rf"\b(?:del? )?(?P<rd1>\d{{1,2}}) ?(?:al?|-|y) ?(?P<rd2>\d{{1,2}}) de (?P<rmes>{_MESES_RE})"
+    + _ANIO_RE.replace("(\\d{4})", "(?P<ranio>\\d{4})"),
+    rf"\b(?P<md1>\d{{1,2}}) de (?P<mmes>{_MESES_RE}) al? (?P<md2>\d{{1,2}})\b(?! de)",    # 15 de enero al 20
+    r"\b(?P<nd>\d{1,2})[/-](?P<nm>\d{1,2})(?:[/-](?P<na>\d{4}|\d{2}))?\b",
+    rf"\b(?P<dd>\d{{1,2}}) de (?P<dmes>{_MESES_RE})" + _ANIO_RE.replace("(\\d{4})", "(?P<danio>\\d{4})"),
+    r"\b(?P<noches>\d{1,2}) (?:noches?|dias?)\b",
+    r"\b(?:del? )?(?P<sd1>\d{1,2}) ?al ?(?P<sd2>\d{1,2})\b",
+    r"\b(?P<finde>(?:(?:el )?(?:proximo|siguiente|este) )?fin de semana)\b",
+    r"\b(?P<semana>(?:la )?(?:proxima|siguiente) semana|semana que viene)\b",
+    r"\b(?P<mesprox>(?:el )?(?:proximo|siguiente) mes|mes que viene)\b",
+    rf"\b(?:(?P<smod>proximo|siguiente|este) )?(?P<dsem>{_DIAS_RE})\b",
+    r"\b(?P<rel>pasado manana|manana|hoy|ayer)\b",
+    rf"\b(?P<mes>{_MESES_RE})\b",
+]) + ")")
+DESPLAZAMIENTO_RELATIVO = {"ayer": -1, "hoy": 0, "manana": 1, "pasado manana": 2}
+
+
+class RangoFechas(NamedTuple):
+    """Llegada y salida que pidió el huésped.
+
+    Si sólo dio una fecha se asume una noche y salida_supuesta lo indica, para
+    que el bot lo diga en vez de inventarlo en silencio.
+    """
+    entrada: date
+    salida: date
+    salida_supuesta: bool = False
+
+    @property
+    def noches(self) -> int:
+        return (self.salida - self.entrada).days
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> "RangoFechas":
+        return cls(date.fromisoformat(datos["entrada"]), date.fromisoformat(datos["salida"]),
+                   datos.get("salida_supuesta", False))
+
+    def como_dict(self) -> Dict:
+        """Forma serializable (JSON) para el contexto de la sesión y los lotes"""
+        return {"entrada": self.entrada.isoformat(), "salida": self.salida.isoformat(), "noches": self.noches,
+                "salida_supuesta": self.salida_supuesta}
+
+    def describir(self) -> str:
+        """Texto para el huésped: del 15 de enero al 20 de enero de 2025 (5 noches)"""
+        entrada = f"{self.entrada.day} de {MESES[self.entrada.month - 1]}"
+        if self.entrada.year != self.salida.year:
+            entrada += f" de {self.entrada.year}"
+        noches = f"{self.noches} noche{'s' if self.noches != 1 else ''}"
+        return f"del {entrada} al {self.salida.day} de {MESES[self.salida.month - 1]} de {self.salida.year} ({noches})"
+
+
+def _fecha_futura(hoy: date, mes: int, dia: int, anio: Optional[str]) -> Optional[date]:
+    """La fecha indicada; sin año, la primera vez que ocurre a partir de hoy"""
+    try:
+        if anio:
+            return date(int(anio) + (2000 if len(anio) == 2 else 0), mes, dia)
+        fecha = date(hoy.year, mes, dia)
+        return fecha if fecha >= hoy else date(hoy.year + 1, mes, dia)
+    except ValueError:
+        return None  # 31 de febrero, mes 13...
+
+
+def _fechas_de(m: "re.Match", hoy: date) -> List[date]:
+    """Fechas (una o dos) de una mención que encontró RE_FECHAS"""
+    g = m.groupdict()
+    if g["rd1"]:
+        mes = MESES.index(g["rmes"]) + 1
+        return [f for f in (_fecha_futura(hoy, mes, int(g["rd1"]), g["ranio"]),
+                            _fecha_futura(hoy, mes, int(g["rd2"]), g["ranio"])) if f]
+    if g["md1"]:
+        mes = MESES.index(g["mmes"]) + 1
+        return [f for f in (_fecha_futura(hoy, mes, int(g["md1"]), None),
+                            _fecha_futura(hoy, mes, int(g["md2"]), None)) if f]
+    if g["nd"]:
+        fecha = _fecha_futura(hoy, int(g["nm"]), int(g["nd"]), g["na"]) if 1 <= int(g["nm"]) <= 12 else None
+        return [fecha] if fecha else []
+    if g["dd"]:
+        fecha = _fecha_futura(hoy, MESES.index(g["dmes"]) + 1, int(g["dd"]), g["danio"])
+        return [fecha] if fecha else []
+    if g["sd1"]:
+        # "del 15 al 20": el mes en curso, o el siguiente si ese día ya pasó
+        mes, anio = (hoy.month, hoy.year) if int(g["sd1"]) >= hoy.day else (hoy.month % 12 + 1, hoy.year + (hoy.month == 12))
+        return [f for f in (_fecha_futura(hoy, mes, int(g["sd1"]), str(anio)),
+                            _fecha_futura(hoy, mes, int(g["sd2"]), str(anio))) if f]
+    if g["finde"]:
+        proximo = g["finde"].startswith(("el proximo", "proximo", "el siguiente", "siguiente"))
+        if hoy.weekday() >= 5 and not proximo:
+            # En sábado o domingo "este fin de semana" es el que está en curso: la noche de hoy
+            return [hoy, hoy + timedelta(days=1)]
+        viernes = hoy + timedelta(days=(4 - hoy.weekday()) % 7)
+        if proximo and viernes - hoy < timedelta(days=3):
+            viernes += timedelta(days=7)
+        return [viernes, viernes + timedelta(days=2)]
+    if g["semana"]:
+        lunes = hoy + timedelta(days=7 - hoy.weekday())
+        return [lunes, lunes + timedelta(days=7)]
+    if g["mesprox"]:
+        return [date(hoy.year + (hoy.month == 12), hoy.month % 12 + 1, 1)]
+    if g["dsem"]:
+        dias = (_DIAS_RE.split("|").index(g["dsem"]) - hoy.weekday()) % 7
+        if g["smod"] in ("proximo", "siguiente") and dias == 0:
+            dias = 7
+        return [hoy + timedelta(days=dias)]
+    if g["rel"]:
+        return [hoy + timedelta(days=DESPLAZAMIENTO_RELATIVO[g["rel"]])]
+    if g["mes"]:
+        return [_fecha_futura(hoy, MESES.index(g["mes"]) + 1, 1, None)]
+    return []
+
+
+def _armar_rango(menciones: Iterable["re.Match"], hoy: date) -> Optional[RangoFechas]:
+    fechas: List[date] = []
+    noches = None
+    for m in menciones:
+        if m.group("noches"):
+            noches = int(m.group("noches"))
+        elif len(fechas) < 2:
+            # La salida sin año se resuelve desde la llegada: "28 de diciembre al 3 de enero"
+            fechas.extend(_fechas_de(m, fechas[0] if fechas else hoy))
+    if not fechas:
+        return None
+    entrada = fechas[0]
+    if len(fechas) > 1:
+        salida = fechas[1]
+        if salida > entrada:
+            return RangoFechas(entrada, salida)
+    if noches:
+        return RangoFechas(entrada, entrada + timedelta(days=noches))
+    return RangoFechas(entrada, entrada + timedelta(days=1), salida_supuesta=True)
+
+
+def interpretar_fechas(texto: str, hoy: Optional[date] = None) -> Optional[RangoFechas]:
+    """Llegada y salida de un texto ya normalizado, en una sola pasada de RE_FECHAS.
+
+    Las fechas sin año se toman en su próxima ocurrencia a partir de `hoy`;
+    devuelve None si no hay ninguna fecha reconocible.
+    """
+    return _armar_rango(RE_FECHAS.finditer(texto), hoy or date.today())
+
+
+def interpretar_fechas_lote(textos: Iterable[str], hoy: Optional[date] = None) -> List[Optional[RangoFechas]]:
+    """interpretar_fechas sobre muchos textos crudos (se normalizan aquí).
+
+    Cada texto distinto se interpreta una sola vez (en columnas históricas se
+    repiten mucho). Los distintos se unen con un separador que ninguna
+    alternativa cruza y la regex recorre el bloque una sola vez; cada mención
+    vuelve a su texto por su posición. `hoy` es la fecha de referencia desde
+    la que se resuelven años y fechas relativas.
+    """
+    hoy = hoy or date.today()
+    normalizados = [normalizar(" ".join(t.split())) for t in textos]
+    distintos = list(dict.fromkeys(normalizados))
+    inicios = list(itertools.accumulate((len(t) + 1 for t in distintos[:-1]), initial=0))
+    menciones: List[list] = [[] for _ in distintos]
+    for m in RE_FECHAS.finditer("\0".join(distintos)):
+        menciones[bisect.bisect(inicios, m.start()) - 1].append(m)
+    rangos = {texto: _armar_rango(ms, hoy) if ms else None for texto, ms in zip(distintos, menciones)}
+    return [rangos[texto] for texto in normalizados]
+
+
+# ---------------------------------------- Inventario ---------------------------------------- #
+
+# tipo: (habitaciones, precio por noche); el piso de cada tipo es su posición + 1
+TIPOS_HABITACION = {
+    "Estándar": (5, 1200),
+    "Superior": (3, 1800),
+    "Suite Junior": (2, 2500),
+    "Suite Presidencial": (1, 4000),
+}
+DURACION_APARTADO = 15 * 60               # segundos que se guarda una habitación sin confirmar
+ALFABETO_CODIGO = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # sin 0/O ni 1/I, que se confunden al dictarlos
+
+
+class Apartado(NamedTuple):
+    """Habitación guardada para un huésped mientras confirma (o ya reservada)"""
+    id: str
+    tipo: str
+    habitacion: str
+    entrada: date
+    salida: date
+    total: int
+    vence: float
+
+
+class InventarioHabitaciones:
+    """Ocupación por habitación y fecha, con apartados y reservas atómicos.
+
+    Cada habitación guarda sus estancias [entrada, salida) como listas
+    ordenadas de inicios, fines e ids. Como no se traslapan, los fines
+    también quedan ordenados y saber si está libre de A a B es un bisect:
+    sólo la última estancia que empieza antes de B puede chocar. Apartar
+    revisa y ocupa bajo un mismo lock, así dos huéspedes nunca se llevan la
+    misma habitación; un apartado sin confirmar se libera al vencer.
+
+    Vive en la memoria del proceso; InventarioSQLite es el mismo inventario
+    en un archivo que comparten varios procesos y que sobrevive reinicios.
+    """
+
+    def __init__(self, tipos: Optional[Dict[str, Tuple[int, int]]] = None,
+                 duracion_apartado: float = DURACION_APARTADO):
+        tipos = tipos or TIPOS_HABITACION
+        self.duracion_apartado = duracion_apartado
+        self.precios = {tipo: precio for tipo, (_, precio) in tipos.items()}
+        self.habitaciones: Dict[str, List[str]] = {
+            tipo: [f"{piso}{n:02d}" for n in range(1, cantidad + 1)]
+            for piso, (tipo, (cantidad, _)) in enumerate(tipos.items(), 1)
+        }
+        # habitación -> (inicios, fines, ids), ordinales de fecha ordenados
+        self.ocupacion: Dict[str, Tuple[List[int], List[int], List[str]]] = {
+            h: ([], [], []) for hs in self.habitaciones.values() for h in hs
+        }
+        self.apartados: Dict[str, Apartado] = {}
+        self.reservas: Dict[str, Apartado] = {}
+        self.codigos: Set[str] = set()
+        self.vencimientos: List[Tuple[float, str]] = []  # heap (vence, id) de los apartados
+        self.lock = threading.RLock()
+        # Cambia con cada apartado, reserva o liberación; invalida la caché de disponibilidad
+        self.version = 0
+        self.cache_disponibilidad: Dict[Tuple[int, int], Tuple[int, Dict[str, int]]] = {}
+
+    def libre(self, habitacion: str, inicio: int, fin: int) -> bool:
+        inicios, fines, _ = self.ocupacion[habitacion]
+        i = bisect.bisect_left(inicios, fin)
+        return i == 0 or fines[i - 1] <= inicio
+
+    def ocupar(self, habitacion: str, inicio: int, fin: int, id_estancia: str):
+        inicios, fines, ids = self.ocupacion[habitacion]
+        i = bisect.bisect_left(inicios, inicio)
+        inicios.insert(i, inicio)
+        fines.insert(i, fin)
+        ids.insert(i, id_estancia)
+        self.version += 1
+
+    def desocupar(self, habitacion: str, inicio: int, id_estancia: str):
+        inicios, fines, ids = self.ocupacion[habitacion]
+        i = bisect.bisect_left(inicios, inicio)
+        if i < len(ids) and ids[i] == id_estancia:
+            del inicios[i], fines[i], ids[i]
+            self.version += 1
+
+    def purgar_vencidos(self, ahora: Optional[float] = None):
+        """Libera los apartados que vencieron sin confirmarse"""
+        ahora = time.monotonic() if ahora is None else ahora
+        while self.vencimientos and self.vencimientos[0][0] <= ahora:
+            _, id_apartado = heapq.heappop(self.vencimientos)
+            apartado = self.apartados.pop(id_apartado, None)
+            if apartado is not None:
+                self.desocupar(apartado.habitacion, apartado.entrada.toordinal(), id_apartado)
+
+    def disponibilidad(self, entrada: date, salida: date) -> Dict[str, int]:
+        """Habitaciones libres de cada tipo para toda la estancia"""
+        inicio, fin = entrada.toordinal(), salida.toordinal()
+        with self.lock:
+            self.purgar_vencidos()
+            guardada = self.cache_disponibilidad.get((inicio, fin))
+            if guardada is not None and guardada[0] == self.version:
+                return guardada[1]
+            libres = {}
+            for tipo, habitaciones in self.habitaciones.items():
+                # self.libre() en línea: con muchas habitaciones la llamada pesa más que el bisect
+                cantidad = 0
+                for habitacion in habitaciones:
+                    inicios, fines, _ = self.ocupacion[habitacion]
+                    i = bisect.bisect_left(inicios, fin)
+                    cantidad += i == 0 or fines[i - 1] <= inicio
+                libres[tipo] = cantidad
+            if len(self.cache_disponibilidad) >= 4096:
+                self.cache_disponibilidad.clear()
+            self.cache_disponibilidad[(inicio, fin)] = (self.version, libres)
+            return libres
+
+    def apartar(self, tipo: str, entrada: date, salida: date) -> Optional[Apartado]:
+        """Guarda la primera habitación libre del tipo; None si no queda ninguna"""
+        inicio, fin = entrada.toordinal(), salida.toordinal()
+        with self.lock:
+            self.purgar_vencidos()
+            for habitacion in self.habitaciones[tipo]:
+                if self.libre(habitacion, inicio, fin):
+                    apartado = Apartado(f"AP{secrets.token_hex(6)}", tipo, habitacion, entrada, salida,
+                                        self.precios[tipo] * (fin - inicio),
+                                        time.monotonic() + self.duracion_apartado)
+                    self.ocupar(habitacion, inicio, fin, apartado.id)
+                    self.apartados[apartado.id] = apartado
+                    heapq.heappush(self.vencimientos, (apartado.vence, apartado.id))
+                    return apartado
+            return None
+
+    def nuevo_codigo(self) -> str:
+        """Código de reserva que no se ha dado antes (HTL + 6 caracteres, ~10^9 posibles)"""
+        with self.lock:
+            while True:
+                codigo = "HTL" + "".join(secrets.choice(ALFABETO_CODIGO) for _ in range(6))
+                if codigo not in self.codigos:
+                    self.codigos.add(codigo)
+                    return codigo
+
+    def confirmar(self, id_apartado: str) -> Optional[str]:
+        """Convierte el apartado en reserva; None si ya venció"""
+        with self.lock:
+            self.purgar_vencidos()
+            apartado = self.apartados.pop(id_apartado, None)
+            if apartado is None:
+                return None
+            codigo = self.nuevo_codigo()
+            inicio = apartado.entrada.toordinal()
+            self.desocupar(apartado.habitacion, inicio, id_apartado)
+            self.ocupar(apartado.habitacion, inicio, apartado.salida.toordinal(), codigo)
+            self.reservas[codigo] = apartado._replace(id=codigo, vence=math.inf)
+            return codigo
+
+    def liberar(self, id_estancia: str) -> bool:
+        """Suelta un apartado o cancela una reserva por su código"""
+        with self.lock:
+            estancia = self.apartados.pop(id_estancia, None) or self.reservas.pop(id_estancia, None)
+            if estancia is None:
+                return False
+            self.desocupar(estancia.habitacion, estancia.entrada.toordinal(), id_estancia)
+            return True
+
+    def traslapes(self) -> List[Tuple[str, str, str]]:
+        """(habitación, estancia, estancia) que se enciman; vacía si el inventario es consistente"""
+        with self.lock:
+            return [(h, ids[i - 1], ids[i]) for h, (inicios, fines, ids) in self.ocupacion.items()
+                    for i in range(1, len(ids)) if fines[i - 1] > inicios[i]]
+
+    def cerrar(self):
+        """Nada que cerrar en memoria"""
+
+
+class InventarioSQLite(InventarioHabitaciones):
+    """El mismo inventario en un archivo SQLite que comparten todos los procesos.
+
+    Apartar, confirmar y liberar son una transacción BEGIN IMMEDIATE cada
+    uno: toman el candado de escritura del archivo antes de revisar, así dos
+    trabajadores nunca se llevan la misma habitación, y los códigos de
+    reserva son únicos entre procesos (llave primaria). Los apartados vencen
+    por reloj de pared, que todos los procesos comparten. Las reservas quedan
+    en el archivo y sobreviven a reinicios; puede ser el mismo archivo de las
+    sesiones. Cada proceso abre su propia conexión (no se hereda por fork).
+    """
+
+    def __init__(self, ruta: str = "inventario.db", tipos: Optional[Dict[str, Tuple[int, int]]] = None,
+                 duracion_apartado: float = DURACION_APARTADO):
+        super().__init__(tipos, duracion_apartado)
+        self.ruta = ruta
+        self.conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False, timeout=30.0)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=FULL")  # una reserva confirmada no se pierde
+        # vence NULL: reserva confirmada; con fecha: apartado que se libera al pasar
+        self.conexion.execute("CREATE TABLE IF NOT EXISTS estancias (id TEXT PRIMARY KEY, tipo TEXT NOT NULL, "
+                              "habitacion TEXT NOT NULL, entrada INTEGER NOT NULL, salida INTEGER NOT NULL, "
+                              "total INTEGER NOT NULL, vence REAL)")
+        self.conexion.execute("CREATE INDEX IF NOT EXISTS estancias_salida ON estancias (salida)")
+        self.conexion.execute("CREATE TABLE IF NOT EXISTS codigos (codigo TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def ocupadas(self, inicio: int, fin: int, ahora: float) -> Set[str]:
+        """Habitaciones con alguna estancia vigente que se encima con [inicio, fin)"""
+        filas = self.conexion.execute("SELECT DISTINCT habitacion FROM estancias WHERE salida > ? AND entrada < ? "
+                                      "AND (vence IS NULL OR vence > ?)", (inicio, fin, ahora))
+        return {habitacion for habitacion, in filas}
+
+    def purgar_vencidos(self, ahora: Optional[float] = None):
+        """Borra los apartados vencidos; se llama dentro de una transacción"""
+        self.conexion.execute("DELETE FROM estancias WHERE vence <= ?", (time.time() if ahora is None else ahora,))
+
+    def disponibilidad(self, entrada: date, salida: date) -> Dict[str, int]:
+        with self.lock:
+            ocupadas = self.ocupadas(entrada.toordinal(), salida.toordinal(), time.time())
+        return {tipo: sum(h not in ocupadas for h in habitaciones) for tipo, habitaciones in self.habitaciones.items()}
+
+    def apartar(self, tipo: str, entrada: date, salida: date) -> Optional[Apartado]:
+        inicio, fin = entrada.toordinal(), salida.toordinal()
+        with self.lock, self.conexion:
+            self.conexion.execute("BEGIN IMMEDIATE")
+            ahora = time.time()
+            self.purgar_vencidos(ahora)
+            ocupadas = self.ocupadas(inicio, fin, ahora)
+            for habitacion in self.habitaciones[tipo]:
+                if habitacion not in ocupadas:
+                    apartado = Apartado(f"AP{secrets.token_hex(6)}", tipo, habitacion, entrada, salida,
+                                        self.precios[tipo] * (fin - inicio), ahora + self.duracion_apartado)
+                    self.conexion.execute("INSERT INTO estancias VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                          (apartado.id, tipo, habitacion, inicio, fin, apartado.total, apartado.vence))
+                    return apartado
+            return None
+
+    def reservar_codigo(self) -> str:
+        """Código nuevo entre todos los procesos; se llama dentro de una transacción"""
+        while True:
+            codigo = "HTL" + "".join(secrets.choice(ALFABETO_CODIGO) for _ in range(6))
+            if self.conexion.execute("INSERT OR IGNORE INTO codigos VALUES (?)", (codigo,)).rowcount:
+                return codigo
+
+    def nuevo_codigo(self) -> str:
+        with self.lock, self.conexion:
+            self.conexion.execute("BEGIN IMMEDIATE")
+            return self.reservar_codigo()
+
+    def confirmar(self, id_apartado: str) -> Optional[str]:
+        with self.lock, self.conexion:
+            self.conexion.execute("BEGIN IMMEDIATE")
+            self.purgar_vencidos()
+            if self.conexion.execute("SELECT 1 FROM estancias WHERE id = ? AND vence IS NOT NULL",
+                                     (id_apartado,)).fetchone() is None:
+                return None
+            codigo = self.reservar_codigo()
+            self.conexion.execute("UPDATE estancias SET id = ?, vence = NULL WHERE id = ?", (codigo, id_apartado))
+            return codigo
+
+    def liberar(self, id_estancia: str) -> bool:
+        if not id_estancia:
+            return False
+        with self.lock, self.conexion:
+            self.conexion.execute("BEGIN IMMEDIATE")
+            return self.conexion.execute("DELETE FROM estancias WHERE id = ?", (id_estancia,)).rowcount > 0
+
+    def traslapes(self) -> List[Tuple[str, str, str]]:
+        with self.lock:
+            return self.conexion.execute(
+                "SELECT a.habitacion, a.id, b.id FROM estancias a JOIN estancias b "
+                "ON a.habitacion = b.habitacion AND a.id < b.id AND a.entrada < b.salida AND b.entrada < a.salida "
+                "WHERE (a.vence IS NULL OR a.vence > ?1) AND (b.vence IS NULL OR b.vence > ?1)",
+                (time.time(),)).fetchall()
+
+    def cerrar(self):
+        self.conexion.close()
+
+
+# ----------------------------- Máquina de estados de la conversación ----------------------------- #
+
+# Patrones de los estados, compilados una vez al importar
+# Las regex de los estados se normalizan igual que el texto que reciben (normalized_input)
+RE_NEGATIVA = re.compile(normalizar_patron(
+    r'\b(no|nada|ya\s+no|no\s+quiero|no\s+deseo|cancelar|salir|mejor\s+no|ni\s+modo|d[eé]jalo|ol[vb]i[d]?a(lo)?|ol[vb]i[d]?a(lo)?|ol[vb]i[d]?alo)\b'
+    r'|^(nop|nel|nope)$'
+))
+# Palabras completas: "si" suelto también aparece en "presidencial" y "básica"
+RE_AFIRMATIVA = re.compile(normalizar_patron(r"\b(sí|si|ok|okay|vale|claro|perfecto|genial|excelente)\b"))
+RE_ESTANDAR = re.compile(normalizar_patron(r"est[aá]ndar|b[aá]sica"))
+RE_SUPERIOR = re.compile(normalizar_patron(r"superior"))
+RE_SUITE = re.compile(normalizar_patron(r"suite|junior"))
+RE_PRESIDENCIAL = re.compile(normalizar_patron(r"presidencial"))
+RE_CONFIRMAR_RESERVA = re.compile(normalizar_patron(r"\b(sí|si|claro)\b|reservar|confirmar|adelante|proceder"))
+RE_CONFIRMAR_CANCELACION = re.compile(normalizar_patron(r"\b(sí|si|claro)\b|cancelar|confirmar"))
+RE_NUMERO = re.compile(r'\d+')
+RE_TELEFONO = re.compile(r'[\d\-\(\)\+\s]+')
+RE_NO_DIGITO = re.compile(r'\D')
+RE_SALIR_MENU = re.compile(normalizar_patron(r"\b(salir|ya\s*no|terminar|cancelar)\b"))
+
+
+@lru_cache(maxsize=256)
+def patron_opcion(opcion: str) -> re.Pattern:
+    """Regex normalizada de una opción de menú; las opciones vienen de intents.json y se repiten"""
+    return re.compile(normalizar_patron(opcion))
+
+
+class EstadoConversacion(NamedTuple):
+    nombre: str
+    manejador: Callable
+    transiciones: Optional[FrozenSet[Optional[str]]]  # None: puede pasar a cualquier estado
+
+
+# Tabla de despacho: estado -> manejador. Se llena al definir HotelChatBot.
+MANEJADORES_ESTADO: Dict[str, EstadoConversacion] = {}
+
+
+def estado(nombre: str, transiciones=None):
+    """Registra un método como manejador del estado `nombre`.
+
+    `transiciones` son los estados a los que puede pasar además de quedarse
+    igual; se verifica después de cada mensaje.
+    """
+    def registrar(metodo):
+        permitidas = None if transiciones is None else frozenset(transiciones) | {nombre}
+        MANEJADORES_ESTADO[nombre] = EstadoConversacion(nombre, metodo, permitidas)
+        return metodo
+    return registrar
+
+
+class HotelChatBot:
+    def __init__(self, corrector: str = "symspell", modelo: Optional[ModeloChatBot] = None,
+                 cache: Optional[CacheDecisiones] = None, umbral_clasificador: Optional[float] = UMBRAL_CLASIFICADOR,
+                 instrumentacion: Optional[Instrumentacion] = None, almacen: Optional[AlmacenSesiones] = None,
+                 retener_sesiones: bool = True, inventario: Optional[InventarioHabitaciones] = None,
+                 grabador: Optional[GrabadorTranscripciones] = None):
+        # Varios bots (o uno con muchas sesiones) pueden compartir el mismo modelo ya cargado
+        self.modelo = modelo or cargar_modelo(corrector)
+        self.cache = cache if cache is not None else CacheDecisiones()
+        # None desactiva el respaldo estadístico y deja sólo las regex
+        self.umbral_clasificador = umbral_clasificador
+        # Sin instrumentación (None) el camino de cada mensaje no mide nada
+        self.instrumentacion = instrumentacion
+        # Modelo recargado que espera al siguiente turno para entrar en uso
+        self.modelo_pendiente: Optional[ModeloChatBot] = None
+        self.ultima_recarga: Dict = {}
+        self.recargador: Optional[RecargadorIntents] = None
+        self.lock_recarga = threading.Lock()
+        # Con almacén, las sesiones se cargan al primer mensaje y se guardan al final de
+        # cada turno; sin retener_sesiones el bot no guarda ninguna entre turnos
+        self.almacen = almacen
+        self.retener_sesiones = retener_sesiones
+        # Habitaciones por fecha; varios bots del mismo proceso pueden compartirlo
+        self.inventario = inventario or InventarioHabitaciones()
+        # Con grabador, cada turno queda en la transcripción (corrección, estados, intent y respuesta)
+        self.grabador = grabador
+        if grabador is not None and grabador.huella_modelo is None:
+            grabador.huella_modelo = self.modelo.huella
+        self.sesiones: Dict[str, SesionChat] = {}
+        self.id_sesion = SESION_CLI
+        self.sesion = self.usar_sesion(SESION_CLI)
+        # Salida del turno en curso; respond() la reinicia en cada mensaje
+        self.mensajes: List[str] = []
+        self.opciones: List[str] = []
+        self.corregido_turno = ""
+        self.intent_turno: Optional[Dict] = None
+        # estado -> [llamadas, ns totales, ns máximo]
+        # Con todos los estados desde el principio: /metricas la recorre desde otro hilo
+        # mientras los turnos la actualizan, y así nunca cambia de tamaño
+        self.metricas_estados: Dict[str, List[int]] = {nombre: [0, 0, 0] for nombre in MANEJADORES_ESTADO}
+
+    def usar_sesion(self, session_id: str) -> SesionChat:
+        """Activa la sesión indicada: la de memoria, la del almacén o una nueva"""
+        sesion = self.sesiones.get(session_id)
+        if sesion is None:
+            if self.almacen is not None:
+                sesion = self.almacen.cargar(session_id)
+            if sesion is None:
+                sesion = SesionChat()
+            self.sesiones[session_id] = sesion
+        self.sesion = sesion
+        self.id_sesion = session_id
+        return sesion
+
+    def liberar_sesion(self, session_id: str):
+        """Saca la sesión de memoria; si hay almacén, la conversación sigue desde ahí"""
+        sesion = self.sesiones.pop(session_id, None)
+        if sesion is not None and self.almacen is not None:
+            self.almacen.guardar(session_id, sesion)
+
+    def cerrar_sesion(self, session_id: str):
+        """Termina la conversación: se olvida en memoria y en el almacén"""
+        self.sesiones.pop(session_id, None)
+        if self.almacen is not None:
+            self.almacen.borrar(session_id)
+
+    def recargar(self) -> bool:
+        """Reconstruye el modelo desde intents.json; devuelve False si el archivo no es válido"""
+        inicio = time.perf_counter()
+        try:
+            nuevo = cargar_modelo_validado(self.modelo.nombre_corrector)
+        except (OSError, ValueError) as e:
+            self.ultima_recarga = {"ok": False, "error": str(e), "ms": (time.perf_counter() - inicio) * 1e3}
+            print(f"Recarga de {INTENTS_FILE} rechazada, se conserva el modelo anterior: {e}", file=sys.stderr)
+            return False
+
+        self.ultima_recarga = {"ok": True, "huella": nuevo.huella, "intents": len(nuevo.intents),
+                               "ms": (time.perf_counter() - inicio) * 1e3}
+        with self.lock_recarga:
+            if nuevo.huella != self.modelo.huella:
+                self.modelo_pendiente = nuevo
+        print(f"{INTENTS_FILE} recargado en {self.ultima_recarga['ms']:.0f} ms "
+              f"({len(nuevo.intents)} intents)", file=sys.stderr)
+        return True
+
+    def vigilar_intents(self, intervalo: float = 2.0):
+        """Recarga el modelo automáticamente cuando cambie intents.json"""
+        if self.recargador is None:
+            self.recargador = RecargadorIntents(self, intervalo)
+            self.recargador.start()
+
+    def decir(self, texto: str):
+        """Agrega un mensaje del bot a la respuesta del turno"""
+        self.mensajes.append(texto)
+
+    def agregar_linea(self, texto: str):
+        """Agrega una línea (opción, precio, detalle) al último mensaje del bot"""
+        if self.mensajes:
+            self.mensajes[-1] += "\n" + texto
+        else:
+            self.mensajes.append(texto)
+
+    # El código de los estados trabaja sobre la sesión activa
+    @property
+    def state(self) -> Optional[str]:
+        return self.sesion.state
+
+    @state.setter
+    def state(self, value: Optional[str]):
+        self.sesion.state = value
+
+    @property
+    def context(self) -> Dict:
+        return self.sesion.context
+
+    @context.setter
+    def context(self, value: Dict):
+        self.sesion.context = value
+
+    @property
+    def intents(self) -> List[Dict]:
+        return self.modelo.intents
+
+    @property
+    def lista_palabras(self) -> List[str]:
+        return self.modelo.lista_palabras
 
     def corregir_texto(self, texto: str, lista_palabras: List[str]) -> str:
+        # El índice del corrector se construyó con self.lista_palabras; para otra lista se usa difflib
+        corrector = self.modelo.corrector if lista_palabras is self.lista_palabras else CorrectorDifflib(lista_palabras)
+        return self.corregir(texto, corrector=corrector)[0]
+
+    def corregir(self, texto: str, normalizado: Optional[str] = None, corrector=None) -> Tuple[str, str]:
+        """(texto corregido para mostrar, el mismo normalizado para comparar).
+
+        El corrector trabaja sobre las palabras de `normalizado` (se calcula si
+        no se da); las palabras sin corrección conservan su forma original.
+        """
+        corrector = corrector or self.modelo.corrector
+        formas = self.modelo.formas
+        inst = self.instrumentacion
         palabras = texto.split()
+        normalizadas = (normalizado if normalizado is not None else normalizar(texto)).split()
+        if len(normalizadas) != len(palabras):
+            # Una "palabra" hecha sólo de marcas combinantes desaparece al normalizar
+            normalizadas = [normalizar(p) for p in palabras]
         palabras_corregidas = []
+        normalizadas_corregidas = []
 
-        for palabra in palabras:
+        for palabra, normalizada in zip(palabras, normalizadas):
             # Primero revisar el diccionario de correcciones rápidas
-            if palabra.lower() in correcciones_rapidas:
-                palabras_corregidas.append(correcciones_rapidas[palabra.lower()])
+            if normalizada in correcciones_rapidas:
+                correccion = correcciones_rapidas[normalizada]
+                palabras_corregidas.append(correccion)
+                normalizadas_corregidas.append(normalizar(correccion))
                 continue
 
-            # Luego aplicar get_close_matches
-            match = get_close_matches(palabra.lower(), lista_palabras, n=1, cutoff=0.8)
-            if match:
-                palabras_corregidas.append(match[0])
+            # Luego buscar la palabra más parecida del vocabulario
+            match = corrector.buscar(normalizada, inst)
+            if match and match != normalizada:
+                palabras_corregidas.append(formas.get(match, match))
+                normalizadas_corregidas.append(match)
             else:
                 palabras_corregidas.append(palabra)
-        
-        return " ".join(palabras_corregidas)
+                normalizadas_corregidas.append(normalizada)
 
-    def cargar_palabras_clave(self, intents) -> List[str]:
-        palabras = []
-        for intent in intents:
-            for pattern in intent.get("patterns", []):
-                # Solo añadimos palabras "normales", no regex con []
-                if not re.search(r"[\[\]\(\)\|]", pattern):
-                    palabras.extend(pattern.lower().split())
-        return list(set(palabras))
-
-    # In the HotelChatBot class, modify the match_intent method:
+        return " ".join(palabras_corregidas), " ".join(normalizadas_corregidas)
 
     def match_intent(self, text: str) -> Optional[Dict]:
-        matched_intents = []
+        """Intent de las regex para un texto ya normalizado"""
+        return self.modelo.matcher.match(text, self.instrumentacion)
 
-        for intent in self.intents:
-            for pattern in intent.get("patterns", []):
-                if re.search(pattern, text, re.IGNORECASE):
-                    matched_intents.append(intent)
-                    break
+    def clasificar_respaldo(self, text: str) -> Optional[Dict]:
+        """Intent del clasificador de n-gramas si su confianza alcanza el umbral"""
+        if self.umbral_clasificador is None:
+            return None
+        intent, confianza = self.modelo.clasificador.clasificar(text)
+        return intent if confianza >= self.umbral_clasificador else None
 
-        # Prioritize problem-related intents
-        priority_tags = ["problema_habitacion", "emergencia_medica", "objetos_perdidos", "asistencia_general"]
-
-        for tag in priority_tags:
-            for intent in matched_intents:
-                if intent["tag"] == tag:
-                    return intent
+    def es_negativa(self, texto: str) -> bool:
+        """Detecta si el usuario quiere cancelar o negar algo (texto normalizado)"""
+        return RE_NEGATIVA.search(texto) is not None
 
-        # Return the first match if no priority intent found
-        return matched_intents[0] if matched_intents else None
+    def reservar(self) -> Optional[str]:
+        """Confirma el apartado de la sesión; si venció, intenta apartar de nuevo.
 
-    def es_negativa(self, texto: str) -> bool:
-        """Detecta si el usuario quiere cancelar o negar algo"""
-        negativas = [
-            r'\b(no|nada|ya\s+no|no\s+quiero|no\s+deseo|cancelar|salir|mejor\s+no|ni\s+modo|d[eé]jalo|ol[vb]i[d]?a(lo)?|ol[vb]i[d]?a(lo)?|ol[vb]i[d]?alo)\b',
-            r'^(nop|nel|nope)$'
-        ]
+        Devuelve el código de reserva, o None si la habitación ya no está libre.
+        Sin fechas (sesiones anteriores al inventario) sólo se genera el código.
+        """
+        if "fechas" not in self.context:
+            return self.inventario.nuevo_codigo()
+        codigo = self.inventario.confirmar(self.context.pop("apartado", ""))
+        if codigo is None and "habitacion" in self.context:
+            fechas = RangoFechas.desde_dict(self.context["fechas"])
+            apartado = self.inventario.apartar(self.context["habitacion"], fechas.entrada, fechas.salida)
+            codigo = apartado and self.inventario.confirmar(apartado.id)
+        return codigo
 
-        for pattern in negativas:
-            if re.search(pattern, texto.lower()):
-                return True
-        return False
+    def hoy(self) -> date:
+        """Fecha desde la que se resuelven "mañana", "el viernes" o un "15 de enero" sin año"""
+        return date.today()
 
     def es_fecha_valida(self, texto: str) -> bool:
-        """Valida si el texto contiene información de fechas válida"""
-        # Patrones para detectar fechas
-        patrones_fecha = [
-            r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',       # 15/01/2024
-            r'\d{1,2}\s+de\s+\w+',                  # 15 de enero
-            r'(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|octubre|noviembre|diciembre)',
-            r'(lunes|martes|mi[eé]rcoles|jueves|viernes|s[aá]bado|domingo)',
-            r'(ma[ñn]ana|pasado\s+ma[ñn]ana|pr[oó]ximo|siguiente)',
-            r'(hoy|ayer)',
-            r'\d{1,2}\s*al\s*\d{1,2}',
-            r'del\s+\d{1,2}\s+al\s+\d{1,2}',
-        ]
-  
-        for patron in patrones_fecha:
-            if re.search(patron, texto.lower()):
-                return True
-        return False
-
-    def handle_special_states(self, user_input: str) -> bool:
-        normalized_input = user_input.strip().lower()
-
-        if self.state == "esperando_nombre":
-            if self.es_negativa(user_input):
-                print("Bot: Está bien, no es necesario que me digas tu nombre. ¿En qué más puedo ayudarte?")
-                self.state = None
-                return True
-            
-            name = user_input.strip().title()
-            self.context["user_name"] = name
-            print(f"Bot: ¡Mucho gusto, {name}!")
+        """Valida si el texto (normalizado) contiene información de fechas válida"""
+        return interpretar_fechas(texto) is not None
+
+    def handle_special_states(self, user_input: str, normalized_input: str) -> bool:
+        entrada = MANEJADORES_ESTADO.get(self.state)
+        if entrada is None:
+            return False
+
+        anterior = self.state
+        inicio = time.perf_counter_ns()
+        entrada.manejador(self, user_input, normalized_input)
+        transcurrido = time.perf_counter_ns() - inicio
+
+        metricas = self.metricas_estados[anterior]
+        metricas[0] += 1
+        metricas[1] += transcurrido
+        metricas[2] = max(metricas[2], transcurrido)
+        if self.instrumentacion is not None:
+            self.instrumentacion.observar("estados", transcurrido)
+
+        if entrada.transiciones is not None and self.state not in entrada.transiciones:
+            raise RuntimeError(f"Transición no declarada: {anterior} -> {self.state}")
+        return True
+
+    def reporte_estados(self) -> Dict[str, Dict[str, float]]:
+        """Llamadas y latencia (promedio y máxima, en microsegundos) de cada estado"""
+        return {
+            nombre: {"llamadas": n, "promedio_us": total / n / 1e3, "max_us": maximo / 1e3}
+            for nombre, (n, total, maximo) in self.metricas_estados.items() if n
+        }
+
+    def metricas(self) -> Dict:
+        """Instantánea JSON de contadores, latencia por etapa, caché y estados"""
+        inst = self.instrumentacion
+        contadores = inst.copia_contadores() if inst is not None else {}
+        for nombre, valor in self.cache.estadisticas().items():
+            if nombre != "entradas":
+                contadores[f"cache_{nombre}"] = valor
+        return {
+            "contadores": contadores,
+            "etapas": inst.etapas() if inst is not None else {},
+            "estados": self.reporte_estados(),
+        }
+
+    @estado("esperando_nombre", transiciones=(None,))
+    def estado_esperando_nombre(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Está bien, no es necesario que me digas tu nombre. ¿En qué más puedo ayudarte?")
             self.state = None
-            return True
+            return
 
-        if self.state == "esperando_fechas":
-            # Verificar si el usuario quiere cancelar
-            if self.es_negativa(user_input):
-                print("Bot: Entendido, cancelamos la consulta de disponibilidad. ¿Hay algo más en lo que pueda ayudarte?")
-                self.state = None
-                return True
-            
-            # Verificar si la respuesta contiene información de fechas
-            if not self.es_fecha_valida(user_input):
-                print("Bot: No reconozco esas fechas. Por favor, especifica fechas como:")
-                print("- '15 de enero al 20 de enero'")
-                print("- '15/01/2024 al 20/01/2024'")
-                print("- 'próximo fin de semana'")
-                print("- O escribe 'no' si prefieres cancelar")
-                return True
-            
-            self.context["fechas_solicitadas"] = user_input
-            print(f"Bot: Consultando disponibilidad para {user_input}...")
-            print("\nBot: Disponibilidad encontrada:")
-            print("Habitación Estándar: $1,200/noche")
-            print("Habitación Superior: $1,800/noche")
-            print("Suite Junior: $2,500/noche")
-            print("Suite Presidencial: $4,000/noche")
-            print("\nBot: ¿Te interesa alguna de estas opciones?")
-            self.state = "esperando_seleccion_habitacion"
-            return True
+        name = user_input.strip().title()
+        self.context["user_name"] = name
+        self.decir(f"¡Mucho gusto, {name}!")
+        self.state = None
 
-        if self.state == "esperando_seleccion_habitacion":
-            if self.es_negativa(user_input):
-                print("Bot: Entendido, no procederemos con la reserva. ¿Hay algo más en lo que pueda ayudarte?")
-                self.state = None
-                return True
-            
-            # Verificar si es una respuesta afirmativa general
-            if re.search(r"(sí|si|ok|vale|claro|perfecto|genial|excelente)", normalized_input):
-                print("Bot: ¡Perfecto! ¿Cuál tipo de habitación te interesa?")
-                print("- Estándar ($1,200/noche)")
-                print("- Superior ($1,800/noche)")
-                print("- Suite Junior ($2,500/noche)")
-                print("- Suite Presidencial ($4,000/noche)")
-                return True
-                
-            if re.search(r"est[aá]ndar|b[aá]sica", normalized_input):
-                self.context["habitacion"] = "Estándar"
-                print("Bot: ¡Excelente elección! La estándar incluye cama queen, TV y WiFi.")
-            elif re.search(r"superior", normalized_input):
-                self.context["habitacion"] = "Superior"
-                print("Bot: ¡Perfecta selección! La superior incluye cama king, minibar y balcón.")
-            elif re.search(r"suite|junior", normalized_input):
-                self.context["habitacion"] = "Suite Junior"
-                print("Bot: ¡Magnífica opción! Incluye jacuzzi, sala y desayuno.")
-            elif re.search(r"presidencial", normalized_input):
-                self.context["habitacion"] = "Suite Presidencial"
-                print("Bot: ¡La mejor opción! Incluye mayordomo, terraza privada y comidas incluidas.")
-            else:
-                print("Bot: No reconozco esa opción. Por favor especifica:")
-                print("- 'estándar' o 'básica'")
-                print("- 'superior'")
-                print("- 'suite junior'")
-                print("- 'presidencial'")
-                print("- O 'no' para cancelar")
-                return True
-
-            print("\nBot: ¿Deseas proceder con la reserva? (sí/no)")
-            self.state = "esperando_confirmacion_reserva"
-            return True
+    @estado("esperando_fechas", transiciones=(None, "esperando_seleccion_habitacion"))
+    def estado_esperando_fechas(self, user_input: str, normalized_input: str):
+        # Verificar si el usuario quiere cancelar
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido, cancelamos la consulta de disponibilidad. ¿Hay algo más en lo que pueda ayudarte?")
+            self.state = None
+            return
 
-        if self.state == "esperando_confirmacion_reserva":
-            if re.search(r"(sí|si|claro|reservar|confirmar|adelante|proceder)", normalized_input):
-                code = f"HTL{random.randint(1000,9999)}"
-                print("\nBot: ¡Reserva confirmada!")
-                print(f"Código: {code}")
-                print(f"Habitación: {self.context.get('habitacion','N/A')}")
-                print(f"Fechas: {self.context.get('fechas_solicitadas','N/A')}")
-                self.context["reserva"] = code
-            elif self.es_negativa(user_input):
-                print("Bot: Entendido, no se realizó la reserva. ¿Hay algo más en lo que pueda ayudarte?")
+        # Llegada y salida estructuradas; sin ninguna fecha reconocible se vuelve a pedir
+        fechas = interpretar_fechas(normalized_input, self.hoy())
+        if fechas is None:
+            # El ejemplo numérico se arma desde hoy: uno fijo termina siendo una fecha pasada
+            ejemplo = self.hoy() + timedelta(days=14)
+            self.decir("No reconozco esas fechas. Por favor, especifica fechas como:")
+            self.agregar_linea("- '15 de enero al 20 de enero'")
+            self.agregar_linea(f"- '{ejemplo:%d/%m/%Y} al {ejemplo + timedelta(days=5):%d/%m/%Y}'")
+            self.agregar_linea("- 'próximo fin de semana'")
+            self.agregar_linea("- O escribe 'no' si prefieres cancelar")
+            return
+        if fechas.entrada < self.hoy():
+            self.decir(f"Esas fechas ({fechas.describir()}) ya pasaron. ¿Para qué fechas deseas consultar?")
+            return
+
+        self.context["fechas_solicitadas"] = user_input
+        self.context["fechas"] = fechas.como_dict()
+        self.decir(f"Consultando disponibilidad {fechas.describir()}...")
+        if fechas.salida_supuesta:
+            self.agregar_linea("Consideré una noche; dime si necesitas más.")
+        libres = self.inventario.disponibilidad(fechas.entrada, fechas.salida)
+        if not any(libres.values()):
+            self.decir("Lo siento, no tenemos habitaciones libres en esas fechas. ¿Quieres probar con otras?")
+            return
+        self.decir("Disponibilidad encontrada:")
+        for tipo, cantidad in libres.items():
+            nombre = tipo if tipo.startswith("Suite") else f"Habitación {tipo}"
+            if cantidad:
+                self.agregar_linea(f"{nombre}: ${self.inventario.precios[tipo]:,}/noche "
+                                   f"({cantidad} libre{'s' if cantidad != 1 else ''})")
             else:
-                print("Bot: Por favor responde 'sí' para confirmar la reserva o 'no' para cancelar.")
-                return True
+                self.agregar_linea(f"{nombre}: agotada")
+        self.decir("¿Te interesa alguna de estas opciones?")
+        self.state = "esperando_seleccion_habitacion"
+
+    @estado("esperando_seleccion_habitacion", transiciones=(None, "esperando_confirmacion_reserva"))
+    def estado_esperando_seleccion_habitacion(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido, no procederemos con la reserva. ¿Hay algo más en lo que pueda ayudarte?")
             self.state = None
-            return True
+            return
 
-        if self.state == "esperando_numero_habitacion":
-            if self.es_negativa(user_input):
-                print("Bot: Entendido, cancelamos el reporte. ¿Hay algo más en lo que pueda ayudarte?")
+        if RE_ESTANDAR.search(normalized_input):
+            tipo, detalle = "Estándar", "¡Excelente elección! La estándar incluye cama queen, TV y WiFi."
+        elif RE_SUPERIOR.search(normalized_input):
+            tipo, detalle = "Superior", "¡Perfecta selección! La superior incluye cama king, minibar y balcón."
+        elif RE_PRESIDENCIAL.search(normalized_input):  # antes que "suite": "suite presidencial"
+            tipo, detalle = "Suite Presidencial", "¡La mejor opción! Incluye mayordomo, terraza privada y comidas incluidas."
+        elif RE_SUITE.search(normalized_input):
+            tipo, detalle = "Suite Junior", "¡Magnífica opción! Incluye jacuzzi, sala y desayuno."
+        elif RE_AFIRMATIVA.search(normalized_input):
+            # Un sí sin tipo ("sí, me interesa"): se ofrecen los tipos con el precio del inventario
+            self.decir("¡Perfecto! ¿Cuál tipo de habitación te interesa?")
+            for tipo, precio in self.inventario.precios.items():
+                self.agregar_linea(f"- {tipo} (${precio:,}/noche)")
+            return
+        else:
+            self.decir("No reconozco esa opción. Por favor especifica:")
+            self.agregar_linea("- 'estándar' o 'básica'")
+            self.agregar_linea("- 'superior'")
+            self.agregar_linea("- 'suite junior'")
+            self.agregar_linea("- 'presidencial'")
+            self.agregar_linea("- O 'no' para cancelar")
+            return
+
+        # Con fechas, la habitación queda apartada mientras el huésped confirma
+        if "fechas" in self.context:
+            fechas = RangoFechas.desde_dict(self.context["fechas"])
+            apartado = self.inventario.apartar(tipo, fechas.entrada, fechas.salida)
+            if apartado is None:
+                self.decir(f"Lo siento, ya no quedan habitaciones {tipo} libres en esas fechas. "
+                           f"¿Te interesa otro tipo?")
+                return
+            self.inventario.liberar(self.context.pop("apartado", ""))
+            self.context["apartado"] = apartado.id
+        self.context["habitacion"] = tipo
+        self.decir(detalle)
+        if "fechas" in self.context:
+            self.agregar_linea(f"Total: ${apartado.total:,} por {fechas.noches} noche{'s' if fechas.noches != 1 else ''}. "
+                               f"Te la guardo {self.inventario.duracion_apartado // 60:.0f} minutos.")
+        self.decir("¿Deseas proceder con la reserva? (sí/no)")
+        self.state = "esperando_confirmacion_reserva"
+
+    @estado("esperando_confirmacion_reserva", transiciones=(None,))
+    def estado_esperando_confirmacion_reserva(self, user_input: str, normalized_input: str):
+        if RE_CONFIRMAR_RESERVA.search(normalized_input):
+            code = self.reservar()
+            if code is None:
+                self.decir("Lo siento, la habitación se liberó mientras esperaba y ya la tomó otro huésped. "
+                           "¿Quieres consultar otras fechas?")
                 self.state = None
-                return True
-                
-            num = re.search(r'\d+', normalized_input)
-            if num:
-                print(f"Bot: Reporte registrado para habitación {num.group()}.")
-                print("Bot: Mantenimiento llegará en 15 minutos.")
+                return
+            self.decir("¡Reserva confirmada!")
+            self.agregar_linea(f"Código: {code}")
+            self.agregar_linea(f"Habitación: {self.context.get('habitacion','N/A')}")
+            if "fechas" in self.context:
+                fechas = RangoFechas.desde_dict(self.context["fechas"])
+                self.agregar_linea(f"Fechas: {fechas.describir()}")
             else:
-                print("Bot: Proporciona un número de habitación válido (ejemplo: '105', 'habitación 205')")
-                print("Bot: O escribe 'no' para cancelar")
-                return True
+                self.agregar_linea(f"Fechas: {self.context.get('fechas_solicitadas','N/A')}")
+            self.context["reserva"] = code
+        elif self.es_negativa(normalized_input):
+            self.inventario.liberar(self.context.pop("apartado", ""))
+            self.decir("Entendido, no se realizó la reserva. ¿Hay algo más en lo que pueda ayudarte?")
+        else:
+            self.decir("Por favor responde 'sí' para confirmar la reserva o 'no' para cancelar.")
+            return
+        self.state = None
+
+    @estado("esperando_numero_habitacion", transiciones=(None,))
+    def estado_esperando_numero_habitacion(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido, cancelamos el reporte. ¿Hay algo más en lo que pueda ayudarte?")
             self.state = None
-            return True
+            return
 
+        num = RE_NUMERO.search(normalized_input)
+        if num:
+            self.decir(f"Reporte registrado para habitación {num.group()}.")
+            self.decir("Mantenimiento llegará en 15 minutos.")
+        else:
+            self.decir("Proporciona un número de habitación válido (ejemplo: '105', 'habitación 205')")
+            self.decir("O escribe 'no' para cancelar")
+            return
+        self.state = None
 
-        if self.state == "cancel_reservacion":
-            if self.es_negativa(user_input):
-                print("Bot: Entendido. ¿Hay algo más en lo que pueda ayudarte?")
-                self.state = None
-                return True
-                
-            num = re.search(r'\d+', normalized_input)
-            if num:
-                print(f"Bot: Reservación cancelada.")
-                print("Bot: Que tenga un buen día.")
-            else:
-                print("Bot: Proporciona un número de habitación válido (ejemplo: '105', 'habitación 205')")
-                print("Bot: O escribe 'no' para cancelar")
-                return True
+    @estado("cancel_reservacion", transiciones=(None,))
+    def estado_cancel_reservacion(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido. ¿Hay algo más en lo que pueda ayudarte?")
             self.state = None
-            return True
+            return
 
-        if self.state == "emergency_room":
-            if self.es_negativa(user_input):
-                print("Bot: Entendido. ¿Hay algo más en lo que pueda ayudarte?")
-                self.state = None
-                return True
-                
-            num = re.search(r'\d+', normalized_input)
-            if num:
-                print(f"Bot: Servicios de emergencia en camino.")
-            else:
-                print("Bot: Proporciona un número de habitación válido (ejemplo: '105', 'habitación 205')")
-                print("Bot: O escribe 'no' para cancelar")
-                return True
+        num = RE_NUMERO.search(normalized_input)
+        if num:
+            self.decir(f"Reservación cancelada.")
+            self.decir("Que tenga un buen día.")
+        else:
+            self.decir("Proporciona un número de habitación válido (ejemplo: '105', 'habitación 205')")
+            self.decir("O escribe 'no' para cancelar")
+            return
+        self.state = None
+
+    @estado("emergency_room", transiciones=(None,))
+    def estado_emergency_room(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido. ¿Hay algo más en lo que pueda ayudarte?")
             self.state = None
-            return True
+            return
 
-        if self.state == "esperando_objeto_perdido":
-            if self.es_negativa(user_input):
-                print("Bot: Entendido, cancelamos el reporte. ¿Hay algo más en lo que pueda ayudarte?")
-                self.state = None
-                return True
-                
-            self.context["objeto"] = user_input
-            print(f"Bot: Registré tu reporte de objeto perdido: {user_input}")
-            print("Bot: Nuestro personal revisará y te contactará. ¿Me das un teléfono de contacto?")
-            self.state = "esperando_telefono_contacto"
-            return True
+        num = RE_NUMERO.search(normalized_input)
+        if num:
+            self.decir(f"Servicios de emergencia en camino.")
+        else:
+            self.decir("Proporciona un número de habitación válido (ejemplo: '105', 'habitación 205')")
+            self.decir("O escribe 'no' para cancelar")
+            return
+        self.state = None
 
-        if self.state == "esperando_telefono_contacto":
-            if self.es_negativa(user_input):
-                print("Bot: Entendido. Registramos tu reporte pero no podremos contactarte.")
-                self.state = None
-                return True
-                
-            phone = re.search(r'[\d\-\(\)\+\s]+', normalized_input)
-            if phone and len(re.sub(r'\D', '', phone.group())) >= 10:
-                print("Bot: Solicitud registrada con éxito. Te llamaremos si encontramos tu objeto.")
-                self.context["telefono"] = phone.group()
-            else:
-                print("Bot: Ingresa un número de teléfono válido (10 dígitos mínimo)")
-                print("Bot: Ejemplo: '55-1234-5678' o escribe 'no' para omitir")
-                return True
+    @estado("esperando_objeto_perdido", transiciones=(None, "esperando_telefono_contacto"))
+    def estado_esperando_objeto_perdido(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido, cancelamos el reporte. ¿Hay algo más en lo que pueda ayudarte?")
             self.state = None
-            return True
+            return
 
-        if self.state == "esperando_info_extra_spa":
-            options = self.context.get("info_extra_options_spa", [])
+        self.context["objeto"] = user_input
+        self.decir(f"Registré tu reporte de objeto perdido: {user_input}")
+        self.decir("Nuestro personal revisará y te contactará. ¿Me das un teléfono de contacto?")
+        self.state = "esperando_telefono_contacto"
 
-            # Detectar salida
-            if re.search(r"\b(salir|ya\s*no|terminar|cancelar)\b", normalized_input):
-                print("Bot: Perfecto, salimos del menú de información extra.")
-                self.state = None
-                return True
-
-            choice = None
-
-            # 1. Revisar si el usuario respondió con un número
-            num = re.search(r'\d+', normalized_input)
-            if num:
-                idx = int(num.group()) - 1
-                if 0 <= idx < len(options):
-                    choice = options[idx]
-
-            # 2. Revisar si coincide con el texto de alguna opción (ignorando acentos)
-            if not choice:
-                def normalize(text):
-                    text = text.lower()
-                    text = re.sub(r'[áàäâ]', 'a', text)
-                    text = re.sub(r'[éèëê]', 'e', text)
-                    text = re.sub(r'[íìïî]', 'i', text)
-                    text = re.sub(r'[óòöô]', 'o', text)
-                    text = re.sub(r'[úùüû]', 'u', text)
-                    text = re.sub(r'[ñ]', 'n', text)
-                    return text
-
-                user_norm = normalize(normalized_input)
-                for opt in options:
-                    if re.search(normalize(opt), user_norm):
-                        choice = opt
-                        break
-
-            if choice:
-                print(f"Bot: Claro, aquí tienes más información sobre '{choice}':")
-                # Respuestas personalizadas
-                if "horarios" in choice.lower():
-                    print("- Horarios disponibles: Lunes a Domingo, 9:00 - 21:00")
-                elif "parejas" in choice.lower():
-                    print("- Paquete para parejas: masaje relajante + cena romántica, $2,500")
-                elif "faciales" in choice.lower():
-                    print("- Tratamientos faciales especializados: hidratante, anti-edad, purificante")
-                elif "descuentos" in choice.lower():
-                    print("- Descuento del 15% al reservar 3 sesiones o más")
-                else:
-                    print("- Información no disponible por el momento.")
+    @estado("esperando_telefono_contacto", transiciones=(None,))
+    def estado_esperando_telefono_contacto(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido. Registramos tu reporte pero no podremos contactarte.")
+            self.state = None
+            return
 
-                # Volver a mostrar menú
-                print("\nBot: ¿Quieres saber de otra opción? (escribe el número, la palabra o 'salir' para terminar)")
-                for i, opt in enumerate(options, 1):
-                    print(f"   {i}. {opt}")
-                return True
+        phone = RE_TELEFONO.search(normalized_input)
+        if phone and len(RE_NO_DIGITO.sub('', phone.group())) >= 10:
+            self.decir("Solicitud registrada con éxito. Te llamaremos si encontramos tu objeto.")
+            self.context["telefono"] = phone.group()
+        else:
+            self.decir("Ingresa un número de teléfono válido (10 dígitos mínimo)")
+            self.decir("Ejemplo: '55-1234-5678' o escribe 'no' para omitir")
+            return
+        self.state = None
+
+    @estado("esperando_info_extra_spa", transiciones=(None,))
+    def estado_esperando_info_extra_spa(self, user_input: str, normalized_input: str):
+        options = self.context.get("info_extra_options_spa", [])
+
+        # Detectar salida
+        if RE_SALIR_MENU.search(normalized_input):
+            self.decir("Perfecto, salimos del menú de información extra.")
+            self.state = None
+            return
+
+        choice = None
+
+        # 1. Revisar si el usuario respondió con un número
+        num = RE_NUMERO.search(normalized_input)
+        if num:
+            idx = int(num.group()) - 1
+            if 0 <= idx < len(options):
+                choice = options[idx]
 
+        # 2. Revisar si coincide con el texto de alguna opción (ignorando acentos)
+        if not choice:
+            for opt in options:
+                if patron_opcion(opt).search(normalized_input):
+                    choice = opt
+                    break
+
+        if choice:
+            self.decir(f"Claro, aquí tienes más información sobre '{choice}':")
+            # Respuestas personalizadas
+            if "horarios" in choice.lower():
+                self.agregar_linea("- Horarios disponibles: Lunes a Domingo, 9:00 - 21:00")
+            elif "parejas" in choice.lower():
+                self.agregar_linea("- Paquete para parejas: masaje relajante + cena romántica, $2,500")
+            elif "faciales" in choice.lower():
+                self.agregar_linea("- Tratamientos faciales especializados: hidratante, anti-edad, purificante")
+            elif "descuentos" in choice.lower():
+                self.agregar_linea("- Descuento del 15% al reservar 3 sesiones o más")
             else:
-                print("Bot: No entendí tu elección. Responde con el número, la palabra de la opción o 'salir'.")
-                return True
+                self.agregar_linea("- Información no disponible por el momento.")
 
+            # Volver a mostrar menú
+            self.decir("¿Quieres saber de otra opción? (escribe el número, la palabra o 'salir' para terminar)")
+            self.opciones = options
+            for i, opt in enumerate(options, 1):
+                self.agregar_linea(f"   {i}. {opt}")
+            return
 
+        else:
+            self.decir("No entendí tu elección. Responde con el número, la palabra de la opción o 'salir'.")
 
-        if self.state == "esperando_info_extra":
-            intent_nuevo = self.match_intent(user_input)
-            if intent_nuevo and intent_nuevo["tag"] != "tipos_habitacion":
-                #print("Bot: Perfecto, cambiando de tema...")
-                self.state = None
-                self.respond(user_input)  # Procesar la nueva intención
-                return True
-            options = self.context.get("info_extra_options", [])
+    @estado("esperando_info_extra")
+    def estado_esperando_info_extra(self, user_input: str, normalized_input: str):
+        intent_nuevo = self.match_intent(normalized_input)
+        if intent_nuevo and intent_nuevo["tag"] != "tipos_habitacion":
+            #self.decir("Perfecto, cambiando de tema...")
+            self.state = None
+            self.procesar(user_input)  # Procesar la nueva intención
+            return
+        options = self.context.get("info_extra_options", [])
 
-            # Detectar salida
-            if re.search(r"\b(salir|ya\s*no|terminar|cancelar)\b", normalized_input):
-                print("Bot: Perfecto, salimos del menú de información extra.")
-                self.state = None
-                return True
-
-            choice = None
-
-            # 1. Revisar si el usuario respondió con un número
-            num = re.search(r'\d+', normalized_input)
-            if num:
-                idx = int(num.group()) - 1
-                if 0 <= idx < len(options):
-                    choice = options[idx]
-
-            # 2. Revisar si coincide con el texto de alguna opción
-            if not choice:
-                for opt in options:
-                    if re.search(opt.lower(), normalized_input):
-                        choice = opt
-                        break
-
-            if choice:
-                print(f"Bot: Claro, aquí tienes más información sobre '{choice}':")
-                # Respuestas personalizadas
-                if "amenidades" in choice.lower():
-                    print("- Todas las habitaciones incluyen WiFi, TV y aire acondicionado.")
-                elif "fotos" in choice.lower():
-                    print("- Puedes ver fotos en nuestra galería online: hotelparaiso.com/fotos")
-                elif "servicios exclusivos" in choice.lower():
-                    print("- Tenemos spa, gimnasio 24h y transportación al aeropuerto.")
-                elif "paquetes familiares" in choice.lower():
-                    print("- Paquete familiar: 2 adultos + 2 niños, con desayuno incluido.")
-                else:
-                    print("- Información no disponible por el momento.")
+        # Detectar salida
+        if RE_SALIR_MENU.search(normalized_input):
+            self.decir("Perfecto, salimos del menú de información extra.")
+            self.state = None
+            return
 
-                # Volvemos a mostrar menú
-                print("\nBot: ¿Quieres saber de otra opción? (escribe el número, la palabra o 'salir' para terminar)")
-                for i, opt in enumerate(options, 1):
-                    print(f"   {i}. {opt}")
-                return True
+        choice = None
 
-            else:
-                print("Bot: No entendí tu elección. Responde con el número, la palabra de la opción o 'salir'.")
-                return True
-        
-        if self.state == "esperando_modificacion_reserva":
-            if self.es_negativa(user_input):
-                print("Bot: Entendido, no haremos cambios. ¿Necesitas algo más?")
-                self.state = None
-                return True
+        # 1. Revisar si el usuario respondió con un número
+        num = RE_NUMERO.search(normalized_input)
+        if num:
+            idx = int(num.group()) - 1
+            if 0 <= idx < len(options):
+                choice = options[idx]
 
-            # Lógica simple para simular cambios
-            if "fechas" in user_input.lower():
-                print("Bot: Para cambiar las fechas, necesitaría cancelarla y crear una nueva. ¿Procedemos?")
-            elif "noche" in user_input.lower():
-                print("Bot: ¡Claro! He añadido una noche extra a tu reserva. El nuevo total se ajustará.")
-            else:
-                print(f"Bot: Entendido. He dejado una nota en tu reserva '{self.context['reserva']}' sobre: '{user_input}'.")
-            
-            print("Bot: ¿Hay algo más que pueda hacer por ti?")
-            self.state = None # Limpiamos el estado
-            return True
+        # 2. Revisar si coincide con el texto de alguna opción
+        if not choice:
+            for opt in options:
+                if patron_opcion(opt).search(normalized_input):
+                    choice = opt
+                    break
 
-        if self.state == "confirmar_cancelacion":
-            if re.search(r"(sí|si|claro|cancelar|confirmar)", user_input.lower()):
-                print(f"Bot: Tu reserva {self.context['reserva']} ha sido cancelada.")
-                # Eliminamos la reserva del contexto
-                del self.context['reserva']
+        if choice:
+            self.decir(f"Claro, aquí tienes más información sobre '{choice}':")
+            # Respuestas personalizadas
+            if "amenidades" in choice.lower():
+                self.agregar_linea("- Todas las habitaciones incluyen WiFi, TV y aire acondicionado.")
+            elif "fotos" in choice.lower():
+                self.agregar_linea("- Puedes ver fotos en nuestra galería online: hotelparaiso.com/fotos")
+            elif "servicios exclusivos" in choice.lower():
+                self.agregar_linea("- Tenemos spa, gimnasio 24h y transportación al aeropuerto.")
+            elif "paquetes familiares" in choice.lower():
+                self.agregar_linea("- Paquete familiar: 2 adultos + 2 niños, con desayuno incluido.")
             else:
-                print("Bot: De acuerdo, tu reserva no ha sido cancelada.")
-            
+                self.agregar_linea("- Información no disponible por el momento.")
+
+            # Volvemos a mostrar menú
+            self.decir("¿Quieres saber de otra opción? (escribe el número, la palabra o 'salir' para terminar)")
+            self.opciones = options
+            for i, opt in enumerate(options, 1):
+                self.agregar_linea(f"   {i}. {opt}")
+            return
+
+        else:
+            self.decir("No entendí tu elección. Responde con el número, la palabra de la opción o 'salir'.")
+
+    @estado("esperando_modificacion_reserva", transiciones=(None,))
+    def estado_esperando_modificacion_reserva(self, user_input: str, normalized_input: str):
+        if self.es_negativa(normalized_input):
+            self.decir("Entendido, no haremos cambios. ¿Necesitas algo más?")
             self.state = None
-            return True
-        return False
+            return
+
+        # Lógica simple para simular cambios
+        if "fechas" in normalized_input:
+            self.decir("Para cambiar las fechas, necesitaría cancelarla y crear una nueva. ¿Procedemos?")
+        elif "noche" in normalized_input:
+            self.decir("¡Claro! He añadido una noche extra a tu reserva. El nuevo total se ajustará.")
+        else:
+            self.decir(f"Entendido. He dejado una nota en tu reserva '{self.context['reserva']}' sobre: '{user_input}'.")
+
+        self.decir("¿Hay algo más que pueda hacer por ti?")
+        self.state = None # Limpiamos el estado
+
+    @estado("confirmar_cancelacion", transiciones=(None,))
+    def estado_confirmar_cancelacion(self, user_input: str, normalized_input: str):
+        if RE_CONFIRMAR_CANCELACION.search(normalized_input):
+            self.decir(f"Tu reserva {self.context['reserva']} ha sido cancelada.")
+            # Eliminamos la reserva del contexto y liberamos la habitación
+            self.inventario.liberar(self.context.pop('reserva'))
+        else:
+            self.decir("De acuerdo, tu reserva no ha sido cancelada.")
+
+        self.state = None
 
     def handle_followup(self, followup_data: Dict):
         if not followup_data:
             return
         ftype = followup_data.get("type")
         if ftype == "ask_name":
-            print("Bot: ¿Cómo te llamas? (o escribe 'no' si prefieres no decirme)")
+            self.decir("¿Cómo te llamas? (o escribe 'no' si prefieres no decirme)")
             self.state = "esperando_nombre"
         elif ftype == "ask_dates":
-            print("Bot: ¿Para qué fechas deseas consultar la disponibilidad?")
-            print("Bot: (puedes escribir 'no' para cancelar)")
+            self.decir("¿Para qué fechas deseas consultar la disponibilidad?")
+            self.decir("(puedes escribir 'no' para cancelar)")
             self.state = "esperando_fechas"
         elif ftype == "ask_room_number":
-            print("Bot: ¿Cuál es tu número de habitación?")
+            self.decir("¿Cuál es tu número de habitación?")
             self.state = "esperando_numero_habitacion"
         elif ftype == "ask_room_number_cancel":
-            print("Bot: ¿Cuál es tu número de habitación?")
+            self.decir("¿Cuál es tu número de habitación?")
             self.state = "cancel_reservacion"
         elif ftype == "ask_room_emergency":
-            print("Bot: ¿Cuál es tu número de habitación?")
+            self.decir("¿Cuál es tu número de habitación?")
             self.state = "emergency_room"
         elif ftype == "ask_lost_item":
-            print("Bot: ¿Qué objeto perdiste?")
+            self.decir("¿Qué objeto perdiste?")
             self.state = "esperando_objeto_perdido"
         elif ftype == "offer_more_info_spa":
             options = followup_data.get("options", [])
             if options:
-                print("Bot: ¿Quieres más información sobre:")
+                self.decir("¿Quieres más información sobre:")
+                self.opciones = options
                 for i, opt in enumerate(options, 1):
-                    print(f"   {i}. {opt}")
+                    self.agregar_linea(f"   {i}. {opt}")
                 self.state = "esperando_info_extra_spa"
                 self.context["info_extra_options_spa"] = options
         elif ftype == "offer_more_info":
             options = followup_data.get("options", [])
             if options:
-                print("Bot: ¿Quieres más información sobre:")
+                self.decir("¿Quieres más información sobre:")
+                self.opciones = options
                 for i, opt in enumerate(options, 1):
-                    print(f"   {i}. {opt}")
+                    self.agregar_linea(f"   {i}. {opt}")
                 self.state = "esperando_info_extra"
                 self.context["info_extra_options"] = options
 
-    def respond(self, user_input: str):
+    def respond(self, user_input: str, session_id: Optional[str] = None) -> RespuestaBot:
+        if session_id is not None:
+            self.usar_sesion(session_id)
+
+        # El cambio de modelo ocurre entre turnos
+        if self.modelo_pendiente is not None:
+            with self.lock_recarga:
+                self.modelo, self.modelo_pendiente = self.modelo_pendiente, None
+
+        self.mensajes = []
+        self.opciones = []
+        self.intent_turno = None
+        estado_antes = self.state
+        inst = self.instrumentacion
+        if inst is None:
+            self.procesar(user_input)
+        else:
+            inicio = time.perf_counter_ns()
+            self.procesar(user_input)
+            inst.observar("turno", time.perf_counter_ns() - inicio)
+            inst.contar("turnos")
+
+        if self.grabador is not None:
+            self.grabador.registrar((self.id_sesion, round(time.time(), 3), user_input, self.corregido_turno,
+                                     estado_antes, self.state,
+                                     self.intent_turno["tag"] if self.intent_turno else None,
+                                     self.mensajes, self.opciones))
+        if self.almacen is not None:
+            self.almacen.guardar(self.id_sesion, self.sesion)
+            if not self.retener_sesiones:
+                self.sesiones.pop(self.id_sesion, None)
+        return RespuestaBot(self.mensajes, self.state, self.opciones)
+
+    def decision(self, texto: str) -> list:
+        """Entrada de caché [corregido, normalizado, intent, momento] del texto, calculando la corrección si falta.
+
+        La corrección separa por espacios, así que el texto con los espacios
+        compactados da exactamente la misma corrección y sirve de llave. Es la
+        primera etapa del turno: aquí se normaliza el mensaje, una sola vez, y
+        el resultado normalizado es lo que usan corrector, matcher y estados.
+        """
+        clave = " ".join(texto.split())
+        entrada = self.cache.obtener(clave, self.modelo.huella)
+        if entrada is None:
+            inst = self.instrumentacion
+            if inst is None:
+                corregido, normalizado = self.corregir(clave, normalizar(clave))
+            else:
+                inicio = time.perf_counter_ns()
+                corregido, normalizado = self.corregir(clave, normalizar(clave))
+                inst.observar("correccion", time.perf_counter_ns() - inicio)
+            entrada = self.cache.guardar(clave, corregido, normalizado)
+        return entrada
+
+    def resolver_intent(self, texto: str) -> Optional[Dict]:
+        """Regex primero; el clasificador estadístico sólo si ninguna reconoce el mensaje"""
+        inst = self.instrumentacion
+        if inst is None:
+            return self.match_intent(texto) or self.clasificar_respaldo(texto)
+
+        inicio = time.perf_counter_ns()
+        intent = self.match_intent(texto)
+        fin = time.perf_counter_ns()
+        inst.observar("intent", fin - inicio)
+        if intent is None and self.umbral_clasificador is not None:
+            intent = self.clasificar_respaldo(texto)
+            inst.observar("respaldo", time.perf_counter_ns() - fin)
+            inst.contar("respaldo_consultas")
+            inst.contar("respaldo_aceptados", intent is not None)
+        return intent
+
+    def procesar(self, user_input: str):
         # Corrección de texto antes de procesar
-        user_input = self.corregir_texto(user_input, self.lista_palabras)
+        decision = self.decision(user_input)
+        user_input, normalizado = decision[0], decision[1]
+        self.corregido_turno = user_input
 
-        if self.handle_special_states(user_input):
+        # Los estados especiales dependen de la sesión: sólo usan el texto corregido
+        if self.handle_special_states(user_input, normalizado):
             return
 
-        intent = self.match_intent(user_input)
+        if decision[2] is SIN_RESOLVER:
+            decision[2] = self.resolver_intent(normalizado)
+        self.intent_turno = decision[2]
+
+        inst = self.instrumentacion
+        if inst is None:
+            self.responder_intent(decision[2])
+        else:
+            inicio = time.perf_counter_ns()
+            self.responder_intent(decision[2])
+            inst.observar("respuesta", time.perf_counter_ns() - inicio)
 
+    def responder_intent(self, intent: Optional[Dict]):
         # Interceptamos intents específicos si ya hay una reserva en el contexto
         if intent and "reserva" in self.context:
             tag = intent.get("tag")
             
             if tag == "gestion_reserva":
                 codigo_reserva = self.context["reserva"]
-                print(f"Bot: Veo que tienes una reserva activa con el código: {codigo_reserva}.")
-                print("Bot: ¿Qué te gustaría hacer? (ej: cambiar fechas, añadir una noche)")
+                self.decir(f"Veo que tienes una reserva activa con el código: {codigo_reserva}.")
+                self.decir("¿Qué te gustaría hacer? (ej: cambiar fechas, añadir una noche)")
                 self.state = "esperando_modificacion_reserva"
                 return
 
             if tag == "politica_cancelacion":
                 codigo_reserva = self.context["reserva"]
-                print(f"Bot: ¿Deseas cancelar tu reserva con el código {codigo_reserva}?")
-                print("Bot: Recuerda la política: cancelación gratuita hasta 48 horas antes.")
+                self.decir(f"¿Deseas cancelar tu reserva con el código {codigo_reserva}?")
+                self.decir("Recuerda la política: cancelación gratuita hasta 48 horas antes.")
                 self.state = "confirmar_cancelacion"
                 return
 
         if intent:
             resp = random.choice(intent.get("responses", []))
-            print(f"Bot: {resp}")
+            self.decir(resp)
             if "followup" in intent:
                 self.handle_followup(intent["followup"])
         else:
-            print("Bot: No entendí tu solicitud. ¿Podrías reformularla?")
+            self.decir("No entendí tu solicitud. ¿Podrías reformularla?")
 
     def run(self):
         print("Bot: ¡Bienvenido al Hotel Paraíso!")
@@ -520,11 +2280,19 @@ class HotelChatBot:
             user = input("Tú: ").strip()
             if not user:
                 continue
-            if user.lower() in ["adiós","bye","gracias","eso es todo","salir","hasta luego","exit","quit"]:
+            if normalizar(user) in ["adios","bye","gracias","eso es todo","salir","hasta luego","exit","quit"]:
                 print("Bot: ¡Gracias por tu tiempo! Hasta pronto.")
                 break
-            self.respond(user)
+            for mensaje in self.respond(user).mensajes:
+                print(f"Bot: {mensaje}")
 
 if __name__ == "__main__":
-    bot = HotelChatBot()
-    bot.run()
\ No newline at end of file
+    if sys.argv[1:] == ["--compilar"]:
+        # Se importa como módulo para que pickle registre las clases como ChatBot.*, no __main__.*
+        import ChatBot
+        resultado = ChatBot.compilar_artefacto()
+        print(f"{resultado['ruta']}: {resultado['bytes'] / 1e6:.1f} MB en {resultado['ms']:.0f} ms "
+              f"(intents {resultado['huella'][:12]})")
+    else:
+        bot = HotelChatBot()
+        bot.run()
\ No newline at end of file
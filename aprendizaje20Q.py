@@ -0,0 +1,447 @@
+import argparse
+import json
+import os
+import re
+import sys
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from motor20Q import (RUTA_ARBOL, SIN_TEXTO, Arbol20Q, Estado20Q, Salida20Q, paso, pedir_si_no)
+
+RUTA_BITACORA = "20Q_aprendido.jsonl"
+FORMATO_INSTANTANEA = 2
+REGISTROS_POR_INSTANTANEA = 1000    # registros aplicados entre instantáneas
+PARTIDAS_RECORDADAS = 10_000        # identificadores de partida que se recuerdan para no contarlas dos veces
+ARBOLES_ANTERIORES = 4          # versiones que se conservan para terminar partidas empezadas antes de un rebalanceo
+MIN_PARTIDAS_REBALANCEO = 100   # partidas nuevas antes de que valga la pena rebalancear
+RE_SIN_RESPUESTA = re.compile(r"NO CLASIFICADO|NO ESPECIFICADO|No se pudo clasificar")
+RE_NIVEL = re.compile(r"^(Q\d+):")
+
+
+class Bitacora:
+    """Registro de sólo agregar, en JSONL, de lo que el juego aprende.
+
+    Cada registro es una línea escrita con un solo write() sobre un archivo
+    abierto con O_APPEND: varios procesos pueden agregar a la vez sin pisarse
+    y lo que ya está escrito no se vuelve a tocar. Con durable=True además se
+    hace fsync antes de volver. Si un corte deja una línea a medias, al abrir
+    se cierra con un salto de línea y al leerla se descarta.
+    """
+
+    def __init__(self, ruta: str = RUTA_BITACORA):
+        self.ruta = ruta
+        self.fd = os.open(ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        tamano = os.fstat(self.fd).st_size
+        if tamano:
+            with open(ruta, "rb") as f:
+                f.seek(tamano - 1)
+                if f.read(1) != b"\n":
+                    os.write(self.fd, b"\n")
+        self.posicion = 0       # hasta dónde se leyó
+        self.invalidas = 0
+
+    def agregar(self, registro: Dict, durable: bool = False):
+        os.write(self.fd, (json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+        if durable:
+            os.fsync(self.fd)
+
+    def nuevos(self) -> List[Dict]:
+        """Registros completos agregados (por cualquier proceso) desde la última lectura"""
+        with open(self.ruta, "rb") as f:
+            f.seek(self.posicion)
+            datos = f.read()
+        # Una línea sin salto puede estar escribiéndose todavía: se lee la próxima vez
+        completos = datos[:datos.rfind(b"\n") + 1]
+        self.posicion += len(completos)
+        registros = []
+        for linea in completos.splitlines():
+            try:
+                registros.append(json.loads(linea))
+            except ValueError:
+                self.invalidas += linea.strip() != b""
+        return registros
+
+    def cerrar(self):
+        os.close(self.fd)
+
+
+def pesos_por_nodo(arbol: Arbol20Q, frecuencias: Counter, previa: int = 0) -> List[int]:
+    """Partidas que terminaron bajo cada nodo, más `previa` por hoja (`frecuencias` va por nodo de hoja)"""
+    pesos = [0] * len(arbol)
+    orden, pendientes = [], [0]
+    while pendientes:
+        nodo = pendientes.pop()
+        orden.append(nodo)
+        if not arbol.es_hoja(nodo):
+            pendientes += [arbol.si[nodo], arbol.no[nodo]]
+    for nodo in reversed(orden):
+        if arbol.es_hoja(nodo):
+            pesos[nodo] = frecuencias[nodo] + previa
+        else:
+            pesos[nodo] = pesos[arbol.si[nodo]] + pesos[arbol.no[nodo]]
+    return pesos
+
+
+def longitud_esperada(arbol: Arbol20Q, frecuencias: Counter) -> float:
+    """Preguntas promedio por partida si las partidas terminan en cada hoja según `frecuencias`
+
+    Sin partidas registradas, todas las hojas pesan lo mismo.
+    """
+    pesos = pesos_por_nodo(arbol, frecuencias)
+    if not pesos[0]:
+        pesos = pesos_por_nodo(arbol, frecuencias, previa=1)
+    # Cada pregunta la contestan todas las partidas que pasan por ella
+    return sum(pesos[n] for n in range(len(arbol)) if not arbol.es_hoja(n) and pesos[n]) / pesos[0]
+
+
+def cadena(arbol: Arbol20Q, nodo: int) -> List[int]:
+    """Preguntas alternativas que empiezan en `nodo`: la misma numeración ("Q3: ...") encadenada por el no.
+
+    Así escribió el código original los "elif" de una categoría: ¿Es un
+    animal? no -> ¿Es una planta? no -> ... Las preguntas sin número (las
+    aprendidas) o con otro número son refinamientos y no se mueven.
+    """
+    nivel = RE_NIVEL.match(arbol.textos[arbol.pregunta[nodo]])
+    eslabones = [nodo]
+    if nivel is None:
+        return eslabones
+    siguiente = arbol.no[nodo]
+    while not arbol.es_hoja(siguiente) and arbol.aviso[siguiente] == SIN_TEXTO:
+        otro = RE_NIVEL.match(arbol.textos[arbol.pregunta[siguiente]])
+        if otro is None or otro.group(1) != nivel.group(1):
+            break
+        eslabones.append(siguiente)
+        siguiente = arbol.no[siguiente]
+    return eslabones
+
+
+def rebalancear(arbol: Arbol20Q, frecuencias: Counter) -> Tuple[Arbol20Q, List[int]]:
+    """Árbol nuevo con cada cadena de alternativas ordenada por cuántas partidas terminan en ella.
+
+    Preguntar primero por la categoría más común es el orden que minimiza las
+    preguntas esperadas de una cadena; lo que no contesta ninguna alternativa
+    sigue al final. Con pesos iguales se respeta el orden del autor. El árbol
+    nuevo queda en preorden y, si nada cambió de orden ni se aprendió nada,
+    es idéntico al original (misma huella). Devuelve también el traslado:
+    traslado[nodo viejo] es el nodo nuevo.
+    """
+    pesos = pesos_por_nodo(arbol, frecuencias)
+    columnas: Dict[str, List[int]] = {"pregunta": [], "si": [], "no": [], "hoja": [], "aviso": []}
+    traslado = [SIN_TEXTO] * len(arbol)
+
+    def nuevo_nodo(pregunta: int, hoja: int, aviso: int) -> int:
+        i = len(columnas["pregunta"])
+        for nombre, valor in (("pregunta", pregunta), ("si", SIN_TEXTO), ("no", SIN_TEXTO),
+                              ("hoja", hoja), ("aviso", aviso)):
+            columnas[nombre].append(valor)
+        return i
+
+    def copiar(nodo: int) -> int:
+        if arbol.es_hoja(nodo):
+            traslado[nodo] = nuevo_nodo(SIN_TEXTO, arbol.hoja[nodo], arbol.aviso[nodo])
+            return traslado[nodo]
+        eslabones = cadena(arbol, nodo)
+        resto = arbol.no[eslabones[-1]]
+        eslabones = sorted(eslabones, key=lambda n: -pesos[arbol.si[n]])
+        primero = anterior = None
+        for eslabon in eslabones:
+            # El aviso (encabezado de la categoría) va con la primera pregunta, sea cual sea
+            i = nuevo_nodo(arbol.pregunta[eslabon], SIN_TEXTO, arbol.aviso[nodo] if primero is None else SIN_TEXTO)
+            traslado[eslabon] = i
+            if primero is None:
+                primero = i
+            else:
+                columnas["no"][anterior] = i
+            columnas["si"][i] = copiar(arbol.si[eslabon])
+            anterior = i
+        columnas["no"][anterior] = copiar(resto)
+        return primero
+
+    copiar(0)
+    return Arbol20Q(list(arbol.textos), *(columnas[c] for c in ("pregunta", "si", "no", "hoja", "aviso"))), traslado
+
+
+class Aprendiz:
+    """El árbol vivo: el árbol base más la bitácora, aplicada en el orden en que quedó escrita.
+
+    Nada se aplica al escribirlo: aprender() y pedir_rebalanceo() agregan a
+    la bitácora y sincronizar() aplica lo nuevo, venga de este proceso o de
+    otro. Así todos los procesos que comparten la bitácora llegan al mismo
+    árbol sin un candado sobre él. Insertar modifica el árbol en su lugar
+    (sin cambiar su huella); rebalancear arma uno nuevo fuera del camino de
+    las partidas y lo publica cambiando una referencia. Los anteriores se
+    guardan un tiempo para terminar las partidas que ya iban por ellos, con
+    el traslado de sus nodos al árbol que los reemplazó: una partida de un
+    árbol anterior se ubica en el actual por nodo, no por texto (varias
+    hojas dicen lo mismo, o nada).
+
+    Con ruta_instantanea, cada REGISTROS_POR_INSTANTANEA registros (y al
+    cerrar) se escribe todo lo anterior junto con la posición en la bitácora;
+    al empezar se carga y sólo se aplica lo que vino después. Un registro con
+    el identificador de una partida ya contada (un reintento) no se aplica.
+    """
+
+    def __init__(self, arbol: Arbol20Q, bitacora: Bitacora, ruta_instantanea: Optional[str] = None):
+        self.base = arbol.huella
+        self.arbol = arbol
+        self.bitacora = bitacora
+        self.ruta_instantanea = ruta_instantanea
+        self.anteriores: "OrderedDict[str, Arbol20Q]" = OrderedDict()
+        self.traslados: Dict[str, Tuple[str, List[int]]] = {}  # huella anterior -> (huella siguiente, traslado)
+        self.frecuencias: Counter = Counter()      # partidas terminadas por nodo de hoja del árbol actual
+        self.partidas_nuevas = 0                   # desde el último rebalanceo
+        self.aprendidos = 0
+        self.conflictos = 0
+        self.vistas: "OrderedDict[str, None]" = OrderedDict()  # "tipo:partida" ya aplicados
+        self.sin_instantanea = 0                   # registros aplicados desde la última instantánea
+        if ruta_instantanea:
+            self.cargar_instantanea()
+        self.sincronizar()
+
+    def arbol_de(self, huella: str) -> Arbol20Q:
+        if huella == self.arbol.huella:
+            return self.arbol
+        if huella in self.anteriores:
+            return self.anteriores[huella]
+        raise LookupError("La partida es de otra versión del árbol")
+
+    def registrar_partida(self, arbol: Arbol20Q, estado: Estado20Q):
+        """Anota en qué hoja terminó una partida; con eso se rebalancea"""
+        registro = {"t": "partida", "base": arbol.huella, "ruta": estado.respuestas,
+                    "hoja": arbol.texto(arbol.hoja[arbol.hoja_final(estado.nodo)])}
+        if estado.partida:
+            registro["partida"] = estado.partida
+        self.bitacora.agregar(registro)
+
+    def aprender(self, arbol: Arbol20Q, estado: Estado20Q, objeto: str, pregunta: str, si_objeto: bool):
+        """La partida terminó en una hoja que no era: se aprende `objeto` y la pregunta que lo separa.
+
+        Si otra partida ya aprendió en esa hoja, la ruta lleva a la pregunta
+        nueva; lo aprendido va en la hoja de antes, que quedó abajo.
+        """
+        hoja = arbol.hoja_final(estado.nodo)
+        if not arbol.es_hoja(hoja):
+            raise ValueError("Sólo se aprende al final de una partida")
+        objeto, pregunta = objeto.strip(), pregunta.strip()
+        if not objeto or not pregunta:
+            raise ValueError("Faltan el objeto o la pregunta")
+        registro = {"t": "aprende", "base": arbol.huella, "ruta": estado.respuestas,
+                    "hoja": arbol.texto(arbol.hoja[hoja]), "objeto": objeto, "pregunta": pregunta, "si": si_objeto}
+        if estado.partida:
+            registro["partida"] = estado.partida
+        self.bitacora.agregar(registro, durable=True)
+        self.sincronizar()
+
+    def pedir_rebalanceo(self):
+        self.bitacora.agregar({"t": "rebalanceo"}, durable=True)
+        self.sincronizar()
+
+    def sincronizar(self) -> int:
+        """Aplica lo que se agregó a la bitácora desde la última vez; devuelve cuántos registros"""
+        registros = self.bitacora.nuevos()
+        for registro in registros:
+            tipo = registro.get("t")
+            if self.repetido(registro):
+                continue
+            if tipo == "partida":
+                self.aplicar_partida(registro)
+            elif tipo == "aprende":
+                self.aplicar_aprendizaje(registro)
+            elif tipo == "rebalanceo":
+                self.aplicar_rebalanceo()
+        self.sin_instantanea += len(registros)
+        if self.ruta_instantanea and self.sin_instantanea >= REGISTROS_POR_INSTANTANEA:
+            self.guardar_instantanea()
+        return len(registros)
+
+    def repetido(self, registro: Dict) -> bool:
+        """El mismo tipo de registro para la misma partida ya se aplicó (un POST reintentado)"""
+        partida = registro.get("partida")
+        if not partida:
+            return False
+        clave = f"{registro.get('t')}:{partida}"
+        if clave in self.vistas:
+            return True
+        self.vistas[clave] = None
+        while len(self.vistas) > PARTIDAS_RECORDADAS:
+            self.vistas.popitem(last=False)
+        return False
+
+    def ubicar_hoja(self, registro: Dict) -> Optional[int]:
+        """La hoja del árbol actual donde terminó la partida de `registro`, o None si no se puede saber
+
+        La ruta se recorre en el árbol en que se jugó y el nodo pasa por el
+        traslado de cada rebalanceo posterior. De un árbol que ya no se
+        guarda sólo se acepta una hoja cuyo texto no se repita.
+        """
+        texto = registro.get("hoja")
+        huella = registro.get("base")
+        if huella == self.arbol.huella or huella in self.traslados:
+            arbol = self.arbol_de(huella)
+            nodo = arbol.hoja_final(arbol.recorrer(r == "s" for r in registro["ruta"]))
+            if not arbol.es_hoja(nodo):
+                return None
+            while huella != self.arbol.huella:
+                huella, traslado = self.traslados[huella]
+                nodo = self.arbol_de(huella).hoja_final(traslado[nodo])
+        else:
+            hojas = [n for n in range(len(self.arbol))
+                     if self.arbol.es_hoja(n) and self.arbol.texto(self.arbol.hoja[n]) == texto]
+            if len(hojas) != 1:
+                return None
+            nodo = hojas[0]
+        if texto is not None and self.arbol.texto(self.arbol.hoja[nodo]) != texto:
+            return None
+        return nodo
+
+    def aplicar_partida(self, registro: Dict):
+        try:
+            hoja = self.ubicar_hoja(registro)
+        except (KeyError, TypeError, IndexError):
+            hoja = None
+        if hoja is not None:
+            self.frecuencias[hoja] += 1
+            self.partidas_nuevas += 1
+
+    def aplicar_aprendizaje(self, registro: Dict):
+        try:
+            hoja = self.ubicar_hoja(registro)
+        except (KeyError, TypeError, IndexError):
+            hoja = None
+        if hoja is None:
+            self.conflictos += 1
+            return
+        nuevo = self.arbol.insertar(hoja, registro["pregunta"], registro["objeto"], bool(registro["si"]))
+        # Las partidas de la hoja vieja siguen en su copia, menos la que enseñó: era del objeto nuevo
+        partidas = self.frecuencias.pop(hoja, 0)
+        if partidas > 1:
+            self.frecuencias[self.arbol.previas[hoja]] = partidas - 1
+        self.frecuencias[nuevo] += 1
+        self.aprendidos += 1
+
+    def aplicar_rebalanceo(self):
+        nuevo, traslado = rebalancear(self.arbol, self.frecuencias)
+        self.partidas_nuevas = 0
+        if nuevo.huella == self.arbol.huella:
+            return
+        self.anteriores[self.arbol.huella] = self.arbol
+        self.traslados[self.arbol.huella] = (nuevo.huella, traslado)
+        while len(self.anteriores) > ARBOLES_ANTERIORES:
+            huella, _ = self.anteriores.popitem(last=False)
+            del self.traslados[huella]
+        self.frecuencias = Counter({traslado[nodo]: n for nodo, n in self.frecuencias.items() if n})
+        self.arbol = nuevo
+
+    def rebalanceo_pendiente(self) -> bool:
+        return self.partidas_nuevas >= MIN_PARTIDAS_REBALANCEO
+
+    def guardar_instantanea(self):
+        """Escribe el estado hasta bitacora.posicion; se reemplaza de una vez, nunca queda a medias"""
+        datos = {"formato": FORMATO_INSTANTANEA, "base": self.base, "posicion": self.bitacora.posicion,
+                 "arbol": self.arbol.como_dict(), "anteriores": [a.como_dict() for a in self.anteriores.values()],
+                 "traslados": self.traslados, "frecuencias": sorted(self.frecuencias.items()),
+                 "partidas_nuevas": self.partidas_nuevas,
+                 "aprendidos": self.aprendidos, "conflictos": self.conflictos, "vistas": list(self.vistas)}
+        # Varios procesos pueden escribirla a la vez: cada uno con su temporal
+        temporal = f"{self.ruta_instantanea}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_instantanea)
+        self.sin_instantanea = 0
+
+    def cargar_instantanea(self) -> bool:
+        """Retoma desde la instantánea si es de este árbol base y de esta bitácora"""
+        try:
+            with open(self.ruta_instantanea, encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("formato") != FORMATO_INSTANTANEA or datos.get("base") != self.base:
+                raise ValueError("es de otro árbol base")
+            if not 0 <= datos["posicion"] <= os.path.getsize(self.bitacora.ruta):
+                raise ValueError("la bitácora es más corta")
+            arbol = Arbol20Q.desde_dict(datos["arbol"])
+            anteriores = [Arbol20Q.desde_dict(a) for a in datos["anteriores"]]
+            traslados = {str(huella): (str(siguiente), [int(n) for n in traslado])
+                         for huella, (siguiente, traslado) in datos["traslados"].items()}
+            frecuencias = Counter({int(nodo): int(n) for nodo, n in datos["frecuencias"]})
+            contadores = [int(datos[c]) for c in ("partidas_nuevas", "aprendidos", "conflictos")]
+            vistas = OrderedDict.fromkeys(map(str, datos["vistas"]))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"No se usa {self.ruta_instantanea} ({e}), se aplica toda la bitácora", file=sys.stderr)
+            return False
+        self.arbol, self.traslados, self.frecuencias, self.vistas = arbol, traslados, frecuencias, vistas
+        self.anteriores = OrderedDict((a.huella, a) for a in anteriores)
+        self.partidas_nuevas, self.aprendidos, self.conflictos = contadores
+        self.bitacora.posicion = datos["posicion"]
+        return True
+
+    def cerrar(self):
+        """Aplica lo pendiente, deja la instantánea al día y cierra la bitácora"""
+        self.sincronizar()
+        if self.ruta_instantanea and self.sin_instantanea:
+            self.guardar_instantanea()
+        self.bitacora.cerrar()
+
+
+def sin_respuesta(salida: Salida20Q) -> bool:
+    """La hoja no adivina nada: el original se rindió ahí"""
+    return not salida.texto or bool(RE_SIN_RESPUESTA.search(salida.texto))
+
+
+def jugar_aprendiendo(aprendiz: Aprendiz, preguntar: Callable[[str], str] = pedir_si_no,
+                      mostrar: Callable[[str], None] = print,
+                      leer: Callable[[str], str] = input) -> Tuple[Estado20Q, bool]:
+    """Una partida; si no adivinó, pregunta qué era y cómo distinguirlo. Devuelve el estado final y si aprendió"""
+    arbol = aprendiz.arbol
+    estado, salida = paso(arbol, Estado20Q())
+    while True:
+        if salida.aviso:
+            mostrar(salida.aviso)
+        if salida.tipo == "adivinanza":
+            break
+        estado, salida = paso(arbol, estado, preguntar(salida.texto))
+    aprendiz.registrar_partida(arbol, estado)
+    if sin_respuesta(salida):
+        mostrar("Me rindo.")
+    else:
+        mostrar(salida.texto)
+        if preguntar("¿Acerté?") == "s":
+            return estado, False
+    objeto = leer("¿En qué estabas pensando? ").strip()
+    if not objeto:
+        return estado, False
+    anterior = "lo demás" if sin_respuesta(salida) else salida.texto.split("\n")[-1]
+    pregunta = leer(f"Escribe una pregunta de sí o no que distinga {objeto} de {anterior}: ").strip()
+    if not pregunta:
+        return estado, False
+    aprendiz.aprender(arbol, estado, objeto, pregunta, preguntar(f"Para {objeto}, {pregunta}") == "s")
+    mostrar("¡Gracias! La próxima vez lo sabré.")
+    return estado, True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="20Q que aprende de las partidas que pierde")
+    parser.add_argument("--arbol", default=RUTA_ARBOL)
+    parser.add_argument("--bitacora", default=RUTA_BITACORA, help="registro de sólo agregar de lo aprendido")
+    parser.add_argument("--instantanea", help="estado aplicado hasta cierto punto de la bitácora "
+                                              "(por omisión, la bitácora + .instantanea)")
+    parser.add_argument("--rebalancear", action="store_true",
+                        help="ordena las alternativas por frecuencia y muestra las preguntas esperadas antes y después")
+    args = parser.parse_args()
+
+    aprendiz = Aprendiz(Arbol20Q.cargar(args.arbol), Bitacora(args.bitacora),
+                        args.instantanea or args.bitacora + ".instantanea")
+    if args.rebalancear:
+        antes = longitud_esperada(aprendiz.arbol, aprendiz.frecuencias)
+        aprendiz.pedir_rebalanceo()
+        print(f"Preguntas esperadas: {antes:.2f} -> "
+              f"{longitud_esperada(aprendiz.arbol, aprendiz.frecuencias):.2f}  "
+              f"(árbol {aprendiz.arbol.huella}, {aprendiz.aprendidos} objetos aprendidos)")
+    else:
+        jugar_aprendiendo(aprendiz)
+        if aprendiz.rebalanceo_pendiente():
+            aprendiz.pedir_rebalanceo()
+    aprendiz.cerrar()
@@ -0,0 +1,410 @@
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import List
+
+from ChatBot import (HotelChatBot, ModeloChatBot, CorrectorDifflib, CorrectorSymSpell, IntentMatcher,
+                     AlmacenMemoria, AlmacenSQLite, SesionChat, InventarioHabitaciones, MANEJADORES_ESTADO,
+                     PRIORITY_TAGS, RangoFechas, TIPOS_HABITACION, ejemplos_patron, normalizar, normalizar_patron)
+
+LETRAS = "abcdefghijklmnopqrstuvwxyzáéíóúñ"
+SILABAS = ["ma", "re", "si", "to", "la", "ne", "co", "pa", "ri", "de", "ho", "ta", "ción", "mi", "lu", "ve"]
+
+
+def mutar(palabra: str, rng: random.Random) -> str:
+    """Aplica un error de dedo: cambia, quita o inserta una letra"""
+    i = rng.randrange(len(palabra) + 1)
+    op = rng.choice("cqi")
+    if op == "c" and i < len(palabra):
+        return palabra[:i] + rng.choice(LETRAS) + palabra[i + 1:]
+    if op == "q" and i < len(palabra) and len(palabra) > 2:
+        return palabra[:i] + palabra[i + 1:]
+    return palabra[:i] + rng.choice(LETRAS) + palabra[i:]
+
+
+def vocabulario_sintetico(base, tam: int, rng: random.Random):
+    """Crece el vocabulario real con variantes y palabras inventadas hasta `tam` palabras"""
+    palabras = set(base)
+    base = list(base)
+    while len(palabras) < tam:
+        if rng.random() < 0.5:
+            palabras.add(mutar(mutar(rng.choice(base), rng), rng))
+        else:
+            palabras.add("".join(rng.choice(SILABAS) for _ in range(rng.randint(2, 5))))
+    return list(palabras)
+
+
+def tokens_largos(vocab, rng: random.Random, n: int) -> List[str]:
+    """Tokens de 20 a 40 letras (palabras pegadas, con errores) y correos/URLs, que no son palabras"""
+    tokens = []
+    while len(tokens) < n:
+        if rng.random() < 0.5:
+            token = ""
+            largo = rng.randint(20, 40)
+            while len(token) < largo:
+                token += rng.choice(vocab)
+            tokens.append(mutar(token[:largo], rng))
+        else:
+            nombre, dominio = rng.choice(vocab), rng.choice(vocab)
+            tokens.append(rng.choice([f"{nombre}.{rng.choice(vocab)}@{dominio}.com",
+                                      f"https://www.{dominio}.com/{nombre}"]))
+    return tokens
+
+
+def medir(corrector, consultas):
+    inicio = time.perf_counter()
+    respuestas = [corrector.buscar(c) for c in consultas]
+    return time.perf_counter() - inicio, respuestas
+
+
+def bench_corrector(tamanos=(516, 2000, 8000, 16000), n_consultas=300):
+    """Compara difflib contra el índice de borrados con un vocabulario cada vez más grande"""
+    rng = random.Random(42)
+    base = HotelChatBot(corrector="difflib").lista_palabras
+    print("\n========== Corrector: difflib vs índice de borrados ==========")
+    print(f"{'vocabulario':>12} {'construir(ms)':>14} {'índice(MB)':>11} {'difflib(us/pal)':>16} "
+          f"{'symspell(us/pal)':>17} {'speedup':>8}")
+    for tam in tamanos:
+        vocab = vocabulario_sintetico(base, tam, rng)
+        consultas = [mutar(rng.choice(vocab), rng) if rng.random() < 0.7 else rng.choice(vocab)
+                     for _ in range(n_consultas)]
+
+        inicio = time.perf_counter()
+        symspell = CorrectorSymSpell(vocab)
+        construir = time.perf_counter() - inicio
+
+        tracemalloc.start()
+        CorrectorSymSpell(vocab)
+        memoria = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+        t_difflib, r_difflib = medir(CorrectorDifflib(vocab), consultas)
+        t_symspell, r_symspell = medir(symspell, consultas)
+        if r_difflib != r_symspell:
+            distintas = sum(a != b for a, b in zip(r_difflib, r_symspell))
+            print(f"ADVERTENCIA: {distintas} respuestas distintas con vocabulario de {tam}")
+
+        print(f"{tam:>12} {construir * 1e3:>14.1f} {memoria:>11.1f} {t_difflib / n_consultas * 1e6:>16.1f} "
+              f"{t_symspell / n_consultas * 1e6:>17.1f} {t_difflib / t_symspell:>7.1f}x")
+
+        # El número de borrados crece como C(n, n/3): un token largo no puede dominar el turno
+        peor = 0.0
+        for token in tokens_largos(vocab, rng, 50):
+            t, r = medir(symspell, [token])
+            peor = max(peor, t)
+            if r != medir(CorrectorDifflib(vocab), [token])[1]:
+                print(f"ADVERTENCIA: respuesta distinta para {token!r} con vocabulario de {tam}")
+        print(f"{'':>12} tokens de 20-40 letras y correos: peor {peor * 1e3:.2f} ms por token")
+        if peor > 0.05:
+            print(f"ADVERTENCIA: un token largo tardó {peor * 1e3:.0f} ms con vocabulario de {tam}")
+
+
+def bench_sesiones(n_sesiones=10000):
+    """Memoria por sesión inactiva y costo de cargar el modelo compartido"""
+    print("\n========== Sesiones sobre un modelo compartido ==========")
+    inicio = time.perf_counter()
+    ModeloChatBot()
+    carga = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    modelo = ModeloChatBot()
+    memoria_modelo = tracemalloc.get_traced_memory()[0]
+
+    bot = HotelChatBot(modelo=modelo)
+    antes = tracemalloc.get_traced_memory()[0]
+    for i in range(n_sesiones):
+        bot.usar_sesion(f"huesped-{i:06d}")
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"Modelo: {carga * 1e3:.1f} ms de carga, {memoria_modelo / 1e6:.1f} MB (una sola vez por proceso)")
+    print(f"Sesiones inactivas: {n_sesiones}, {(despues - antes) / n_sesiones:.0f} bytes por sesión "
+          f"(incluye el id y la entrada en el diccionario de sesiones)")
+
+    # Las conversaciones intercaladas no se mezclan entre sesiones
+    bot.respond("hola", "huesped-000001")
+    bot.respond("disponibilidad", "huesped-000002")
+    print(f"Estados: {bot.sesiones['huesped-000001'].state}, {bot.sesiones['huesped-000002'].state}")
+
+
+def mensajes_perturbados(intents, rng: random.Random, por_patron: int = 4):
+    """(mensaje, tag esperado): frases de los patrones con dos errores (dedo o palabra omitida)"""
+    casos = []
+    for intent in intents:
+        for patron in intent.get("patterns", []):
+            for ejemplo in ejemplos_patron(patron)[:por_patron]:
+                palabras = ejemplo.split()
+                for op in rng.sample("tdt", 2):
+                    i = rng.randrange(len(palabras))
+                    if op == "t":
+                        palabras[i] = mutar(mutar(palabras[i], rng), rng)
+                    elif len(palabras) > 1:
+                        del palabras[i]
+                casos.append((" ".join(palabras), intent["tag"]))
+    return casos
+
+
+def bench_clasificador(umbrales=(0.2, 0.25, 0.3, 0.35, 0.4, 0.5)):
+    """Cobertura y precisión del clasificador de n-gramas sobre lo que las regex no reconocen"""
+    print("\n========== Respaldo estadístico: cobertura vs latencia ==========")
+    bot = HotelChatBot()
+    modelo = bot.modelo
+    casos = mensajes_perturbados(modelo.intents, random.Random(7))
+    corregidos = [(bot.corregir(texto)[1], tag) for texto, tag in casos]
+
+    inicio = time.perf_counter()
+    por_regex = [modelo.matcher.match(texto) for texto, _ in corregidos]
+    t_regex = (time.perf_counter() - inicio) / len(corregidos)
+    fallidos = [caso for caso, intent in zip(corregidos, por_regex) if intent is None]
+
+    latencias = []
+    resultados = []
+    for texto, tag in fallidos:
+        inicio = time.perf_counter()
+        intent, confianza = modelo.clasificador.clasificar(texto)
+        latencias.append(time.perf_counter() - inicio)
+        resultados.append((confianza, intent is not None and intent["tag"] == tag))
+    latencias.sort()
+
+    print(f"Mensajes: {len(casos)}  Reconocidos por regex: {1 - len(fallidos) / len(casos):.1%} "
+          f"({t_regex * 1e6:.0f} us/mensaje)")
+    print(f"Clasificador sobre {len(fallidos)} no reconocidos: media {sum(latencias) / len(latencias) * 1e6:.0f} us, "
+          f"p99 {latencias[int(0.99 * (len(latencias) - 1))] * 1e6:.0f} us")
+    print(f"{'umbral':>7} {'cobertura':>10} {'precisión':>10} {'total':>7}")
+    for umbral in umbrales:
+        aceptados = [acierto for confianza, acierto in resultados if confianza >= umbral]
+        cobertura = len(aceptados) / len(resultados)
+        total = 1 - (len(fallidos) - len(aceptados)) / len(casos)
+        print(f"{umbral:>7.2f} {cobertura:>10.1%} {sum(aceptados) / max(len(aceptados), 1):>10.1%} {total:>7.1%}")
+
+
+def match_fuerza_bruta(intents, text: str):
+    """El match_intent original (una re.search por patrón) sobre patrones y texto normalizados"""
+    matched_intents = []
+    text = normalizar(text)
+    for intent in intents:
+        for pattern in intent.get("patterns", []):
+            if re.search(normalizar_patron(pattern), text):
+                matched_intents.append(intent)
+                break
+    for tag in PRIORITY_TAGS:
+        for intent in matched_intents:
+            if intent["tag"] == tag:
+                return intent
+    return matched_intents[0] if matched_intents else None
+
+
+def catalogo_sintetico(intents, escala: int, rng: random.Random):
+    """El catálogo real más escala-1 copias con cada palabra de cada patrón alterada"""
+    catalogo = list(intents)
+    for copia in range(1, escala):
+        for intent in intents:
+            patrones = [" ".join(mutar(w, rng) if w.isalpha() else w for w in p.split(" "))
+                        for p in intent.get("patterns", [])]
+            catalogo.append({"tag": f"{intent['tag']}_{copia}", "patterns": patrones, "responses": ["-"]})
+    return catalogo
+
+
+def verificar_prefiltro(n_fuerza_bruta: int = 150) -> int:
+    """Comprueba que el prefiltro de literales no cambia ningún tag; devuelve las diferencias"""
+    rng = random.Random(11)
+    intents = ModeloChatBot().intents
+    matcher = IntentMatcher(intents)
+    casos = [texto for texto, _ in mensajes_perturbados(intents, rng)]
+    casos += [e for intent in intents for p in intent["patterns"] for e in ejemplos_patron(p)]
+    casos += ["".join(rng.choice(LETRAS + "   ") for _ in range(rng.randint(1, 40))) for _ in range(500)]
+    casos = [normalizar(texto) for texto in casos]
+
+    diferencias = 0
+    for texto in casos:
+        if matcher.coincidencias(texto) != matcher.coincidencias_sin_prefiltro(texto):
+            diferencias += 1
+            print(f"  distinto con prefiltro: {texto!r}")
+    # La referencia original tarda ~0.1 s por mensaje (más patrones que la caché de re)
+    for texto in rng.sample(casos, n_fuerza_bruta):
+        esperado = match_fuerza_bruta(intents, texto)
+        obtenido = matcher.match(texto)
+        if (esperado and esperado["tag"]) != (obtenido and obtenido["tag"]):
+            diferencias += 1
+            print(f"  distinto de la fuerza bruta: {texto!r}")
+    print(f"Verificación: {len(casos)} mensajes contra todas las regex, {n_fuerza_bruta} contra "
+          f"la fuerza bruta original, {diferencias} diferencias")
+    return diferencias
+
+
+def bench_prefiltro(escalas=(1, 4, 16)):
+    """Regex por intent con y sin el prefiltro de Aho-Corasick, con catálogos cada vez más grandes"""
+    print("\n========== Prefiltro de literales (Aho-Corasick) ==========")
+    diferencias = verificar_prefiltro()
+    if diferencias:
+        print(f"ADVERTENCIA: el prefiltro cambió {diferencias} resultados (test_ChatBot.py lo revisa)")
+    rng = random.Random(5)
+    intents = ModeloChatBot().intents
+    mensajes = [normalizar(texto) for texto, _ in mensajes_perturbados(intents, rng)]
+    print(f"{'intents':>8} {'patrones':>9} {'estados':>8} {'sin(us/msg)':>12} {'con(us/msg)':>12} "
+          f"{'regex/msg':>10} {'speedup':>8}")
+    for escala in escalas:
+        catalogo = catalogo_sintetico(intents, escala, rng)
+        matcher = IntentMatcher(catalogo)
+
+        inicio = time.perf_counter()
+        for texto in mensajes:
+            matcher.coincidencias_sin_prefiltro(texto)
+        sin = (time.perf_counter() - inicio) / len(mensajes)
+
+        inicio = time.perf_counter()
+        for texto in mensajes:
+            matcher.coincidencias(texto)
+        con = (time.perf_counter() - inicio) / len(mensajes)
+
+        candidatas = sum(len(matcher.automata.buscar(t) | matcher.siempre) for t in mensajes) / len(mensajes)
+        patrones = sum(len(i["patterns"]) for i in catalogo)
+        print(f"{len(matcher.tablas):>8} {patrones:>9} {len(matcher.automata.transiciones):>8} {sin * 1e6:>12.1f} "
+              f"{con * 1e6:>12.1f} {candidatas:>10.1f} {sin / con:>7.1f}x")
+
+
+ESTADOS_RESERVA = [None, "esperando_fechas", "esperando_seleccion_habitacion", "esperando_confirmacion_reserva"]
+
+
+def sesion_aleatoria(rng: random.Random) -> SesionChat:
+    """Una sesión a media reserva, con el tipo de datos que guardan los estados"""
+    desconocidos = [e for e in ESTADOS_RESERVA if e is not None and e not in MANEJADORES_ESTADO]
+    if desconocidos:
+        raise ValueError(f"Estados que HotelChatBot no tiene: {', '.join(desconocidos)}")
+    sesion = SesionChat()
+    sesion.state = rng.choice(ESTADOS_RESERVA)
+    entrada = date.today() + timedelta(days=rng.randint(1, 60))
+    sesion.context = {"user_name": rng.choice(["Ana", "Luis", "María José"]),
+                      "fechas": RangoFechas(entrada, entrada + timedelta(days=rng.randint(1, 7))).como_dict(),
+                      "habitacion": rng.choice(["Estándar", "Suite Junior"]),
+                      "apartado": f"AP{rng.getrandbits(48):012x}",
+                      "reserva": f"HTL{rng.randint(1000, 9999)}"}
+    return sesion
+
+
+def bench_almacen(n_actualizaciones=100_000, n_sesiones=10_000, lotes=(1, 64, 1024)):
+    """Actualizaciones de sesión por segundo en memoria y en SQLite con distintos lotes"""
+    print("\n========== Almacén de sesiones ==========")
+    rng = random.Random(3)
+    sesiones = [sesion_aleatoria(rng) for _ in range(256)]
+    ids = [f"huesped-{i:06d}" for i in range(n_sesiones)]
+    print(f"{'almacén':>16} {'actualizaciones':>16} {'por segundo':>12} {'us/actualización':>17} {'MB':>6}")
+
+    def medir_almacen(nombre, almacen, n):
+        inicio = time.perf_counter()
+        for i in range(n):
+            almacen.guardar(ids[rng.randrange(n_sesiones)], sesiones[i & 255])
+        almacen.vaciar()
+        transcurrido = time.perf_counter() - inicio
+        tamano = f"{os.path.getsize(almacen.ruta) / 1e6:.1f}" if isinstance(almacen, AlmacenSQLite) else "-"
+        print(f"{nombre:>16} {n:>16} {n / transcurrido:>12.0f} {transcurrido / n * 1e6:>17.1f} {tamano:>6}")
+
+    medir_almacen("memoria", AlmacenMemoria(), n_actualizaciones)
+    with tempfile.TemporaryDirectory() as carpeta:
+        for lote in lotes:
+            ruta = os.path.join(carpeta, f"sesiones-{lote}.db")
+            almacen = AlmacenSQLite(ruta, lote=lote, intervalo=60.0)
+            # Con lote=1 cada actualización es una transacción; se mide una décima parte
+            medir_almacen(f"sqlite lote={lote}", almacen, n_actualizaciones if lote > 1 else n_actualizaciones // 10)
+            almacen.cerrar()
+
+        # Carga perezosa: un proceso nuevo sólo lee las sesiones que recibe mensajes
+        almacen = AlmacenSQLite(os.path.join(carpeta, f"sesiones-{lotes[-1]}.db"))
+        consultas = rng.sample(ids, 1000)
+        inicio = time.perf_counter()
+        cargadas = sum(almacen.cargar(sid) is not None for sid in consultas)
+        transcurrido = time.perf_counter() - inicio
+        almacen.cerrar()
+        print(f"Carga perezosa: {cargadas} sesiones, {transcurrido / len(consultas) * 1e6:.1f} us por sesión")
+
+        # Un bot sin sesiones en memoria retoma la conversación que empezó otro
+        ruta = os.path.join(carpeta, "relevo.db")
+        primero = HotelChatBot(almacen=AlmacenSQLite(ruta, lote=1), retener_sesiones=False)
+        primero.respond("disponibilidad", "relevo")
+        segundo = HotelChatBot(modelo=primero.modelo, almacen=AlmacenSQLite(ruta, lote=1), retener_sesiones=False)
+        print(f"Relevo entre bots: estado {segundo.respond('15 de enero al 20 de enero', 'relevo').estado}")
+
+
+def bench_inventario(n_reservas=20_000, hilos=(1, 4, 16), habitaciones_por_tipo=50):
+    """Apartados y reservas concurrentes: rendimiento, consistencia y códigos únicos"""
+    print("\n========== Inventario de habitaciones ==========")
+    tipos = {tipo: (habitaciones_por_tipo, precio) for tipo, (_, precio) in TIPOS_HABITACION.items()}
+    hoy = date.today()
+    print(f"{'hilos':>6} {'operaciones':>12} {'por segundo':>12} {'reservas':>9} {'sin lugar':>10} "
+          f"{'traslapes':>10} {'códigos rep.':>13}")
+
+    for n_hilos in hilos:
+        inventario = InventarioHabitaciones(tipos)
+        confirmadas: List[str] = []
+        sin_lugar = [0]
+
+        def reservar(semilla: int, n: int):
+            rng = random.Random(semilla)
+            for _ in range(n):
+                entrada = hoy + timedelta(days=rng.randrange(365))
+                salida = entrada + timedelta(days=rng.randint(1, 7))
+                tipo = rng.choice(list(tipos))
+                inventario.disponibilidad(entrada, salida)
+                apartado = inventario.apartar(tipo, entrada, salida)
+                if apartado is None:
+                    sin_lugar[0] += 1
+                elif rng.random() < 0.8:
+                    confirmadas.append(inventario.confirmar(apartado.id))
+                else:
+                    inventario.liberar(apartado.id)
+
+        trabajadores = [threading.Thread(target=reservar, args=(i, n_reservas // n_hilos)) for i in range(n_hilos)]
+        inicio = time.perf_counter()
+        for t in trabajadores:
+            t.start()
+        for t in trabajadores:
+            t.join()
+        transcurrido = time.perf_counter() - inicio
+        repetidos = len(confirmadas) - len(set(confirmadas))
+        print(f"{n_hilos:>6} {n_reservas:>12} {n_reservas / transcurrido:>12.0f} {len(confirmadas):>9} "
+              f"{sin_lugar[0]:>10} {len(inventario.traslapes()):>10} {repetidos:>13}")
+
+    # Consulta con el índice contra revisar todas las estancias de cada habitación
+    rng = random.Random(5)
+    consultas = [(hoy + timedelta(days=d), hoy + timedelta(days=d + rng.randint(1, 7)))
+                 for d in (rng.randrange(365) for _ in range(500))]
+    inicio = time.perf_counter()
+    for entrada, salida in consultas:
+        inventario.version += 1  # sin caché
+        inventario.disponibilidad(entrada, salida)
+    indice = (time.perf_counter() - inicio) / len(consultas)
+    inicio = time.perf_counter()
+    for entrada, salida in consultas:
+        a, b = entrada.toordinal(), salida.toordinal()
+        {tipo: sum(all(f <= a or i >= b for i, f in zip(*inventario.ocupacion[h][:2])) for h in habitaciones)
+         for tipo, habitaciones in inventario.habitaciones.items()}
+    lineal = (time.perf_counter() - inicio) / len(consultas)
+    estancias = sum(len(ids) for _, _, ids in inventario.ocupacion.values())
+    print(f"Disponibilidad ({len(inventario.ocupacion)} habitaciones, {estancias} estancias): "
+          f"{indice * 1e6:.0f} us con índice, {lineal * 1e6:.0f} us revisando todo ({lineal / indice:.0f}x)")
+
+    # Los códigos de antes (HTL + randint de 4 dígitos) con la misma cantidad de reservas
+    rng = random.Random(4)
+    antiguos = [f"HTL{rng.randint(1000, 9999)}" for _ in range(len(confirmadas))]
+    print(f"Códigos HTL####: {len(antiguos) - len(set(antiguos))} repetidos en {len(antiguos)} reservas")
+
+
+BENCHMARKS = {
+    "corrector": bench_corrector,
+    "sesiones": bench_sesiones,
+    "clasificador": bench_clasificador,
+    "prefiltro": bench_prefiltro,
+    "almacen": bench_almacen,
+    "inventario": bench_inventario,
+}
+
+if __name__ == "__main__":
+    nombres = sys.argv[1:] or list(BENCHMARKS)
+    for nombre in nombres:
+        BENCHMARKS[nombre]()
@@ -0,0 +1,167 @@
+import argparse
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import numpy as np
+
+from entropia20Q import MatrizAtributos
+from motor20Q import RUTA_ARBOL, Arbol20Q, pedir_si_no
+
+MAX_PREGUNTAS = 20
+
+
+class Vivos(NamedTuple):
+    """Candidatos de una partida: sólo las palabras de 64 objetos que todavía tienen alguno"""
+    palabras: np.ndarray    # índice de cada palabra en el bitset completo
+    bits: np.ndarray        # uint64; bit j de la palabra w = objeto 64·w + j
+
+
+class CatalogoBits:
+    """Catálogo de objetos con un bitset por atributo.
+
+    si[a] y no[a] son arreglos uint64 con el bit del objeto i prendido si
+    contesta sí (o no) a la pregunta a. Contestar es un AND de los candidatos
+    con una de las dos filas y contarlos un popcount: recorren n/64 palabras
+    en C, y menos cuando los candidatos se concentran, porque Vivos suelta las
+    palabras que se quedan en cero. A diferencia de entropia20Q, una
+    respuesta equivocada descarta al objeto correcto.
+    """
+
+    def __init__(self, objetos: List[str], atributos: List[str], si: np.ndarray):
+        self.objetos = objetos
+        self.atributos = atributos
+        self.si = si
+        n_palabras = si.shape[1]
+        completo = np.full(n_palabras, np.uint64(0xFFFF_FFFF_FFFF_FFFF))
+        sobrantes = n_palabras * 64 - len(objetos)
+        if sobrantes:
+            completo[-1] >>= np.uint64(sobrantes)
+        self.completo = completo
+        self.no = ~si & completo
+        # La primera pregunta parte siempre el catálogo entero: se elige una vez
+        self.apertura = self.elegir(self.todos(), [False] * len(atributos))
+
+    @classmethod
+    def desde_bits(cls, objetos: List[str], atributos: List[str], bits: np.ndarray) -> "CatalogoBits":
+        """bits: matriz booleana objetos × atributos"""
+        n_bytes = -(-len(objetos) // 64) * 8
+        empacada = np.zeros((len(atributos), n_bytes), np.uint8)
+        # De a 8 objetos por byte con el objeto 0 en el bit bajo; 8 bytes seguidos leídos en little-endian son una palabra
+        empacada[:, :-(-len(objetos) // 8)] = np.packbits(bits, axis=0, bitorder="little").T
+        return cls(objetos, atributos, empacada.view("<u8").astype(np.uint64))
+
+    @classmethod
+    def desde_arbol(cls, arbol: Arbol20Q) -> "CatalogoBits":
+        matriz = MatrizAtributos.desde_arbol(arbol)
+        return cls.desde_bits(matriz.objetos, matriz.atributos, matriz.prob >= 0.5)
+
+    def todos(self) -> Vivos:
+        return Vivos(np.arange(len(self.completo)), self.completo)
+
+    def responder(self, vivos: Vivos, atributo: int, si: bool) -> Vivos:
+        fila = (self.si if si else self.no)[atributo]
+        if len(vivos.palabras) == len(fila):
+            bits = vivos.bits & fila
+        else:
+            bits = vivos.bits & fila.take(vivos.palabras)
+        if np.count_nonzero(bits) * 2 <= len(bits):
+            ocupadas = bits != 0
+            return Vivos(vivos.palabras[ocupadas], bits[ocupadas])
+        return Vivos(vivos.palabras, bits)
+
+    @staticmethod
+    def cuantos(vivos: Vivos) -> int:
+        return int(np.bitwise_count(vivos.bits).sum())
+
+    def elegir(self, vivos: Vivos, preguntadas: List[bool]) -> Optional[int]:
+        """La pregunta que parte a los candidatos más cerca de la mitad; None si ninguna los separa"""
+        if len(vivos.palabras) == len(self.completo):
+            filas = self.si
+        else:
+            filas = self.si.take(vivos.palabras, axis=1)
+        con_si = np.bitwise_count(filas & vivos.bits).sum(axis=1, dtype=np.int64)
+        total = self.cuantos(vivos)
+        distancia = np.abs(2 * con_si - total)
+        distancia[np.asarray(preguntadas, bool)] = total
+        a = int(distancia.argmin())
+        return a if distancia[a] < total else None
+
+    @staticmethod
+    def indices(vivos: Vivos) -> np.ndarray:
+        """Índices de los objetos candidatos, de menor a mayor"""
+        bits = np.unpackbits(vivos.bits.astype("<u8").view(np.uint8), bitorder="little").reshape(-1, 64)
+        filas, columnas = np.nonzero(bits)
+        return vivos.palabras[filas] * 64 + columnas
+
+
+def jugar(catalogo: CatalogoBits, preguntar: Callable[[str], str] = pedir_si_no,
+          mostrar: Callable[[str], None] = print) -> Optional[int]:
+    """Pregunta partiendo a los candidatos por la mitad y adivina cuando ya no se pueden separar"""
+    vivos = catalogo.todos()
+    preguntadas = [False] * len(catalogo.atributos)
+    hechas = 0
+    a = catalogo.apertura
+    while a is not None and hechas < MAX_PREGUNTAS:
+        preguntadas[a] = True
+        vivos = catalogo.responder(vivos, a, preguntar(catalogo.atributos[a]) == "s")
+        hechas += 1
+        a = catalogo.elegir(vivos, preguntadas) if catalogo.cuantos(vivos) > 1 else None
+    for i in catalogo.indices(vivos)[:MAX_PREGUNTAS - hechas]:
+        if preguntar(f"¿Es {catalogo.objetos[i]}?") == "s":
+            mostrar("¡Lo adiviné!")
+            return int(i)
+    mostrar("Me rindo." if catalogo.cuantos(vivos) else "No conozco nada que conteste así.")
+    return None
+
+
+def medir(n_objetos: int, n_atributos: int, rng: np.random.Generator, partidas: int = 20) -> dict:
+    """Microsegundos por respuesta con bitsets y con una máscara booleana de NumPy, en partidas al azar"""
+    bits = rng.random((n_objetos, n_atributos)) < 0.5
+    inicio = time.perf_counter()
+    catalogo = CatalogoBits.desde_bits([""] * n_objetos, [""] * n_atributos, bits)
+    construccion = time.perf_counter() - inicio
+    respuestas = turnos = 0
+    t_bits = t_mascara = t_elegir = 0.0
+    for objeto in rng.integers(n_objetos, size=partidas):
+        vivos, mascara = catalogo.todos(), np.ones(n_objetos, bool)
+        preguntadas = [False] * n_atributos
+        for a in rng.permutation(n_atributos):
+            si = bool(bits[objeto, a])
+            inicio = time.perf_counter()
+            vivos = catalogo.responder(vivos, a, si)
+            quedan = catalogo.cuantos(vivos)
+            t_bits += time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            mascara &= bits[:, a] if si else ~bits[:, a]
+            np.count_nonzero(mascara)
+            t_mascara += time.perf_counter() - inicio
+            respuestas += 1
+            preguntadas[a] = True
+            if quedan <= 1:
+                break
+            inicio = time.perf_counter()
+            catalogo.elegir(vivos, preguntadas)
+            t_elegir += time.perf_counter() - inicio
+            turnos += 1
+    return {"objetos": n_objetos, "construccion_s": round(construccion, 3),
+            "bits_us": round(t_bits / respuestas * 1e6, 2), "mascara_us": round(t_mascara / respuestas * 1e6, 2),
+            "elegir_us": round(t_elegir / max(turnos, 1) * 1e6, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="20Q podando candidatos con bitsets")
+    parser.add_argument("--arbol", default=RUTA_ARBOL)
+    parser.add_argument("--escala", type=int, nargs="*", metavar="N",
+                        help="mide la latencia por respuesta con catálogos sintéticos de N objetos")
+    parser.add_argument("--atributos", type=int, default=64, help="atributos de los catálogos sintéticos")
+    args = parser.parse_args()
+
+    if args.escala:
+        rng = np.random.default_rng(0)
+        print(f"{'objetos':>9} {'construir':>10} {'respuesta':>11} {'máscara':>11} {'elegir':>11}")
+        for n in args.escala:
+            r = medir(n, args.atributos, rng)
+            print(f"{n:>9} {r['construccion_s']:>9.3f}s {r['bits_us']:>9.2f}us {r['mascara_us']:>9.2f}us "
+                  f"{r['elegir_us']:>9.1f}us")
+    else:
+        jugar(CatalogoBits.desde_arbol(Arbol20Q.cargar(args.arbol)))
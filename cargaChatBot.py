@@ -0,0 +1,292 @@
+import argparse
+import json
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from ChatBot import (HotelChatBot, CacheDecisiones, Instrumentacion, InventarioHabitaciones, SesionChat,
+                     ejemplos_patron, huella_codigo, normalizar, MESES, DIAS_SEMANA, TIPOS_HABITACION)
+from benchChatBot import mutar, LETRAS
+
+NOMBRES = ["Ana", "Luis", "María José", "Carlos", "Sofía", "Diego", "Valeria", "Jorge"]
+HABITACIONES = ["estándar", "superior", "suite junior", "presidencial", "la suite", "básica"]
+OBJETOS = ["una cartera negra", "mis lentes", "un reloj plateado", "la chamarra azul", "mi cargador"]
+
+# Conversaciones que se generan y su peso: la mezcla aproxima el tráfico de recepción
+ESCENARIOS = {
+    "reserva": 3,
+    "reserva_cancelada": 1,
+    "saludo": 2,
+    "preguntas": 4,
+    "problema": 1,
+    "objeto_perdido": 1,
+    "spa": 1,
+    "sin_sentido": 1,
+}
+PERCENTILES = (50, 90, 99)
+ESCENARIOS_RESERVA = ("reserva", "reserva_cancelada")
+# Por debajo de esta fracción de reservas que llegan a confirmar, la carga ya no mide ese flujo
+MIN_LLEGAN_A_CONFIRMAR = 0.9
+RE_AGOTADO = re.compile(r"ya no quedan habitaciones|no tenemos habitaciones libres")
+
+
+class GeneradorConversaciones:
+    """Arma conversaciones de varios turnos con frases de intents.json.
+
+    Sólo usa las frases de ejemplo que el bot realmente asigna a su intent,
+    para que cada escenario recorra los estados que dice recorrer.
+    """
+
+    def __init__(self, bot: HotelChatBot, rng: random.Random, prob_error: float = 0.1):
+        self.rng = rng
+        self.prob_error = prob_error
+        self.frases: Dict[str, List[str]] = {}
+        # Se prueba con respond() y no sólo con match_intent(): el turno completo puede
+        # elegir otro intent ("cuanto cuesta" abre tipos_habitacion, no la disponibilidad).
+        # Otro bot con el mismo modelo, para no tocar la caché ni las métricas del que se mide
+        prueba = HotelChatBot(modelo=bot.modelo)
+        for intent in bot.intents:
+            frases = [e for p in intent["patterns"] for e in ejemplos_patron(p)[:2]]
+            frases = [f for f in frases if (bot.match_intent(normalizar(f)) or {}).get("tag") == intent["tag"]
+                      and self.abre(prueba, f, intent["tag"])]
+            if frases:
+                self.frases[intent["tag"]] = frases
+        self.sin_seguimiento = [i["tag"] for i in bot.intents if "followup" not in i and i["tag"] in self.frases]
+
+    @staticmethod
+    def abre(bot: HotelChatBot, frase: str, tag: str) -> bool:
+        """La frase, como primer mensaje de una sesión, cae en `tag`"""
+        bot.respond(frase, "prueba")
+        abre = (bot.intent_turno or {}).get("tag") == tag
+        bot.cerrar_sesion("prueba")
+        return abre
+
+    def frase(self, tag: str) -> str:
+        return self.con_errores(self.rng.choice(self.frases[tag]))
+
+    def con_errores(self, texto: str) -> str:
+        """Errores de dedo en algunas palabras, para que trabaje el corrector"""
+        return " ".join(mutar(p, self.rng) if p.isalpha() and self.rng.random() < self.prob_error else p
+                        for p in texto.split())
+
+    def fechas(self) -> str:
+        dia = self.rng.randint(1, 25)
+        mes, anio = self.rng.randint(1, 9), date.today().year + 1
+        return self.rng.choice([
+            f"{dia} de {MESES[mes]} al {dia + 3} de {MESES[mes]}",
+            f"{dia:02d}/0{mes}/{anio} al {dia + 2:02d}/0{mes}/{anio}",
+            f"el próximo {self.rng.choice(DIAS_SEMANA)}",
+            "pasado mañana",
+        ])
+
+    def conversacion(self, escenario: str) -> List[str]:
+        rng = self.rng
+        if escenario in ESCENARIOS_RESERVA:
+            cierre = "sí" if escenario == "reserva" else rng.choice(["no", "mejor no"])
+            return [self.frase("consulta_disponibilidad"), self.fechas(), rng.choice(HABITACIONES), cierre]
+        if escenario == "saludo":
+            return [self.frase("saludo"), rng.choice(NOMBRES), self.frase(rng.choice(self.sin_seguimiento))]
+        if escenario == "preguntas":
+            return [self.frase(rng.choice(self.sin_seguimiento)) for _ in range(rng.randint(2, 5))]
+        if escenario == "problema":
+            return [self.frase("problema_habitacion"), f"habitación {rng.randint(101, 450)}"]
+        if escenario == "objeto_perdido":
+            return [self.frase("objetos_perdidos"), rng.choice(OBJETOS), f"55-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"]
+        if escenario == "spa":
+            return [self.frase("spa_masajes"), str(rng.randint(1, 4)), rng.choice(["faciales", "3"]), "salir"]
+        basura = "".join(rng.choice(LETRAS) for _ in range(rng.randint(4, 12)))
+        return [basura, self.frase(rng.choice(self.sin_seguimiento))]
+
+
+def tamano_objeto(obj) -> int:
+    """Bytes de un objeto y de lo que contiene (dicts, listas y cadenas)"""
+    tamano = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        tamano += sum(tamano_objeto(k) + tamano_objeto(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        tamano += sum(tamano_objeto(v) for v in obj)
+    elif isinstance(obj, SesionChat):
+        tamano += tamano_objeto(obj.state) + tamano_objeto(obj.context)
+    return tamano
+
+
+def percentiles_us(valores: List[float]) -> Dict[str, float]:
+    ordenados = sorted(valores)
+    resultado = {f"p{p}": ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))] * 1e6
+                 for p in PERCENTILES}
+    resultado["max"] = ordenados[-1] * 1e6
+    return resultado
+
+
+def inventario_para(n_mensajes: int) -> InventarioHabitaciones:
+    """Los tipos y precios del hotel, con habitaciones para toda la carga.
+
+    Con las 11 del hotel, la mayoría de las reservas encuentra su tipo
+    agotado y la carga mide eso en lugar del flujo de reserva. Las fechas
+    generadas se juntan en pocos días, así que cada tipo tiene una
+    habitación por cada 50 mensajes.
+    """
+    cantidad = max(n_mensajes // 50, 1)
+    return InventarioHabitaciones({tipo: (max(cantidad, n), precio) for tipo, (n, precio) in TIPOS_HABITACION.items()})
+
+
+def conducir(bot: HotelChatBot, generador: GeneradorConversaciones, n_sesiones: int, n_mensajes: int):
+    """Atiende n_mensajes repartidos entre n_sesiones conversaciones simultáneas.
+
+    Cada ronda manda el siguiente mensaje de cada sesión activa (como llegarían
+    a un servidor); una sesión que termina su conversación empieza otra.
+    Devuelve también cómo terminaron las conversaciones de reserva completas:
+    cuántas llegaron a esperando_confirmacion_reserva y cuántas toparon con
+    un tipo agotado.
+    """
+    rng = generador.rng
+    escenarios, pesos = list(ESCENARIOS), list(ESCENARIOS.values())
+    pendientes: Dict[str, List[str]] = {}
+    en_curso: Dict[str, Tuple[str, bool, bool]] = {}  # sesión -> (escenario, llegó a confirmar, agotado)
+    conteo = Counter()
+    reservas = Counter()
+    latencias = []
+    enviados = 0
+    while enviados < n_mensajes:
+        for i in range(n_sesiones):
+            session_id = f"carga-{i:05d}"
+            if not pendientes.get(session_id):
+                escenario = rng.choices(escenarios, pesos)[0]
+                conteo[escenario] += 1
+                pendientes[session_id] = generador.conversacion(escenario)
+                en_curso[session_id] = (escenario, False, False)
+            texto = pendientes[session_id].pop(0)
+            inicio = time.perf_counter()
+            respuesta = bot.respond(texto, session_id)
+            latencias.append(time.perf_counter() - inicio)
+            enviados += 1
+            escenario, confirmar, agotado = en_curso[session_id]
+            if escenario in ESCENARIOS_RESERVA:
+                confirmar = confirmar or respuesta.estado == "esperando_confirmacion_reserva"
+                agotado = agotado or any(RE_AGOTADO.search(m) for m in respuesta.mensajes)
+                en_curso[session_id] = (escenario, confirmar, agotado)
+                if not pendientes[session_id]:
+                    reservas.update(completas=1, llegan_a_confirmar=confirmar, agotadas=agotado)
+            if enviados >= n_mensajes:
+                break
+    return latencias, conteo, reservas
+
+
+def correr(n_sesiones: int = 500, n_mensajes: int = 20000, semilla: int = 1,
+           prob_error: float = 0.1, cache: bool = True) -> Dict:
+    """Dos pasadas con la misma carga: sin instrumentación (rendimiento) y con ella (etapas)"""
+    bot = HotelChatBot(cache=None if cache else CacheDecisiones(max_entradas=0), inventario=inventario_para(n_mensajes))
+    inicio = time.perf_counter()
+    latencias, escenarios, reservas = conducir(bot, GeneradorConversaciones(bot, random.Random(semilla), prob_error),
+                                               n_sesiones, n_mensajes)
+    transcurrido = time.perf_counter() - inicio
+
+    tamanos = [tamano_objeto(sid) + tamano_objeto(sesion) for sid, sesion in bot.sesiones.items()]
+    estados = Counter(sesion.state or "ninguno" for sesion in bot.sesiones.values())
+
+    inst = Instrumentacion()
+    medido = HotelChatBot(modelo=bot.modelo, instrumentacion=inst, inventario=inventario_para(n_mensajes),
+                          cache=None if cache else CacheDecisiones(max_entradas=0))
+    conducir(medido, GeneradorConversaciones(medido, random.Random(semilla), prob_error), n_sesiones, n_mensajes)
+    etapas = {}
+    for etapa, datos in inst.etapas().items():
+        etapas[etapa] = {f"p{p}": inst.percentil(etapa, p) * 1e6 for p in PERCENTILES}
+        etapas[etapa]["llamadas"] = datos["total"]
+        etapas[etapa]["promedio"] = datos["suma_s"] / datos["total"] * 1e6
+
+    return {
+        "mensajes": len(latencias),
+        "mensajes_por_segundo": len(latencias) / transcurrido,
+        "turno_us": percentiles_us(latencias),
+        "etapas_us": etapas,
+        "contadores": dict(inst.contadores),
+        "memoria_sesion_bytes": {"promedio": sum(tamanos) / len(tamanos), "max": max(tamanos)},
+        "cache": bot.cache.estadisticas(),
+        "escenarios": dict(escenarios),
+        "reservas": {**reservas, "fraccion_confirmar": reservas["llegan_a_confirmar"] / max(reservas["completas"], 1)},
+        "estados_al_terminar": dict(estados),
+    }
+
+
+def version_git() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def comparar(actual: Dict, anterior: Dict, tolerancia: float) -> List[str]:
+    """Regresiones de `actual` respecto a `anterior` mayores que la tolerancia (0.1 = 10%)"""
+    regresiones = []
+    a, b = actual["resultados"], anterior["resultados"]
+    cambio = a["mensajes_por_segundo"] / b["mensajes_por_segundo"] - 1
+    print(f"mensajes/s: {b['mensajes_por_segundo']:.0f} -> {a['mensajes_por_segundo']:.0f} ({cambio:+.1%})")
+    if cambio < -tolerancia:
+        regresiones.append("mensajes_por_segundo")
+    for p in ("p50", "p99"):
+        cambio = a["turno_us"][p] / b["turno_us"][p] - 1
+        print(f"turno {p}: {b['turno_us'][p]:.1f} -> {a['turno_us'][p]:.1f} us ({cambio:+.1%})")
+        if cambio > tolerancia:
+            regresiones.append(f"turno_us.{p}")
+    for etapa, datos in a["etapas_us"].items():
+        previo = b["etapas_us"].get(etapa)
+        if previo and previo["promedio"]:
+            cambio = datos["promedio"] / previo["promedio"] - 1
+            print(f"  {etapa:<11} {previo['promedio']:>8.1f} -> {datos['promedio']:>8.1f} us ({cambio:+.1%})")
+            if cambio > tolerancia:
+                regresiones.append(f"etapas_us.{etapa}")
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversaciones sintéticas en proceso: rendimiento del HotelChatBot")
+    parser.add_argument("--sesiones", type=int, default=500, help="conversaciones simultáneas")
+    parser.add_argument("--mensajes", type=int, default=20000)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--errores", type=float, default=0.1, help="probabilidad de error de dedo por palabra")
+    parser.add_argument("--sin-cache", action="store_true", help="desactiva la caché de decisiones")
+    parser.add_argument("-o", "--salida", default="carga.json", help="archivo JSON con los resultados")
+    parser.add_argument("--comparar", metavar="ARCHIVO", help="resultados anteriores; sale con 1 si hay regresión")
+    parser.add_argument("--tolerancia", type=float, default=0.1)
+    args = parser.parse_args()
+
+    resultados = correr(args.sesiones, args.mensajes, args.semilla, args.errores, not args.sin_cache)
+    bot = HotelChatBot()
+    informe = {
+        "version": {"git": version_git(), "codigo": huella_codigo(), "intents": bot.modelo.huella,
+                    "python": sys.version.split()[0]},
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "parametros": {"sesiones": args.sesiones, "mensajes": args.mensajes, "semilla": args.semilla,
+                       "errores": args.errores, "cache": not args.sin_cache},
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+
+    print(f"Mensajes: {resultados['mensajes']}  ({resultados['mensajes_por_segundo']:.0f} mensajes/s)")
+    turno = resultados["turno_us"]
+    print(f"Turno: p50 {turno['p50']:.1f} us  p90 {turno['p90']:.1f} us  p99 {turno['p99']:.1f} us")
+    for etapa, datos in resultados["etapas_us"].items():
+        print(f"  {etapa:<11} p50 {datos['p50']:>8.1f}  p99 {datos['p99']:>8.1f} us  ({datos['llamadas']} llamadas)")
+    memoria = resultados["memoria_sesion_bytes"]
+    print(f"Memoria por sesión: {memoria['promedio']:.0f} bytes en promedio, {memoria['max']} máximo")
+    reservas = resultados["reservas"]
+    print(f"Reservas: {reservas['llegan_a_confirmar']} de {reservas['completas']} llegan a confirmar "
+          f"({reservas['fraccion_confirmar']:.1%}), {reservas['agotadas']} con el tipo agotado")
+    if reservas["fraccion_confirmar"] < MIN_LLEGAN_A_CONFIRMAR:
+        print(f"Aviso: menos de {MIN_LLEGAN_A_CONFIRMAR:.0%} de las reservas llega a confirmar; "
+              f"los números no miden el flujo de reserva", file=sys.stderr)
+    print(f"Resultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regresiones = comparar(informe, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"Regresiones: {', '.join(regresiones)}")
+            sys.exit(1)
@@ -0,0 +1,152 @@
+import argparse
+import importlib.util
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from motor20Q import COLUMNAS, RUTA_ARBOL, SIN_TEXTO, Arbol20Q, jugar
+
+RUTA_ORIGEN = "20Q.py"
+MAX_PREGUNTAS = 64      # una ruta más larga que esto delata un ciclo en el código de origen
+
+
+class _Pregunta(Exception):
+    """El juego pidió una respuesta más de las que se le dieron"""
+
+    def __init__(self, texto: str):
+        super().__init__(texto)
+        self.texto = texto
+
+
+def cargar_origen(ruta: str = RUTA_ORIGEN):
+    """Importa 20Q.py como módulo (su nombre no es un identificador válido)"""
+    spec = importlib.util.spec_from_file_location("origen20Q", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def correr(modulo, respuestas: Tuple[str, ...], transcripcion: Optional[List[str]] = None
+           ) -> Tuple[List[str], Optional[str]]:
+    """Juega main() del código original con `respuestas` ('s'/'n').
+
+    Reemplaza pedir_si_no y print del módulo, así que no toca la terminal.
+    Devuelve lo impreso después de la última respuesta y la pregunta que
+    siguió (None si el juego terminó). Con `transcripcion` además anota ahí
+    todo lo que el juego mostró, preguntas incluidas.
+    """
+    salida: List[str] = []
+    pendientes = iter(respuestas)
+    marca = 0
+
+    def pedir(pregunta: str) -> str:
+        nonlocal marca
+        respuesta = next(pendientes, None)
+        if respuesta is None:
+            raise _Pregunta(pregunta)
+        if transcripcion is not None:
+            transcripcion.append(f"{pregunta} -> {respuesta}")
+        marca = len(salida)
+        return respuesta
+
+    def imprimir(*valores, sep=" ", **_):
+        texto = sep.join(map(str, valores))
+        salida.append(texto)
+        if transcripcion is not None:
+            transcripcion.append(texto)
+
+    modulo.pedir_si_no, modulo.print = pedir, imprimir
+    try:
+        modulo.main()
+        pregunta = None
+    except _Pregunta as e:
+        pregunta = e.texto
+    return salida[marca:], pregunta
+
+
+def convertir(modulo) -> Arbol20Q:
+    """Recorre todas las rutas de respuestas del código original y arma la tabla de nodos.
+
+    Cada llamada a pedir_si_no alcanzada por una ruta es un nodo de pregunta y
+    cada final de partida una hoja; lo impreso entre dos preguntas queda como
+    aviso del nodo. Así la tabla reproduce lo que el código hace de verdad,
+    incluidas las ramas que imprimen una pregunta en vez de hacerla.
+    """
+    textos: List[str] = []
+    indices: Dict[str, int] = {}
+    columnas: Dict[str, List[int]] = {columna: [] for columna in COLUMNAS}
+
+    def indice(texto: str) -> int:
+        if not texto:
+            return SIN_TEXTO
+        if texto not in indices:
+            indices[texto] = len(textos)
+            textos.append(texto)
+        return indices[texto]
+
+    def nodo(respuestas: Tuple[str, ...]) -> int:
+        if len(respuestas) > MAX_PREGUNTAS:
+            raise ValueError(f"Más de {MAX_PREGUNTAS} preguntas seguidas: {''.join(respuestas)}")
+        salida, pregunta = correr(modulo, respuestas)
+        i = len(columnas["pregunta"])
+        for valores in columnas.values():
+            valores.append(SIN_TEXTO)
+        if pregunta is None:
+            columnas["hoja"][i] = indice("\n".join(salida))
+            return i
+        columnas["aviso"][i] = indice("\n".join(salida))
+        columnas["pregunta"][i] = indice(pregunta)
+        columnas["si"][i] = nodo(respuestas + ("s",))
+        columnas["no"][i] = nodo(respuestas + ("n",))
+        return i
+
+    nodo(())
+    return Arbol20Q(textos, *(columnas[columna] for columna in COLUMNAS))
+
+
+def verificar(modulo, arbol: Arbol20Q) -> List[str]:
+    """Juega cada ruta en el código original y en el motor; devuelve las rutas cuya salida difiere"""
+    distintas = []
+    pendientes: List[Tuple[int, str]] = [(0, "")]
+    while pendientes:
+        nodo, ruta = pendientes.pop()
+        if not arbol.es_hoja(nodo):
+            pendientes += [(arbol.si[nodo], ruta + "s"), (arbol.no[nodo], ruta + "n")]
+            continue
+        original: List[str] = []
+        correr(modulo, tuple(ruta), original)
+        motor: List[str] = []
+        respuestas = iter(ruta)
+
+        def preguntar(pregunta: str) -> str:
+            respuesta = next(respuestas)
+            motor.append(f"{pregunta} -> {respuesta}")
+            return respuesta
+
+        jugar(arbol, preguntar, motor.append)
+        # Lo que el original imprime en varias llamadas el motor lo guarda en un solo texto
+        if "\n".join(motor) != "\n".join(original):
+            distintas.append(ruta)
+    return distintas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera la tabla de nodos de 20Q a partir de 20Q.py")
+    parser.add_argument("origen", nargs="?", default=RUTA_ORIGEN)
+    parser.add_argument("-o", "--salida", default=RUTA_ARBOL)
+    parser.add_argument("--verificar", action="store_true",
+                        help="comprueba que el motor reproduce cada ruta del código original")
+    args = parser.parse_args()
+
+    modulo = cargar_origen(args.origen)
+    arbol = convertir(modulo)
+    arbol.guardar(args.salida, origen=args.origen)
+    e = arbol.estadisticas()
+    print(f"{args.salida}: {e['nodos']} nodos ({e['preguntas']} preguntas, {e['hojas']} hojas), "
+          f"{len(arbol.textos)} textos  Profundidad: máx {e['profundidad_max']}, "
+          f"promedio {e['profundidad_promedio']}")
+    if args.verificar:
+        distintas = verificar(modulo, arbol)
+        print(f"Rutas distintas del original: {len(distintas)}")
+        for ruta in distintas[:20]:
+            print(f"  {ruta}")
+        sys.exit(1 if distintas else 0)
@@ -0,0 +1,254 @@
+import argparse
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from motor20Q import RUTA_ARBOL, SIN_TEXTO, Arbol20Q, pedir_si_no
+
+PROB_RUTA = 0.98        # P(sí) de una pregunta que la ruta del objeto contestó con sí; deja margen a errores del jugador
+PROB_FUERA = 0.02       # P(sí) de una pregunta de otra rama: las categorías del árbol no se solapan
+RAZON_ADIVINAR = 20     # se arriesga cuando el favorito pesa esto veces más que el segundo
+GANANCIA_MINIMA = 1e-3  # bits; con menos ninguna pregunta vale la pena y se adivina
+PODA = 1e-3             # candidatos con menos peso relativo al favorito salen del juego
+RECORTE = 2             # la tabla de la partida se recorta cuando queda 1/RECORTE de los candidatos
+MAX_PREGUNTAS = 20
+RE_NUMERO = re.compile(r"^Q\d+:\s*")
+
+
+def entropia_binaria(p: np.ndarray) -> np.ndarray:
+    """H(p) en bits, elemento a elemento"""
+    p = np.clip(p, 1e-7, 1 - 1e-7)
+    return -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+
+
+class MatrizAtributos:
+    """Objetos × atributos: prob[i, a] es la probabilidad de que el objeto i conteste sí a la pregunta a.
+
+    La ganancia de información de todas las preguntas sale de un solo
+    producto matriz-vector: con los pesos w de los candidatos, la pregunta a
+    contesta sí con probabilidad w·prob[:, a] y la ganancia es
+    H(w·prob[:, a]) - w·H(prob[:, a]). Las dos mitades se calculan juntas
+    sobre `tabla`, que guarda prob y su entropía una fila por atributo: el
+    producto lee la memoria en orden y una respuesta lee una sola fila.
+    Cuando toda la matriz es ρ o 1 - ρ (atributos sí/no con un margen de error
+    parejo, como la que sale del árbol) H(prob) es la misma en todas partes,
+    la tabla lleva sólo prob y el producto lee la mitad.
+    """
+
+    def __init__(self, objetos: List[str], atributos: List[str], prob: np.ndarray,
+                 previa: Optional[np.ndarray] = None):
+        self.objetos = objetos
+        self.atributos = atributos
+        self.prob = np.asarray(prob, dtype=np.float32)
+        entropia = entropia_binaria(self.prob)
+        self.entropia_pareja: Optional[float] = float(entropia.flat[0]) \
+            if entropia.size and np.ptp(entropia) < 1e-6 else None
+        filas = [self.prob.T] if self.entropia_pareja is not None else [self.prob.T, entropia.T]
+        self.tabla = np.ascontiguousarray(np.vstack(filas), np.float32)
+        previa = np.ones(len(objetos), np.float32) if previa is None else np.asarray(previa, np.float32)
+        self.previa = previa / previa.sum()
+        # La primera decisión sólo depende de la previa: es la misma en todas las partidas
+        self.apertura: Optional[Tuple[str, int]] = None
+        self.apertura = Candidatos(self).decidir()
+
+    @classmethod
+    def desde_arbol(cls, arbol: Arbol20Q) -> "MatrizAtributos":
+        """Cada hoja con texto es un objeto y cada pregunta distinta (sin su número) un atributo.
+
+        Lo que la ruta de la hoja contestó queda en PROB_RUTA o 1 - PROB_RUTA;
+        las preguntas de otras ramas, en PROB_FUERA.
+        """
+        atributos: List[str] = []
+        indices = {}
+        for i in range(len(arbol)):
+            if not arbol.es_hoja(i):
+                texto = RE_NUMERO.sub("", arbol.textos[arbol.pregunta[i]])
+                indices.setdefault(texto, len(indices))
+                if len(indices) > len(atributos):
+                    atributos.append(texto)
+        objetos: List[str] = []
+        filas: List[List[Tuple[int, bool]]] = []
+        pendientes: List[Tuple[int, List[Tuple[int, bool]]]] = [(0, [])]
+        while pendientes:
+            nodo, ruta = pendientes.pop()
+            if arbol.es_hoja(nodo):
+                if arbol.hoja[nodo] != SIN_TEXTO:
+                    # Lo impreso antes del resultado (preguntas que el original imprime sin hacer) no es el objeto
+                    objetos.append(arbol.textos[arbol.hoja[nodo]].split("\n")[-1])
+                    filas.append(ruta)
+                continue
+            a = indices[RE_NUMERO.sub("", arbol.textos[arbol.pregunta[nodo]])]
+            pendientes += [(arbol.no[nodo], ruta + [(a, False)]), (arbol.si[nodo], ruta + [(a, True)])]
+        prob = np.full((len(objetos), len(atributos)), PROB_FUERA, np.float32)
+        for i, ruta in enumerate(filas):
+            for a, si in ruta:
+                prob[i, a] = PROB_RUTA if si else 1 - PROB_RUTA
+        return cls(objetos, atributos, prob)
+
+
+class Candidatos:
+    """Los objetos que siguen en juego en una partida y sus pesos.
+
+    Empieza compartiendo la tabla de la matriz; cuando la poda deja la mitad
+    o menos de los candidatos se queda con una copia recortada a ellos, así
+    cada turno recorre sólo lo que todavía puede ser la respuesta.
+    """
+
+    def __init__(self, matriz: MatrizAtributos):
+        self.matriz = matriz
+        self.indices = np.arange(len(matriz.objetos))
+        self.pesos = matriz.previa
+        self.tabla = matriz.tabla
+        self.preguntadas = np.zeros(len(matriz.atributos), bool)
+
+    def ganancias(self) -> np.ndarray:
+        """Reducción esperada de entropía (bits) de cada pregunta; -1 para las ya hechas"""
+        m = len(self.preguntadas)
+        suma = self.tabla @ self.pesos
+        condicional = suma[m:] if self.matriz.entropia_pareja is None else self.matriz.entropia_pareja
+        ganancia = entropia_binaria(suma[:m]) - condicional
+        ganancia[self.preguntadas] = -1
+        return ganancia
+
+    def decidir(self) -> Tuple[str, int]:
+        """("preguntar", atributo) o ("adivinar", objeto), con índices de la matriz"""
+        if self.matriz.apertura is not None and not self.preguntadas.any() \
+                and len(self.pesos) == len(self.matriz.objetos):
+            return self.matriz.apertura
+        if len(self.pesos) > 1:
+            segundo, favorito = np.argpartition(self.pesos, -2)[-2:]
+        else:
+            segundo = favorito = 0
+        if (len(self.pesos) > 1 and self.pesos[favorito] < RAZON_ADIVINAR * self.pesos[segundo]
+                and not self.preguntadas.all()):
+            ganancia = self.ganancias()
+            atributo = int(ganancia.argmax())
+            if ganancia[atributo] >= GANANCIA_MINIMA:
+                return "preguntar", atributo
+        return "adivinar", int(self.indices[favorito])
+
+    def responder(self, atributo: int, si: bool):
+        """Regla de Bayes con la respuesta, y poda de los que quedaron muy atrás"""
+        fila = self.tabla[atributo]
+        self.preguntadas[atributo] = True
+        self.repesar(self.pesos * (fila if si else 1 - fila))
+
+    def descartar(self, objeto: int):
+        """El jugador dijo que no era `objeto`"""
+        self.repesar(np.where(self.indices == objeto, 0, self.pesos))
+
+    def repesar(self, pesos: np.ndarray):
+        vivos = pesos >= PODA * pesos.max()
+        if not vivos.any():
+            self.indices, self.pesos = self.indices[:0], pesos[:0]
+            return
+        if np.count_nonzero(vivos) * RECORTE <= len(pesos):
+            # Copiar columnas sueltas cuesta varias multiplicaciones; sólo vale la pena si quedan pocas
+            vivos = np.flatnonzero(vivos)
+            self.indices, pesos, self.tabla = self.indices[vivos], pesos[vivos], self.tabla.take(vivos, axis=1)
+        else:
+            pesos = np.where(vivos, pesos, 0)
+        self.pesos = pesos / pesos.sum()
+
+
+def jugar(matriz: MatrizAtributos, preguntar: Callable[[str], str] = pedir_si_no,
+          mostrar: Callable[[str], None] = print) -> Optional[int]:
+    """Partida eligiendo cada pregunta por ganancia de información; devuelve el objeto adivinado o None"""
+    candidatos = Candidatos(matriz)
+    for _ in range(MAX_PREGUNTAS):
+        if not len(candidatos.pesos):
+            break
+        accion, i = candidatos.decidir()
+        if accion == "preguntar":
+            candidatos.responder(i, preguntar(matriz.atributos[i]) == "s")
+            continue
+        if preguntar(f"¿Es {matriz.objetos[i]}?") == "s":
+            mostrar("¡Lo adiviné!")
+            return i
+        candidatos.descartar(i)
+    mostrar("Me rindo.")
+    return None
+
+
+def simular(matriz: MatrizAtributos, objeto: int) -> Tuple[int, bool]:
+    """Juega pensando en `objeto` y contestando según su fila; (preguntas hasta acertar, acertó)"""
+    respuestas = {f"¿Es {texto}?": "s" if i == objeto else "n" for i, texto in enumerate(matriz.objetos)}
+    respuestas.update((texto, "s" if matriz.prob[objeto, a] >= 0.5 else "n")
+                      for a, texto in enumerate(matriz.atributos))
+    hechas = []
+
+    def preguntar(texto: str) -> str:
+        hechas.append(texto)
+        return respuestas[texto]
+
+    # El acierto final equivale a la hoja del árbol, que tampoco se cuenta como pregunta
+    acerto = jugar(matriz, preguntar, lambda _: None) == objeto
+    return len(hechas) - acerto, acerto
+
+
+def comparar_con_arbol(arbol: Arbol20Q, matriz: MatrizAtributos) -> Tuple[float, float, int]:
+    """Preguntas promedio por objeto: árbol fijo vs ganancia de información, y objetos no adivinados"""
+    profundidades = []
+    pendientes = [(0, 0)]
+    while pendientes:
+        nodo, profundidad = pendientes.pop()
+        if not arbol.es_hoja(nodo):
+            pendientes += [(arbol.si[nodo], profundidad + 1), (arbol.no[nodo], profundidad + 1)]
+        elif arbol.hoja[nodo] != SIN_TEXTO:
+            profundidades.append(profundidad)
+    resultados = [simular(matriz, i) for i in range(len(matriz.objetos))]
+    fallidos = sum(not acerto for _, acerto in resultados)
+    return (sum(profundidades) / len(profundidades),
+            sum(n for n, _ in resultados) / len(resultados), fallidos)
+
+
+def sintetica(n_objetos: int, n_atributos: int, rng: np.random.Generator) -> MatrizAtributos:
+    """Catálogo aleatorio: cada objeto contesta cada atributo al azar, con el margen de PROB_RUTA"""
+    bits = rng.random((n_objetos, n_atributos), np.float32) < 0.5
+    prob = np.where(bits, PROB_RUTA, 1 - PROB_RUTA).astype(np.float32)
+    return MatrizAtributos([f"objeto {i}" for i in range(n_objetos)],
+                           [f"atributo {a}" for a in range(n_atributos)], prob)
+
+
+def medir_turno(matriz: MatrizAtributos, partidas: int, rng: np.random.Generator) -> float:
+    """Microsegundos promedio de decidir + responder por turno, en partidas simuladas"""
+    turnos = 0
+    inicio = time.perf_counter()
+    for objeto in rng.integers(len(matriz.objetos), size=partidas):
+        candidatos = Candidatos(matriz)
+        for _ in range(MAX_PREGUNTAS):
+            accion, a = candidatos.decidir()
+            turnos += 1
+            if accion == "adivinar":
+                break
+            candidatos.responder(a, bool(matriz.prob[objeto, a] >= 0.5))
+    return (time.perf_counter() - inicio) / turnos * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="20Q eligiendo cada pregunta por ganancia de información")
+    parser.add_argument("--arbol", default=RUTA_ARBOL)
+    parser.add_argument("--comparar", action="store_true",
+                        help="preguntas promedio por objeto contra el árbol fijo, en vez de jugar")
+    parser.add_argument("--escala", type=int, nargs="*", metavar="N",
+                        help="mide el tiempo por turno con catálogos sintéticos de N objetos")
+    parser.add_argument("--atributos", type=int, default=64, help="atributos de los catálogos sintéticos")
+    args = parser.parse_args()
+
+    arbol = Arbol20Q.cargar(args.arbol)
+    matriz = MatrizAtributos.desde_arbol(arbol)
+    if args.escala:
+        rng = np.random.default_rng(0)
+        for n in args.escala:
+            sintetico = sintetica(n, args.atributos, rng)
+            print(f"{n:>9} objetos × {args.atributos} atributos: "
+                  f"{medir_turno(sintetico, 50, rng):8.1f} us por turno")
+    elif args.comparar:
+        fijo, entropia, fallidos = comparar_con_arbol(arbol, matriz)
+        print(f"{len(matriz.objetos)} objetos, {len(matriz.atributos)} atributos  "
+              f"Preguntas promedio: árbol {fijo:.2f}, ganancia de información {entropia:.2f}  "
+              f"No adivinados: {fallidos}")
+    else:
+        jugar(matriz)
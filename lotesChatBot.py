@@ -0,0 +1,155 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from collections import deque
+from datetime import date
+from itertools import islice
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ChatBot import HotelChatBot, interpretar_fechas_lote
+
+TAM_LOTE = 2000         # mensajes por tarea enviada a un proceso
+LOTES_POR_PROCESO = 2   # lotes en vuelo por proceso; acota la memoria aunque el log pese GB
+
+# Bot del proceso. Se carga antes de crear el pool para que, con fork, los
+# trabajadores lo hereden sin volver a leer intents.json.
+_bot: Optional[HotelChatBot] = None
+# Fecha desde la que se resuelven las fechas de los mensajes; None si no se extraen
+_referencia_fechas: Optional[date] = None
+
+
+def _iniciar_trabajador(corrector: str, referencia_fechas: Optional[date] = None):
+    global _bot, _referencia_fechas
+    if _bot is None:
+        _bot = HotelChatBot(corrector)
+    _referencia_fechas = referencia_fechas
+
+
+def clasificar(bot: HotelChatBot, texto: str) -> Dict:
+    """Corrige y clasifica un mensaje sin tocar el estado de ninguna sesión"""
+    corregido, normalizado = bot.corregir(texto)
+    correcciones = [[a, b] for a, b in zip(texto.split(), corregido.split()) if a != b]
+    intent = bot.match_intent(normalizado)
+    resultado = {
+        "corregido": corregido,
+        "correcciones": correcciones,
+        "tag": intent["tag"] if intent else None,
+        "patron": bot.modelo.matcher.patron_coincidente(intent, normalizado) if intent else None,
+        "motor": "regex" if intent else None,
+    }
+    if intent is None and bot.umbral_clasificador is not None:
+        intent, confianza = bot.modelo.clasificador.clasificar(normalizado)
+        if intent and confianza >= bot.umbral_clasificador:
+            resultado.update(tag=intent["tag"], motor="ngramas", confianza=round(confianza, 3))
+    return resultado
+
+
+def _clasificar_lote(lote: List[Tuple[int, str]]) -> List[Dict]:
+    resultados = []
+    for linea, texto in lote:
+        resultado = {"linea": linea, "texto": texto}
+        resultado.update(clasificar(_bot, texto))
+        resultados.append(resultado)
+    if _referencia_fechas is not None:
+        rangos = interpretar_fechas_lote([texto for _, texto in lote], _referencia_fechas)
+        for resultado, rango in zip(resultados, rangos):
+            resultado["fechas"] = rango.como_dict() if rango else None
+    return resultados
+
+
+def leer_mensajes(archivo, formato: str, campo: str) -> Iterator[Tuple[int, str]]:
+    """Lee (número de línea, texto) de un archivo JSONL, CSV o texto plano, sin cargarlo completo"""
+    if formato == "csv":
+        for num, fila in enumerate(csv.DictReader(archivo), 2):
+            texto = (fila.get(campo) or "").strip()
+            if texto:
+                yield num, texto
+        return
+
+    for num, linea in enumerate(archivo, 1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        if formato == "jsonl":
+            try:
+                texto = str(json.loads(linea).get(campo) or "").strip()
+            except (ValueError, AttributeError):
+                print(f"Línea {num}: JSON inválido, se omite", file=sys.stderr)
+                continue
+        else:
+            texto = linea
+        if texto:
+            yield num, texto
+
+
+def clasificar_mensajes(mensajes: Iterable[Tuple[int, str]], procesos: int = 1,
+                        corrector: str = "symspell", referencia_fechas: Optional[date] = None) -> Iterator[Dict]:
+    """Clasifica en orden un flujo de (línea, texto) con `procesos` trabajadores.
+
+    Sólo hay unos pocos lotes en vuelo a la vez, así que la memoria no
+    depende del tamaño de la entrada. Con referencia_fechas cada resultado
+    trae además las fechas de llegada y salida del mensaje.
+    """
+    _iniciar_trabajador(corrector, referencia_fechas)
+    mensajes = iter(mensajes)
+    lotes = iter(lambda: list(islice(mensajes, TAM_LOTE)), [])
+
+    if procesos <= 1:
+        for lote in lotes:
+            yield from _clasificar_lote(lote)
+        return
+
+    with Pool(procesos, initializer=_iniciar_trabajador, initargs=(corrector, referencia_fechas)) as pool:
+        pendientes = deque()
+        for lote in lotes:
+            pendientes.append(pool.apply_async(_clasificar_lote, (lote,)))
+            if len(pendientes) >= procesos * LOTES_POR_PROCESO:
+                yield from pendientes.popleft().get()
+        while pendientes:
+            yield from pendientes.popleft().get()
+
+
+def detectar_formato(ruta: str) -> str:
+    if ruta.endswith(".jsonl") or ruta.endswith(".json"):
+        return "jsonl"
+    if ruta.endswith(".csv"):
+        return "csv"
+    return "txt"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clasificación por lotes de mensajes históricos")
+    parser.add_argument("entrada", help="archivo JSONL, CSV o texto (un mensaje por línea); '-' para stdin")
+    parser.add_argument("-o", "--salida", default="-", help="archivo JSONL de resultados ('-' para stdout)")
+    parser.add_argument("--formato", choices=["auto", "jsonl", "csv", "txt"], default="auto")
+    parser.add_argument("--campo", default="texto", help="campo JSON o columna CSV con el mensaje")
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument("--corrector", default="symspell")
+    parser.add_argument("--fechas", action="store_true", help="extrae llegada y salida de cada mensaje")
+    parser.add_argument("--referencia", type=date.fromisoformat, default=None, metavar="AAAA-MM-DD",
+                        help="fecha desde la que se resuelven años y fechas relativas (por defecto hoy)")
+    args = parser.parse_args()
+
+    formato = args.formato if args.formato != "auto" else detectar_formato(args.entrada)
+    entrada = sys.stdin if args.entrada == "-" else open(args.entrada, encoding="utf-8", newline="")
+    salida = sys.stdout if args.salida == "-" else open(args.salida, "w", encoding="utf-8")
+
+    inicio = time.perf_counter()
+    total = con_tag = con_fechas = 0
+    referencia = (args.referencia or date.today()) if args.fechas else None
+    with entrada, salida:
+        for resultado in clasificar_mensajes(leer_mensajes(entrada, formato, args.campo),
+                                             args.procesos, args.corrector, referencia):
+            salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            total += 1
+            con_tag += resultado["tag"] is not None
+            con_fechas += resultado.get("fechas") is not None
+    transcurrido = time.perf_counter() - inicio
+
+    if args.fechas:
+        print(f"Con fechas: {con_fechas} ({con_fechas / max(total, 1):.1%})", file=sys.stderr)
+    print(f"Mensajes: {total}  Con intent: {con_tag} ({con_tag / max(total, 1):.1%})  "
+          f"Tiempo: {transcurrido:.1f} s  ({total / max(transcurrido, 1e-9):.0f} mensajes/s)", file=sys.stderr)
@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import json
+from array import array
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+RUTA_ARBOL = "20Q_arbol.json"
+FORMATO_ARBOL = 1
+SIN_TEXTO = -1          # en hoja/aviso: el nodo no muestra nada; en pregunta: el nodo es hoja
+COLUMNAS = ("pregunta", "si", "no", "hoja", "aviso")
+RESPUESTAS = {"s": "s", "si": "s", "sí": "s", "n": "n", "no": "n"}
+
+
+def pedir_si_no(pregunta: str) -> str:
+    """Pide repetidamente hasta que el usuario responda 's' o 'n' (acepta 'si'/'no')."""
+    while True:
+        r = RESPUESTAS.get(input(pregunta + " (s/n): ").strip().lower())
+        if r:
+            return r
+        print("Por favor responde 's' (sí) o 'n' (no).")
+
+
+class Estado20Q(NamedTuple):
+    """Partida en curso: el nodo al que se llegó y las respuestas ('s'/'n') que llevaron a él"""
+    nodo: int = 0
+    respuestas: str = ""
+    partida: str = ""   # identificador opcional: un reintento del mismo turno no cuenta dos partidas
+
+
+class Salida20Q(NamedTuple):
+    tipo: str           # "pregunta", o "adivinanza" cuando la partida terminó
+    texto: str
+    aviso: str = ""     # lo que se muestra antes (encabezado de categoría)
+
+
+class Arbol20Q:
+    """Árbol de preguntas de 20Q guardado como tabla de nodos en arreglos planos.
+
+    El nodo i pregunta textos[pregunta[i]] y sigue en si[i] o no[i]; si
+    pregunta[i] es SIN_TEXTO el nodo es hoja y muestra textos[hoja[i]]. aviso[i]
+    es lo que se muestra al llegar al nodo, antes de la pregunta (el encabezado
+    de una categoría, por ejemplo). El nodo 0 es la raíz. Recorrer cuesta una
+    lectura de arreglo por respuesta.
+
+    La huella identifica la forma del árbol en los estados serializados. Se
+    calcula al construirlo y no cambia al insertar una pregunta en una hoja,
+    porque eso no cambia adónde llevan las respuestas de una partida en curso.
+    Una partida que ya había terminado en esa hoja llega ahora a la pregunta;
+    previas[pregunta] es el nodo que quedó con la hoja de antes.
+    """
+
+    def __init__(self, textos: List[str], pregunta: Iterable[int], si: Iterable[int], no: Iterable[int],
+                 hoja: Iterable[int], aviso: Iterable[int]):
+        self.textos = textos
+        self.indice_textos = {texto: i for i, texto in enumerate(textos)}
+        self.pregunta = array("i", pregunta)
+        self.si = array("i", si)
+        self.no = array("i", no)
+        self.hoja = array("i", hoja)
+        self.aviso = array("i", aviso)
+        if not len(self.pregunta) == len(self.si) == len(self.no) == len(self.hoja) == len(self.aviso):
+            raise ValueError("Las columnas del árbol no tienen el mismo largo")
+        self.huella = self.calcular_huella()
+        self.previas: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.pregunta)
+
+    @classmethod
+    def cargar(cls, ruta: str = RUTA_ARBOL) -> "Arbol20Q":
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        if datos.get("formato") != FORMATO_ARBOL:
+            raise ValueError(f"{ruta}: formato de árbol {datos.get('formato')!r} no soportado")
+        return cls(datos["textos"], *(datos[columna] for columna in COLUMNAS))
+
+    def guardar(self, ruta: str = RUTA_ARBOL, origen: str = ""):
+        # Una columna por línea y un texto por línea: los cambios al árbol se leen en un diff
+        partes = [f'"formato": {FORMATO_ARBOL}', f'"origen": {json.dumps(origen, ensure_ascii=False)}',
+                  '"textos": [\n  ' + ",\n  ".join(json.dumps(t, ensure_ascii=False) for t in self.textos) + "\n ]"]
+        partes += [f'"{columna}": {json.dumps(getattr(self, columna).tolist())}' for columna in COLUMNAS]
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write("{\n " + ",\n ".join(partes) + "\n}\n")
+
+    def como_dict(self) -> Dict:
+        """Columnas, textos, huella y hojas previas: el árbol tal como va, aunque ya no corresponda a su huella"""
+        datos = {"huella": self.huella, "textos": self.textos, "previas": sorted(self.previas.items())}
+        datos.update((columna, getattr(self, columna).tolist()) for columna in COLUMNAS)
+        return datos
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> "Arbol20Q":
+        arbol = cls(list(datos["textos"]), *(datos[columna] for columna in COLUMNAS))
+        arbol.huella = datos["huella"]
+        arbol.previas = {int(pregunta): int(hoja) for pregunta, hoja in datos["previas"]}
+        return arbol
+
+    def calcular_huella(self) -> str:
+        """Identifica la versión del árbol en los estados serializados"""
+        h = hashlib.blake2b(digest_size=4)
+        for columna in COLUMNAS:
+            h.update(getattr(self, columna).tobytes())
+        h.update("\0".join(self.textos).encode("utf-8"))
+        return h.hexdigest()
+
+    def serializar_estado(self, estado: Estado20Q) -> str:
+        """'huella.respuestas[.partida]': cabe en una cookie y el nodo se recupera recorriendo"""
+        if estado.partida:
+            return f"{self.huella}.{estado.respuestas}.{estado.partida}"
+        return f"{self.huella}.{estado.respuestas}"
+
+    def deserializar_estado(self, texto: str) -> Estado20Q:
+        huella, _, respuestas = texto.partition(".")
+        respuestas, _, partida = respuestas.partition(".")
+        if huella != self.huella:
+            raise LookupError("La partida es de otra versión del árbol")
+        if respuestas.strip("sn") or len(respuestas) > len(self):
+            raise ValueError("Estado de partida inválido")
+        if partida and not (len(partida) <= 32 and partida.isascii() and partida.isalnum()):
+            raise ValueError("Estado de partida inválido: identificador de partida")
+        nodo = 0
+        for r in respuestas:
+            if self.es_hoja(nodo):
+                raise ValueError("Estado de partida inválido: sigue después de una hoja")
+            nodo = self.siguiente(nodo, r == "s")
+        return Estado20Q(nodo, respuestas, partida)
+
+    def agregar_texto(self, texto: str) -> int:
+        if texto not in self.indice_textos:
+            self.indice_textos[texto] = len(self.textos)
+            self.textos.append(texto)
+        return self.indice_textos[texto]
+
+    def insertar(self, hoja: int, pregunta: str, objeto: str, si_objeto: bool) -> int:
+        """Convierte la hoja en una pregunta que separa `objeto` de lo que la hoja decía.
+
+        Los dos hijos se agregan al final y la hoja se vuelve pregunta en una
+        sola escritura, cuando ya los tiene: quien recorra el árbol mientras
+        tanto ve la hoja vieja o la pregunta completa. Devuelve el nodo nuevo
+        de `objeto`.
+        """
+        if not self.es_hoja(hoja):
+            raise ValueError(f"El nodo {hoja} no es una hoja")
+        nuevo, viejo = len(self), len(self) + 1
+        for nodo, texto in ((nuevo, self.agregar_texto(objeto)), (viejo, self.hoja[hoja])):
+            self.pregunta.append(SIN_TEXTO)
+            self.si.append(SIN_TEXTO)
+            self.no.append(SIN_TEXTO)
+            self.hoja.append(texto)
+            self.aviso.append(SIN_TEXTO)
+        self.si[hoja], self.no[hoja] = (nuevo, viejo) if si_objeto else (viejo, nuevo)
+        self.previas[hoja] = viejo
+        self.pregunta[hoja] = self.agregar_texto(pregunta)
+        self.hoja[hoja] = SIN_TEXTO
+        return nuevo
+
+    def hoja_final(self, nodo: int) -> int:
+        """Donde terminó una partida que llegó a `nodo`: si ahí se aprendió después, la hoja de antes"""
+        while nodo in self.previas:
+            nodo = self.previas[nodo]
+        return nodo
+
+    def es_hoja(self, nodo: int) -> bool:
+        return self.pregunta[nodo] == SIN_TEXTO
+
+    def texto(self, indice: int) -> str:
+        return "" if indice == SIN_TEXTO else self.textos[indice]
+
+    def siguiente(self, nodo: int, respuesta: bool) -> int:
+        return self.si[nodo] if respuesta else self.no[nodo]
+
+    def recorrer(self, respuestas: Iterable[bool], nodo: int = 0) -> int:
+        """Nodo al que llevan las respuestas desde `nodo`; se detiene en la primera hoja"""
+        pregunta, si, no = self.pregunta, self.si, self.no
+        for respuesta in respuestas:
+            if pregunta[nodo] == SIN_TEXTO:
+                break
+            nodo = si[nodo] if respuesta else no[nodo]
+        return nodo
+
+    def estadisticas(self) -> Dict:
+        """Nodos, hojas y profundidad (preguntas hasta cada hoja)"""
+        profundidades = []
+        pendientes = [(0, 0)]
+        while pendientes:
+            nodo, profundidad = pendientes.pop()
+            if self.es_hoja(nodo):
+                profundidades.append(profundidad)
+            else:
+                pendientes += [(self.si[nodo], profundidad + 1), (self.no[nodo], profundidad + 1)]
+        return {"nodos": len(self), "preguntas": len(self) - len(profundidades), "hojas": len(profundidades),
+                "profundidad_max": max(profundidades),
+                "profundidad_promedio": round(sum(profundidades) / len(profundidades), 2)}
+
+
+def paso(arbol: Arbol20Q, estado: Estado20Q, respuesta: Optional[str] = None) -> Tuple[Estado20Q, Salida20Q]:
+    """Un turno sin efectos: aplica la respuesta ('s'/'n') y dice qué mostrar.
+
+    Con respuesta None sólo dice qué mostrar en el estado dado (para empezar
+    o retomar una partida).
+    """
+    if respuesta is not None:
+        if arbol.es_hoja(estado.nodo):
+            raise ValueError("La partida ya terminó")
+        if respuesta not in ("s", "n"):
+            raise ValueError(f"Respuesta inválida: {respuesta!r}")
+        estado = Estado20Q(arbol.siguiente(estado.nodo, respuesta == "s"), estado.respuestas + respuesta,
+                           estado.partida)
+    nodo = estado.nodo
+    aviso = arbol.texto(arbol.aviso[nodo])
+    if arbol.es_hoja(nodo):
+        return estado, Salida20Q("adivinanza", arbol.texto(arbol.hoja[nodo]), aviso)
+    return estado, Salida20Q("pregunta", arbol.textos[arbol.pregunta[nodo]], aviso)
+
+
+def jugar(arbol: Arbol20Q, preguntar: Callable[[str], str] = pedir_si_no,
+          mostrar: Callable[[str], None] = print) -> int:
+    """Una partida completa; devuelve la hoja a la que se llegó"""
+    estado, salida = paso(arbol, Estado20Q())
+    while True:
+        if salida.aviso:
+            mostrar(salida.aviso)
+        if salida.tipo == "adivinanza":
+            if salida.texto:
+                mostrar(salida.texto)
+            return estado.nodo
+        estado, salida = paso(arbol, estado, preguntar(salida.texto))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="20 preguntas sobre el árbol de 20Q_arbol.json")
+    parser.add_argument("--arbol", default=RUTA_ARBOL, help="tabla de nodos generada con convertir20Q.py")
+    args = parser.parse_args()
+    jugar(Arbol20Q.cargar(args.arbol))
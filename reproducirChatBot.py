@@ -0,0 +1,176 @@
+import argparse
+import gzip
+import json
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from itertools import islice
+from multiprocessing import get_context
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ChatBot import HotelChatBot
+
+SESIONES_POR_TAREA = 64
+
+# Partes de una respuesta que cambian aunque el bot se comporte igual
+VOLATILES = [
+    (re.compile(r"\bHTL[A-Z0-9]+\b"), "HTL*"),                              # códigos de reserva
+    (re.compile(r": (?:\$[\d,]+/noche \(\d+ libres?\)|agotada)"), ": <ocupación>"),  # depende de otras sesiones
+]
+# Turnos cuyo desenlace decidió la ocupación del hotel, que la reproducción no tiene
+RE_INVENTARIO = re.compile(r"ya no quedan habitaciones|no tenemos habitaciones libres|ya la tomó otro huésped")
+# Campo de la transcripción -> nombre en el resumen
+CAMPOS_COMPARADOS = {"c": "corrección", "g": "intent", "b": "estado", "r": "respuesta", "o": "opciones"}
+
+_bot: Optional[HotelChatBot] = None
+_respuestas: Dict[str, set] = {}
+
+
+def _iniciar_trabajador(corrector: str):
+    global _bot, _respuestas
+    if _bot is None:
+        _bot = HotelChatBot(corrector)
+        _respuestas = {i["tag"]: set(i.get("responses", [])) for i in _bot.intents}
+
+
+def abrir(ruta: str):
+    return gzip.open(ruta, "rt", encoding="utf-8") if ruta.endswith(".gz") else open(ruta, encoding="utf-8")
+
+
+def leer_transcripciones(rutas: Iterable[str]) -> Dict[str, List[Dict]]:
+    """Turnos agrupados por sesión, en el orden en que ocurrieron"""
+    sesiones: Dict[str, List[Dict]] = defaultdict(list)
+    for ruta in rutas:
+        with abrir(ruta) as archivo:
+            for num, linea in enumerate(archivo, 1):
+                try:
+                    turno = json.loads(linea)
+                except ValueError:
+                    print(f"{ruta}:{num}: línea inválida, se omite", file=sys.stderr)
+                    continue
+                if "formato" not in turno:
+                    sesiones[turno["s"]].append(turno)
+    for turnos in sesiones.values():
+        turnos.sort(key=lambda t: t["t"])
+    return sesiones
+
+
+def canonizar(mensajes: List[str], tag: Optional[str]) -> List[str]:
+    """Mensajes comparables: sin partes volátiles y sin el azar de elegir respuesta.
+
+    Si el primer mensaje es una de las respuestas del intent, cualquiera de
+    ellas vale lo mismo. Si intents.json cambió ese texto, deja de estar en el
+    conjunto y la diferencia aparece.
+    """
+    mensajes = list(mensajes)
+    if tag and mensajes and mensajes[0] in _respuestas.get(tag, ()):
+        mensajes[0] = f"<respuesta de {tag}>"
+    for i, mensaje in enumerate(mensajes):
+        for patron, reemplazo in VOLATILES:
+            mensaje = patron.sub(reemplazo, mensaje)
+        mensajes[i] = mensaje
+    return mensajes
+
+
+def reproducir_sesion(session_id: str, turnos: List[Dict], cuenta: Counter) -> List[Dict]:
+    """Pasa los turnos por el bot nuevo y devuelve las diferencias con lo grabado.
+
+    En cuanto el estado queda distinto al grabado, el resto de la sesión ya no
+    es comparable y se cuenta como omitido. Los turnos que resolvió la
+    ocupación del hotel se cuentan aparte: la reproducción empieza con el
+    hotel vacío y las sesiones repartidas entre procesos.
+    """
+    bot = _bot
+    divergencias = []
+    for num, turno in enumerate(turnos):
+        dia = date.fromtimestamp(turno["t"])
+        bot.hoy = lambda: dia  # las fechas relativas se resuelven como el día que se grabó
+        respuesta = bot.respond(turno["i"], session_id)
+        nuevo = {"c": bot.corregido_turno, "g": bot.intent_turno["tag"] if bot.intent_turno else None,
+                 "b": respuesta.estado, "r": respuesta.mensajes, "o": respuesta.opciones}
+        distintos = [campo for campo in CAMPOS_COMPARADOS
+                     if (canonizar(turno[campo], turno["g"]) if campo == "r" else turno[campo])
+                     != (canonizar(nuevo[campo], nuevo["g"]) if campo == "r" else nuevo[campo])]
+        if distintos and any(RE_INVENTARIO.search(m) for m in turno["r"] + nuevo["r"]):
+            cuenta["inventario"] += 1
+        elif distintos:
+            cuenta["divergentes"] += 1
+            divergencias.append({"sesion": session_id, "turno": num, "entrada": turno["i"], "campos": distintos,
+                                 "grabado": {c: turno[c] for c in distintos},
+                                 "nuevo": {c: nuevo[c] for c in distintos}})
+        else:
+            cuenta["iguales"] += 1
+        if "b" in distintos:
+            cuenta["omitidos"] += len(turnos) - num - 1
+            break
+    bot.cerrar_sesion(session_id)
+    del bot.hoy
+    return divergencias
+
+
+def _reproducir_tarea(tarea: List) -> Tuple[List[Dict], Counter]:
+    divergencias, cuenta = [], Counter()
+    for session_id, turnos in tarea:
+        divergencias.extend(reproducir_sesion(session_id, turnos, cuenta))
+    return divergencias, cuenta
+
+
+def reproducir(sesiones: Dict[str, List[Dict]], cuenta: Counter, procesos: int = 1,
+               corrector: str = "symspell") -> Iterator[Dict]:
+    """Divergencias de todas las sesiones, repartidas entre `procesos` (cada sesión en uno solo).
+
+    `cuenta` acumula iguales, divergentes, inventario y omitidos.
+    """
+    _iniciar_trabajador(corrector)
+    elementos = iter(sesiones.items())
+    tareas = iter(lambda: list(islice(elementos, SESIONES_POR_TAREA)), [])
+    if procesos <= 1:
+        resultados = map(_reproducir_tarea, tareas)
+        for divergencias, parcial in resultados:
+            cuenta.update(parcial)
+            yield from divergencias
+        return
+    with get_context("fork").Pool(procesos, initializer=_iniciar_trabajador, initargs=(corrector,)) as pool:
+        for divergencias, parcial in pool.imap(_reproducir_tarea, tareas):
+            cuenta.update(parcial)
+            yield from divergencias
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproduce transcripciones grabadas y reporta dónde cambió el bot")
+    parser.add_argument("transcripciones", nargs="+", help="archivos JSONL (o .jsonl.gz) del grabador")
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument("--corrector", default="symspell")
+    parser.add_argument("-o", "--salida", help="archivo JSONL con cada divergencia")
+    parser.add_argument("--mostrar", type=int, default=10, help="divergencias a mostrar en pantalla")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    sesiones = leer_transcripciones(args.transcripciones)
+    total = sum(len(turnos) for turnos in sesiones.values())
+    por_campo, cuenta = Counter(), Counter()
+    n_divergencias = 0
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else None
+    for divergencia in reproducir(sesiones, cuenta, args.procesos, args.corrector):
+        n_divergencias += 1
+        por_campo.update(divergencia["campos"])
+        if salida:
+            salida.write(json.dumps(divergencia, ensure_ascii=False) + "\n")
+        if n_divergencias <= args.mostrar:
+            print(f"[{divergencia['sesion']} #{divergencia['turno']}] {divergencia['entrada']!r}")
+            for campo in divergencia["campos"]:
+                print(f"  {campo}: {divergencia['grabado'][campo]!r}\n  {'':>{len(campo)}}  -> {divergencia['nuevo'][campo]!r}")
+    if salida:
+        salida.close()
+    transcurrido = time.perf_counter() - inicio
+
+    print(f"Sesiones: {len(sesiones)}  Turnos: {total}  Divergentes: {n_divergencias} "
+          f"({n_divergencias / max(total, 1):.2%})  Tiempo: {transcurrido:.1f} s "
+          f"({total / max(transcurrido, 1e-9):.0f} turnos/s)")
+    print(f"  Iguales: {cuenta['iguales']}  Decididos por la ocupación: {cuenta['inventario']}  "
+          f"Omitidos tras cambiar de estado: {cuenta['omitidos']}")
+    if por_campo:
+        print("  " + "  ".join(f"{CAMPOS_COMPARADOS[c]}: {n}" for c, n in por_campo.most_common()))
+        sys.exit(1)
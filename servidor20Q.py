@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import signal
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aprendizaje20Q import MIN_PARTIDAS_REBALANCEO, RUTA_BITACORA, Aprendiz, Bitacora
+from motor20Q import RESPUESTAS, RUTA_ARBOL, Arbol20Q, Estado20Q, paso
+from servidorChatBot import ServidorChatBot, pedir_json, percentil
+
+
+class Servidor20Q(ServidorChatBot):
+    """Partidas de 20Q por HTTP sin guardar nada en el servidor.
+
+    Cada respuesta trae el estado serializado de la partida y el cliente lo
+    devuelve con su siguiente respuesta; puede guardarlo donde quiera (una
+    cookie, un almacén clave-valor). Las partidas simultáneas no ocupan
+    memoria y cualquier proceso con el mismo árbol puede atender cualquier
+    turno.
+
+    Con un Aprendiz, las partidas perdidas enseñan por POST /20q/aprender y
+    una tarea de fondo trae lo que aprendieron los demás procesos y rebalancea
+    el árbol cada tanto. Un estado de una versión anterior del árbol se sigue
+    atendiendo con esa versión hasta que termina. Al aprender, cada partida
+    lleva un identificador en su estado: si el cliente reintenta el último
+    turno, la partida se cuenta una sola vez.
+    """
+
+    def __init__(self, arbol: Arbol20Q, aprendiz: Optional[Aprendiz] = None):
+        self.arbol = arbol
+        self.aprendiz = aprendiz
+        self.bot = None
+        self.esperando = 0
+        self.conexiones = 0
+        self.partidas = 0
+        self.turnos = 0
+
+    def turno(self, estado: Optional[str], respuesta) -> Tuple[int, Dict]:
+        """Sin estado empieza una partida; con estado aplica la respuesta ('s'/'n', 'si'/'no' o null para repetir)"""
+        arbol = self.arbol_actual()
+        if estado is None:
+            estado_20q = Estado20Q() if self.aprendiz is None else Estado20Q(partida=secrets.token_hex(8))
+            estado_20q, salida = paso(arbol, estado_20q)
+            self.partidas += 1
+        else:
+            r = None if respuesta is None else RESPUESTAS.get(str(respuesta).strip().lower())
+            if respuesta is not None and r is None:
+                return 400, {"error": "La respuesta debe ser 's' o 'n'"}
+            try:
+                arbol = self.arbol_de(str(estado))
+                estado_20q, salida = paso(arbol, arbol.deserializar_estado(str(estado)), r)
+            except LookupError as e:
+                return 409, {"error": f"{e}; empieza una nueva"}
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            if self.aprendiz is not None and r is not None and salida.tipo == "adivinanza":
+                self.aprendiz.registrar_partida(arbol, estado_20q)
+        self.turnos += 1
+        return 200, {"estado": arbol.serializar_estado(estado_20q), "tipo": salida.tipo,
+                     "texto": salida.texto, "aviso": salida.aviso, "preguntas": len(estado_20q.respuestas)}
+
+    def arbol_actual(self) -> Arbol20Q:
+        return self.arbol if self.aprendiz is None else self.aprendiz.arbol
+
+    def arbol_de(self, estado: str) -> Arbol20Q:
+        if self.aprendiz is None:
+            return self.arbol
+        return self.aprendiz.arbol_de(estado.partition(".")[0])
+
+    def aprender(self, estado, objeto, pregunta, respuesta) -> Tuple[int, Dict]:
+        """La partida de `estado` adivinó mal: `objeto` contesta `respuesta` a `pregunta`"""
+        if self.aprendiz is None:
+            return 404, {"error": "Este servidor no aprende"}
+        r = RESPUESTAS.get(str(respuesta).strip().lower())
+        if not isinstance(objeto, str) or not isinstance(pregunta, str) or r is None:
+            return 400, {"error": "Se espera JSON con 'estado', 'objeto', 'pregunta' y 'respuesta' ('s' o 'n')"}
+        try:
+            arbol = self.arbol_de(str(estado))
+            self.aprendiz.aprender(arbol, arbol.deserializar_estado(str(estado)), objeto, pregunta, r == "s")
+        except LookupError as e:
+            return 409, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        return 200, {"ok": True, "arbol": self.aprendiz.arbol.huella}
+
+    async def mantener(self, intervalo: float, intervalo_rebalanceo: float):
+        """Trae lo que escribieron otros procesos y rebalancea cuando se juntaron suficientes partidas"""
+        ultimo = time.monotonic()
+        while True:
+            await asyncio.sleep(intervalo)
+            self.aprendiz.sincronizar()
+            if self.aprendiz.rebalanceo_pendiente() and time.monotonic() - ultimo >= intervalo_rebalanceo:
+                ultimo = time.monotonic()
+                self.aprendiz.pedir_rebalanceo()
+
+    async def atender(self, metodo: str, ruta: str, cuerpo: bytes) -> Tuple[int, Dict]:
+        ruta = ruta.partition("?")[0]
+        if ruta == "/salud" and metodo == "GET":
+            arbol = self.arbol_actual()
+            salud = {"ok": True, "arbol": arbol.huella, "nodos": len(arbol),
+                     "partidas": self.partidas, "turnos": self.turnos, "conexiones": self.conexiones}
+            if self.aprendiz is not None:
+                salud.update(aprendidos=self.aprendiz.aprendidos, conflictos=self.aprendiz.conflictos,
+                             registros_invalidos=self.aprendiz.bitacora.invalidas)
+            return 200, salud
+        if ruta not in ("/20q", "/20q/aprender") or metodo != "POST":
+            return 404, {"error": "Ruta no encontrada"}
+        try:
+            datos = json.loads(cuerpo or b"{}")
+            estado, respuesta = datos.get("estado"), datos.get("respuesta")
+        except (ValueError, AttributeError):
+            return 400, {"error": "Se espera JSON con 'estado' y 'respuesta' (sin estado empieza una partida)"}
+        if ruta == "/20q/aprender":
+            return self.aprender(estado, datos.get("objeto"), datos.get("pregunta"), respuesta)
+        return self.turno(estado, respuesta)
+
+
+# ----------------------------------- Generador de carga ----------------------------------- #
+
+async def jugador(host: str, puerto: int, num: int, n_partidas: int, latencias: List[float],
+                  errores: List[int]):
+    """Juega n_partidas contestando al azar, por una sola conexión"""
+    rng = random.Random(num)
+    reader, writer = await asyncio.open_connection(host, puerto)
+    try:
+        for _ in range(n_partidas):
+            datos = {"estado": None}
+            while True:
+                inicio = time.perf_counter()
+                status, r = await pedir_json(reader, writer, host, "/20q", datos)
+                latencias.append(time.perf_counter() - inicio)
+                if status != 200:
+                    errores.append(status)
+                    break
+                if r["tipo"] == "adivinanza":
+                    break
+                datos = {"estado": r["estado"], "respuesta": rng.choice("sn")}
+    finally:
+        writer.close()
+
+
+async def prueba_carga(n_jugadores: int, n_partidas: int, puerto: int, ruta_arbol: str = RUTA_ARBOL) -> Dict:
+    """Levanta el servidor y n_jugadores partidas simultáneas en el mismo proceso (un solo núcleo)"""
+    servidor = Servidor20Q(Arbol20Q.cargar(ruta_arbol))
+    tcp = await servidor.iniciar("127.0.0.1", puerto)
+    puerto = tcp.sockets[0].getsockname()[1]
+    latencias: List[float] = []
+    errores: List[int] = []
+    inicio = time.perf_counter()
+    try:
+        await asyncio.gather(*(jugador("127.0.0.1", puerto, i, n_partidas, latencias, errores)
+                               for i in range(n_jugadores)))
+    finally:
+        tcp.close()
+        await tcp.wait_closed()
+    total = time.perf_counter() - inicio
+    resultado = {"jugadores": n_jugadores, "partidas": servidor.partidas, "turnos": len(latencias),
+                 "errores": len(errores), "turnos_por_segundo": len(latencias) / total,
+                 "p50_ms": percentil(latencias, 50) * 1e3, "p99_ms": percentil(latencias, 99) * 1e3}
+    print(f"Jugadores simultáneos: {n_jugadores}  Partidas: {resultado['partidas']}  "
+          f"Turnos: {resultado['turnos']}  Errores: {resultado['errores']}")
+    print(f"Turnos/segundo: {resultado['turnos_por_segundo']:.0f}  "
+          f"Latencia p50: {resultado['p50_ms']:.2f} ms  p99: {resultado['p99_ms']:.2f} ms")
+    return resultado
+
+
+async def servir(host: str, puerto: int, ruta_arbol: str = RUTA_ARBOL, ruta_bitacora: Optional[str] = None,
+                 intervalo_rebalanceo: float = 60.0, ruta_instantanea: Optional[str] = None):
+    arbol = Arbol20Q.cargar(ruta_arbol)
+    aprendiz = None
+    if ruta_bitacora is not None:
+        aprendiz = Aprendiz(arbol, Bitacora(ruta_bitacora), ruta_instantanea or ruta_bitacora + ".instantanea")
+    servidor = Servidor20Q(arbol, aprendiz)
+    tcp = await servidor.iniciar(host, puerto)
+    print(f"20Q escuchando en http://{host}:{puerto}/20q (árbol {servidor.arbol_actual().huella})")
+    if aprendiz is not None:
+        print(f"Aprendiendo en {ruta_bitacora}: {aprendiz.aprendidos} objetos aprendidos, "
+              f"rebalanceo cada {MIN_PARTIDAS_REBALANCEO} partidas y {intervalo_rebalanceo:.0f} s como mínimo")
+    mantenimiento = asyncio.ensure_future(servidor.mantener(1.0, intervalo_rebalanceo)) if aprendiz else None
+    # SIGTERM: deja de aceptar y, al aprender, deja la instantánea al día
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        async with tcp:
+            await tcp.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if aprendiz is not None:
+            mantenimiento.cancel()
+            aprendiz.cerrar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor HTTP de 20Q con el estado de cada partida en el cliente")
+    parser.add_argument("--arbol", default=RUTA_ARBOL)
+    sub = parser.add_subparsers(dest="modo", required=True)
+    p_servir = sub.add_parser("servir", help="Atiende POST /20q {'estado', 'respuesta'}")
+    p_servir.add_argument("--host", default="127.0.0.1")
+    p_servir.add_argument("--puerto", type=int, default=8020)
+    p_servir.add_argument("--aprender", action="store_true",
+                          help="aprende de las partidas perdidas (POST /20q/aprender) en --bitacora")
+    p_servir.add_argument("--bitacora", default=RUTA_BITACORA, help="compartida por todos los procesos que aprenden")
+    p_servir.add_argument("--rebalanceo", type=float, default=60.0, help="segundos mínimos entre rebalanceos")
+    p_servir.add_argument("--instantanea", help="estado aplicado hasta cierto punto de la bitácora; al arrancar "
+                                                "sólo se aplica lo posterior (por omisión, la bitácora + .instantanea)")
+    p_carga = sub.add_parser("carga", help="Muchas partidas simultáneas en proceso: turnos/segundo y p50/p99")
+    p_carga.add_argument("--jugadores", type=int, default=1000, help="partidas simultáneas, una conexión cada una")
+    p_carga.add_argument("--partidas", type=int, default=3, help="partidas seguidas por jugador")
+    p_carga.add_argument("--puerto", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.modo == "servir":
+        asyncio.run(servir(args.host, args.puerto, args.arbol, args.bitacora if args.aprender else None,
+                           args.rebalanceo, args.instantanea))
+    else:
+        asyncio.run(prueba_carga(args.jugadores, args.partidas, args.puerto, args.arbol))
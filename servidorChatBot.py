@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import json
+import random
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ChatBot import (AlmacenSQLite, GrabadorTranscripciones, HotelChatBot, Instrumentacion, InventarioSQLite,
+                     RecargadorIntents, formato_prometheus)
+from trabajadoresChatBot import PoolTrabajadores
+
+MAX_EN_VUELO = 64          # peticiones admitidas a la vez; las demás esperan su turno
+MAX_COLA = 1024            # si ya hay tantas esperando, se rechaza con 503 (backpressure)
+MAX_CONEXIONES = 2048
+TIMEOUT_LECTURA = 10.0     # segundos para recibir encabezados y cuerpo
+TIMEOUT_PETICION = 5.0     # segundos máximos esperando turno para ser atendida
+TIMEOUT_TURNO = 10.0       # segundos máximos procesando un mensaje antes de responder 504
+MAX_CUERPO = 64 * 1024
+
+ESTADOS_HTTP = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    408: "Request Timeout",
+    409: "Conflict",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+CONVERSACIONES_CARGA = [
+    ["hola", "Ana", "disponibilidad", "15 de enero al 20 de enero", "suite", "sí"],
+    ["tienen spa", "2", "salir"],
+    ["tengo un problema", "habitación 204"],
+    ["perdí mi cartera", "una cartera negra", "55-1234-5678"],
+    ["wifi", "restaurante", "gracias"],
+    ["qwerty", "quiero reservar", "no"],
+]
+
+
+class PeticionInvalida(Exception):
+    def __init__(self, status: int, mensaje: str):
+        super().__init__(mensaje)
+        self.status = status
+
+
+async def leer_peticion(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """Lee una petición HTTP/1.1. Devuelve None si el cliente cerró la conexión."""
+    try:
+        cabecera = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise PeticionInvalida(413, "Encabezados demasiado grandes")
+
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    try:
+        metodo, ruta, _ = lineas[0].split(" ", 2)
+    except ValueError:
+        raise PeticionInvalida(400, "Línea de petición inválida")
+
+    encabezados = {}
+    for linea in lineas[1:]:
+        if ":" in linea:
+            nombre, valor = linea.split(":", 1)
+            encabezados[nombre.strip().lower()] = valor.strip()
+
+    largo = encabezados.get("content-length", "0") or "0"
+    if not (largo.isascii() and largo.isdigit()):
+        raise PeticionInvalida(400, "Content-Length inválido")
+    largo = int(largo)
+    if largo > MAX_CUERPO:
+        raise PeticionInvalida(413, "Cuerpo demasiado grande")
+    cuerpo = await reader.readexactly(largo) if largo else b""
+    return metodo, ruta, encabezados, cuerpo
+
+
+def escribir_respuesta(writer: asyncio.StreamWriter, status: int, datos,
+                       mantener: bool = True, extra: Optional[Dict[str, str]] = None):
+    """Responde con JSON, o con texto plano si `datos` ya es una cadena"""
+    if isinstance(datos, str):
+        cuerpo = datos.encode("utf-8")
+        tipo = "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        tipo = "application/json; charset=utf-8"
+    encabezados = [
+        f"HTTP/1.1 {status} {ESTADOS_HTTP.get(status, '')}",
+        f"Content-Type: {tipo}",
+        f"Content-Length: {len(cuerpo)}",
+        f"Connection: {'keep-alive' if mantener else 'close'}",
+    ]
+    for nombre, valor in (extra or {}).items():
+        encabezados.append(f"{nombre}: {valor}")
+    writer.write(("\r\n".join(encabezados) + "\r\n\r\n").encode("latin-1") + cuerpo)
+
+
+class ServidorChatBot:
+    """Atiende mensajes por HTTP y los reparte a la sesión de cada huésped sobre un solo bot.
+
+    El bot guarda el turno en curso en sí mismo, así que los turnos corren de
+    a uno en un hilo aparte: el bucle de eventos sigue leyendo peticiones,
+    contestando /salud y haciendo cumplir los límites mientras tanto.
+    """
+
+    def __init__(self, bot: Optional[HotelChatBot] = None):
+        self.bot = bot or HotelChatBot()
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="turnos")
+        self.turno = asyncio.Semaphore(MAX_EN_VUELO)
+        self.esperando = 0
+        self.conexiones = 0
+
+    async def procesar(self, session_id: str, texto: str) -> Dict:
+        respuesta = await asyncio.get_running_loop().run_in_executor(self.ejecutor, self.bot.respond,
+                                                                     texto, session_id)
+        return {
+            "session_id": session_id,
+            "mensajes": respuesta.mensajes,
+            "estado": respuesta.estado,
+            "opciones": respuesta.opciones,
+        }
+
+    async def atender(self, metodo: str, ruta: str, cuerpo: bytes) -> Tuple[int, Dict]:
+        ruta, _, consulta = ruta.partition("?")
+        if ruta == "/metricas" and metodo == "GET":
+            metricas = self.bot.metricas()
+            return 200, formato_prometheus(metricas) if "formato=prometheus" in consulta else metricas
+        if ruta == "/salud" and metodo == "GET":
+            return 200, {"ok": True, "sesiones": len(self.bot.sesiones), "esperando": self.esperando,
+                         "cache": self.bot.cache.estadisticas(), "modelo": self.bot.modelo.huella,
+                         "ultima_recarga": self.bot.ultima_recarga}
+        if ruta != "/mensaje" or metodo != "POST":
+            return 404, {"error": "Ruta no encontrada"}
+
+        try:
+            datos = json.loads(cuerpo or b"{}")
+            session_id = str(datos["session_id"])
+            texto = str(datos["texto"]).strip()
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": "Se espera JSON con 'session_id' y 'texto'"}
+        if not texto:
+            return 400, {"error": "El texto está vacío"}
+
+        if self.esperando >= MAX_COLA:
+            return 503, {"error": "Servidor ocupado, intenta más tarde"}
+        self.esperando += 1
+        try:
+            await asyncio.wait_for(self.turno.acquire(), TIMEOUT_PETICION)
+        except asyncio.TimeoutError:
+            return 504, {"error": "Tiempo de espera agotado"}
+        finally:
+            self.esperando -= 1
+        try:
+            return 200, await asyncio.wait_for(self.procesar(session_id, texto), TIMEOUT_TURNO)
+        except asyncio.TimeoutError:
+            return 504, {"error": "El mensaje tardó demasiado en procesarse"}
+        finally:
+            self.turno.release()
+
+    async def conexion(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.conexiones >= MAX_CONEXIONES:
+            escribir_respuesta(writer, 503, {"error": "Demasiadas conexiones"}, mantener=False)
+            writer.close()
+            return
+        self.conexiones += 1
+        try:
+            while True:
+                try:
+                    peticion = await asyncio.wait_for(leer_peticion(reader), TIMEOUT_LECTURA)
+                except asyncio.TimeoutError:
+                    escribir_respuesta(writer, 408, {"error": "Tiempo de lectura agotado"}, mantener=False)
+                    break
+                except PeticionInvalida as e:
+                    escribir_respuesta(writer, e.status, {"error": str(e)}, mantener=False)
+                    break
+                if peticion is None:
+                    break
+
+                metodo, ruta, encabezados, cuerpo = peticion
+                status, datos = await self.atender(metodo, ruta, cuerpo)
+                mantener = encabezados.get("connection", "").lower() != "close"
+                extra = {"Retry-After": "1"} if status == 503 else None
+                escribir_respuesta(writer, status, datos, mantener, extra)
+                await writer.drain()
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.conexiones -= 1
+            writer.close()
+
+    async def iniciar(self, host: str, puerto: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.conexion, host, puerto)
+
+
+class ServidorTrabajadores(ServidorChatBot):
+    """El mismo HTTP, pero los mensajes los atiende un pool de procesos (uno por núcleo)"""
+
+    def __init__(self, pool: PoolTrabajadores):
+        self.pool = pool
+        self.bot = None
+        self.turno = asyncio.Semaphore(MAX_EN_VUELO * len(pool.trabajadores))
+        self.esperando = 0
+        self.conexiones = 0
+
+    async def procesar(self, session_id: str, texto: str) -> Dict:
+        return await self.pool.responder(session_id, texto)
+
+    async def atender(self, metodo: str, ruta: str, cuerpo: bytes) -> Tuple[int, Dict]:
+        ruta_base, _, consulta = ruta.partition("?")
+        if ruta_base == "/salud" and metodo == "GET":
+            return 200, {"ok": True, "esperando": self.esperando, "modelo": self.pool.modelo.huella,
+                         "trabajadores": await self.pool.salud()}
+        if ruta_base == "/metricas" and metodo == "GET":
+            if not self.pool.metricas:
+                return 404, {"error": "Métricas desactivadas (usa --metricas)"}
+            metricas = await asyncio.gather(*(t.pedir("metricas") for t in self.pool.trabajadores))
+            if "formato=prometheus" in consulta:
+                return 200, "".join(formato_prometheus(m) for m in metricas)
+            return 200, {"trabajadores": metricas}
+        try:
+            return await super().atender(metodo, ruta, cuerpo)
+        except ConnectionError as e:
+            return 503, {"error": str(e)}
+
+
+# ----------------------------------- Generador de carga ----------------------------------- #
+
+async def enviar(reader, writer, host: str, session_id: str, texto: str) -> Tuple[int, Dict]:
+    return await pedir_json(reader, writer, host, "/mensaje", {"session_id": session_id, "texto": texto})
+
+
+async def pedir_json(reader, writer, host: str, ruta: str, datos: Dict) -> Tuple[int, Dict]:
+    """POST con cuerpo JSON sobre una conexión abierta; devuelve el status y el JSON de la respuesta"""
+    cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+    writer.write((f"POST {ruta} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(cuerpo)}\r\n\r\n").encode("latin-1") + cuerpo)
+    await writer.drain()
+    cabecera = await reader.readuntil(b"\r\n\r\n")
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    status = int(lineas[0].split(" ")[1])
+    largo = 0
+    for linea in lineas[1:]:
+        if linea.lower().startswith("content-length:"):
+            largo = int(linea.split(":", 1)[1])
+    return status, json.loads(await reader.readexactly(largo))
+
+
+async def cliente(host: str, puerto: int, num: int, n_mensajes: int, latencias: List[float], errores: List[int]):
+    rng = random.Random(num)
+    reader, writer = await asyncio.open_connection(host, puerto)
+    session_id = f"carga-{num}"
+    enviados = 0
+    try:
+        while enviados < n_mensajes:
+            for texto in rng.choice(CONVERSACIONES_CARGA):
+                inicio = time.perf_counter()
+                status, _ = await enviar(reader, writer, host, session_id, texto)
+                latencias.append(time.perf_counter() - inicio)
+                if status != 200:
+                    errores.append(status)
+                enviados += 1
+                if enviados >= n_mensajes:
+                    break
+    finally:
+        writer.close()
+
+
+def percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+async def generar_carga(host: str, puerto: int, n_clientes: int, n_mensajes: int) -> Dict:
+    """Simula n_clientes huéspedes simultáneos, cada uno con su sesión y conexión"""
+    latencias: List[float] = []
+    errores: List[int] = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(host, puerto, i, n_mensajes, latencias, errores) for i in range(n_clientes)))
+    total = time.perf_counter() - inicio
+    return {
+        "clientes": n_clientes,
+        "mensajes": len(latencias),
+        "errores": len(errores),
+        "mensajes_por_segundo": len(latencias) / total,
+        "p50_ms": percentil(latencias, 50) * 1e3,
+        "p99_ms": percentil(latencias, 99) * 1e3,
+    }
+
+
+async def prueba_carga(n_clientes: int, n_mensajes: int, puerto: int, metricas: bool = False):
+    """Levanta el servidor y el generador en el mismo proceso (un solo núcleo)"""
+    servidor = ServidorChatBot(HotelChatBot(instrumentacion=Instrumentacion() if metricas else None))
+    tcp = await servidor.iniciar("127.0.0.1", puerto)
+    puerto = tcp.sockets[0].getsockname()[1]
+    try:
+        resultado = await generar_carga("127.0.0.1", puerto, n_clientes, n_mensajes)
+    finally:
+        tcp.close()
+        await tcp.wait_closed()
+    print(f"Clientes: {resultado['clientes']}  Mensajes: {resultado['mensajes']}  Errores: {resultado['errores']}")
+    print(f"Mensajes/segundo: {resultado['mensajes_por_segundo']:.0f}")
+    print(f"Latencia p50: {resultado['p50_ms']:.2f} ms  p99: {resultado['p99_ms']:.2f} ms")
+    if metricas:
+        for etapa, datos in servidor.bot.metricas()["etapas"].items():
+            print(f"  {etapa:<11} {datos['total']:>7} llamadas  {datos['suma_s'] / datos['total'] * 1e6:>8.1f} us promedio")
+    return resultado
+
+
+async def vaciar_periodicamente(almacen, intervalo: float):
+    """Escribe el búfer del almacén aunque no lleguen mensajes que lo disparen"""
+    while True:
+        await asyncio.sleep(intervalo)
+        almacen.vaciar()
+
+
+async def vigilar_intents_pool(pool: PoolTrabajadores, intervalo: float = 2.0):
+    """Con intents.json nuevo, reinicio escalonado de los trabajadores con el modelo recargado"""
+    firma = RecargadorIntents.firma_archivo()
+    while True:
+        await asyncio.sleep(intervalo)
+        actual = RecargadorIntents.firma_archivo()
+        if actual is not None and actual != firma:
+            firma = actual
+            await pool.reiniciar(recargar=True)
+
+
+async def servir_pool(host: str, puerto: int, n_trabajadores: int, metricas: bool = False,
+                      sesiones: Optional[str] = None, transcripciones: Optional[str] = None,
+                      inventario: Optional[str] = None):
+    # Sin archivo propio, las habitaciones van con las sesiones (o en uno temporal del pool)
+    pool = PoolTrabajadores(n_trabajadores, ruta_sesiones=sesiones, metricas=metricas,
+                            ruta_transcripciones=transcripciones, ruta_inventario=inventario or sesiones)
+    pool.iniciar()
+    servidor = ServidorTrabajadores(pool)
+    tcp = await servidor.iniciar(host, puerto)
+    loop = asyncio.get_running_loop()
+    # SIGHUP: recarga intents.json y reinicia los trabajadores uno a uno
+    loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(pool.reiniciar(recargar=True)))
+    # SIGTERM: deja de aceptar y cierra los trabajadores en orden (con almacén, quedan escritas las sesiones)
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    vigilancia = asyncio.ensure_future(vigilar_intents_pool(pool))
+    print(f"Bot del Hotel Paraíso escuchando en http://{host}:{puerto}/mensaje "
+          f"con {n_trabajadores} trabajadores")
+    try:
+        async with tcp:
+            await tcp.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        vigilancia.cancel()
+        await pool.cerrar()
+
+
+async def servir(host: str, puerto: int, metricas: bool = False, sesiones: Optional[str] = None,
+                 transcripciones: Optional[str] = None, inventario: Optional[str] = None):
+    almacen = AlmacenSQLite(sesiones) if sesiones else None
+    grabador = GrabadorTranscripciones(transcripciones) if transcripciones else None
+    inventario_sqlite = InventarioSQLite(inventario or sesiones) if inventario or sesiones else None
+    bot = HotelChatBot(instrumentacion=Instrumentacion() if metricas else None, almacen=almacen,
+                       grabador=grabador, inventario=inventario_sqlite)
+    servidor = ServidorChatBot(bot)
+    servidor.bot.vigilar_intents()
+    tcp = await servidor.iniciar(host, puerto)
+    print(f"Bot del Hotel Paraíso escuchando en http://{host}:{puerto}/mensaje")
+    vaciado = asyncio.ensure_future(vaciar_periodicamente(almacen, almacen.intervalo)) if almacen else None
+    try:
+        async with tcp:
+            await tcp.serve_forever()
+    finally:
+        # Que ningún turno en curso escriba después de cerrar el almacén
+        servidor.ejecutor.shutdown(wait=True)
+        if almacen is not None:
+            vaciado.cancel()
+            almacen.cerrar()
+        if grabador is not None:
+            grabador.cerrar()
+        bot.inventario.cerrar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor HTTP asíncrono del HotelChatBot")
+    sub = parser.add_subparsers(dest="modo", required=True)
+    p_servir = sub.add_parser("servir", help="Atiende peticiones POST /mensaje")
+    p_servir.add_argument("--host", default="127.0.0.1")
+    p_servir.add_argument("--puerto", type=int, default=8080)
+    p_servir.add_argument("--metricas", action="store_true",
+                          help="mide cada etapa; GET /metricas (?formato=prometheus para texto)")
+    p_servir.add_argument("--sesiones", metavar="ARCHIVO",
+                          help="guarda las sesiones en SQLite para retomarlas tras reiniciar")
+    p_servir.add_argument("--trabajadores", type=int, default=0,
+                          help="procesos que atienden sesiones (0: todo en este proceso); SIGHUP los reinicia")
+    p_servir.add_argument("--transcripciones", metavar="ARCHIVO",
+                          help="graba cada turno en JSONL (.gz para comprimir; con trabajadores, uno por proceso) "
+                               "para reproducirlo con reproducirChatBot.py")
+    p_servir.add_argument("--inventario", metavar="ARCHIVO",
+                          help="reservas en SQLite, compartidas por los trabajadores y guardadas entre reinicios "
+                               "(por omisión, el archivo de --sesiones)")
+    p_carga = sub.add_parser("carga", help="Prueba de carga en proceso: p50/p99 y mensajes/segundo")
+    p_carga.add_argument("--clientes", type=int, default=100)
+    p_carga.add_argument("--mensajes", type=int, default=50, help="mensajes por cliente")
+    p_carga.add_argument("--puerto", type=int, default=0)
+    p_carga.add_argument("--metricas", action="store_true", help="muestra la latencia promedio por etapa")
+    args = parser.parse_args()
+
+    if args.modo == "servir" and args.trabajadores > 0:
+        asyncio.run(servir_pool(args.host, args.puerto, args.trabajadores, args.metricas, args.sesiones,
+                                args.transcripciones, args.inventario))
+    elif args.modo == "servir":
+        asyncio.run(servir(args.host, args.puerto, args.metricas, args.sesiones, args.transcripciones,
+                           args.inventario))
+    else:
+        asyncio.run(prueba_carga(args.clientes, args.mensajes, args.puerto, args.metricas))
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+
+import pytest
+
+import random
+import re
+
+from benchChatBot import LETRAS, match_fuerza_bruta, mensajes_perturbados
+from ChatBot import (HotelChatBot, IntentMatcher, InventarioHabitaciones, InventarioSQLite, ModeloChatBot,
+                     ejemplos_patron, interpretar_fechas, literal_obligatorio, normalizar, normalizar_patron)
+
+SABADO = date(2026, 10, 17)
+DOMINGO = date(2026, 10, 18)
+
+
+def test_este_fin_de_semana_en_sabado_es_el_actual():
+    fechas = interpretar_fechas("este fin de semana", SABADO)
+    assert (fechas.entrada, fechas.salida) == (SABADO, DOMINGO)
+    fechas = interpretar_fechas("proximo fin de semana", SABADO)
+    assert fechas.entrada == date(2026, 10, 23)
+
+
+def test_este_fin_de_semana_en_domingo_es_el_actual():
+    fechas = interpretar_fechas("fin de semana", DOMINGO)
+    assert (fechas.entrada, fechas.salida) == (DOMINGO, DOMINGO + timedelta(days=1))
+    fechas = interpretar_fechas("el proximo fin de semana", DOMINGO)
+    assert fechas.entrada == date(2026, 10, 23)
+
+
+def test_el_ejemplo_de_fechas_de_la_ayuda_se_acepta():
+    bot = HotelChatBot()
+    bot.hoy = lambda: SABADO
+    bot.respond("disponibilidad", "ayuda")
+    ayuda = bot.respond("blabla", "ayuda").mensajes[0]
+    ejemplo = next(linea for linea in ayuda.split("\n") if "/" in linea).strip("- '")
+    respuesta = bot.respond(ejemplo, "ayuda")
+    assert respuesta.estado == "esperando_seleccion_habitacion"
+    assert "ya pasaron" not in " ".join(respuesta.mensajes)
+
+
+def test_inventario_sqlite_compartido_no_vende_dos_veces(tmp_path):
+    ruta = str(tmp_path / "inventario.db")
+    uno, otro = InventarioSQLite(ruta), InventarioSQLite(ruta)
+    entrada, salida = date(2026, 11, 6), date(2026, 11, 8)
+    apartado = uno.apartar("Suite Presidencial", entrada, salida)
+    assert otro.apartar("Suite Presidencial", entrada, salida) is None
+    codigo = uno.confirmar(apartado.id)
+    assert otro.disponibilidad(entrada, salida)["Suite Presidencial"] == 0
+    uno.cerrar()
+    otro.cerrar()
+
+    # La reserva sobrevive a que se cierren todas las conexiones
+    reabierto = InventarioSQLite(ruta)
+    assert reabierto.apartar("Suite Presidencial", entrada, salida) is None
+    assert reabierto.liberar(codigo)
+    assert reabierto.apartar("Suite Presidencial", entrada, salida) is not None
+    assert reabierto.traslapes() == []
+
+
+def bot_eligiendo_habitacion(inventario=None):
+    bot = HotelChatBot(inventario=inventario)
+    bot.hoy = lambda: SABADO
+    bot.respond("disponibilidad", "elegir")
+    respuesta = bot.respond("06/11/2026 al 08/11/2026", "elegir")
+    assert respuesta.estado == "esperando_seleccion_habitacion"
+    return bot
+
+
+@pytest.mark.parametrize("eleccion, tipo", [
+    ("estándar", "Estándar"), ("la básica", "Estándar"), ("superior", "Superior"),
+    ("suite junior", "Suite Junior"), ("presidencial", "Suite Presidencial"),
+    ("sí, la suite presidencial", "Suite Presidencial"),
+])
+def test_se_puede_elegir_cada_tipo_de_habitacion(eleccion, tipo):
+    bot = bot_eligiendo_habitacion()
+    respuesta = bot.respond(eleccion, "elegir")
+    assert respuesta.estado == "esperando_confirmacion_reserva"
+    assert bot.sesiones["elegir"].context["habitacion"] == tipo
+
+
+def test_un_si_sin_tipo_muestra_los_precios_del_inventario():
+    bot = bot_eligiendo_habitacion(InventarioHabitaciones({"Estándar": (2, 900), "Superior": (1, 1500)}))
+    respuesta = bot.respond("sí", "elegir")
+    assert respuesta.estado == "esperando_seleccion_habitacion"
+    assert respuesta.mensajes[-1].split("\n")[1:] == ["- Estándar ($900/noche)", "- Superior ($1,500/noche)"]
+
+
+def casos_prefiltro(intents, rng):
+    """Frases de los patrones, con errores, y cadenas armadas con los literales del prefiltro"""
+    casos = [e for intent in intents for p in intent["patterns"] for e in ejemplos_patron(p)]
+    casos += [texto for texto, _ in mensajes_perturbados(intents, rng)]
+    literales = sorted({literal_obligatorio(normalizar_patron(p)) for intent in intents for p in intent["patterns"]}
+                       - {None})
+    for literal in literales:
+        otro = rng.choice(literales)
+        casos += [literal, literal[:-1], literal[1:], f"x{literal}x", literal + otro, f"{otro} {literal}",
+                  literal.upper(), " ".join(literal)]
+    casos += ["".join(rng.choice(LETRAS + "   ") for _ in range(rng.randint(0, 40))) for _ in range(300)]
+    return [normalizar(texto) for texto in casos]
+
+
+def test_el_prefiltro_da_los_mismos_intents_que_la_fuerza_bruta():
+    rng = random.Random(12)
+    intents = ModeloChatBot().intents
+    matcher = IntentMatcher(intents)
+    # Fuerza bruta: cada patrón por separado, sin combinar ni prefiltrar
+    por_patron = [(intent, [re.compile(normalizar_patron(p)) for p in intent["patterns"]])
+                  for intent in intents if intent["patterns"]]
+    casos = casos_prefiltro(intents, rng)
+    assert len(casos) > 2000
+    for texto in casos:
+        esperado = [intent["tag"] for intent, regexes in por_patron if any(r.search(texto) for r in regexes)]
+        assert [i["tag"] for i in matcher.coincidencias(texto)] == esperado, texto
+        assert [i["tag"] for i in matcher.coincidencias_sin_prefiltro(texto)] == esperado, texto
+    # El match_intent original recompila cada patrón (~0.1 s por mensaje): sólo una muestra
+    for texto in rng.sample(casos, 40):
+        esperado, obtenido = match_fuerza_bruta(intents, texto), matcher.match(texto)
+        assert (esperado and esperado["tag"]) == (obtenido and obtenido["tag"]), texto
@@ -0,0 +1,120 @@
+import os
+
+from aprendizaje20Q import Aprendiz, Bitacora
+from motor20Q import Arbol20Q, Estado20Q, paso
+
+
+def terminar(arbol, partida=""):
+    """Partida que contesta siempre 'n' hasta la primera adivinanza"""
+    estado, salida = paso(arbol, Estado20Q(partida=partida))
+    while salida.tipo != "adivinanza":
+        estado, salida = paso(arbol, estado, "n")
+    return estado, salida.texto
+
+
+def test_dos_partidas_aprenden_en_la_misma_hoja(tmp_path):
+    aprendiz = Aprendiz(Arbol20Q.cargar(), Bitacora(str(tmp_path / "bitacora.jsonl")))
+    arbol = aprendiz.arbol
+    uno, hoja = terminar(arbol)
+    otro = arbol.serializar_estado(uno)
+
+    aprendiz.aprender(arbol, uno, "Un dragón", "¿Escupe fuego?", True)
+    # La segunda partida terminó en la misma hoja antes de que la primera enseñara
+    aprendiz.aprender(arbol, arbol.deserializar_estado(otro), "Una sirena", "¿Vive en el mar?", True)
+    assert (aprendiz.aprendidos, aprendiz.conflictos) == (2, 0)
+
+    def final(respuestas):
+        return paso(arbol, arbol.deserializar_estado(f"{otro}{respuestas}"))[1].texto
+
+    assert final("s") == "Un dragón"
+    assert final("ns") == "Una sirena"
+    assert final("nn") == hoja
+
+    # Otro proceso que lee la misma bitácora llega al mismo árbol
+    copia = Aprendiz(Arbol20Q.cargar(), Bitacora(aprendiz.bitacora.ruta))
+    assert copia.arbol.como_dict() == arbol.como_dict()
+
+
+def test_instantanea_y_reintentos(tmp_path, monkeypatch):
+    ruta, instantanea = str(tmp_path / "bitacora.jsonl"), str(tmp_path / "bitacora.instantanea")
+    aprendiz = Aprendiz(Arbol20Q.cargar(), Bitacora(ruta), instantanea)
+    arbol = aprendiz.arbol
+    estado, _ = terminar(arbol, "a1")
+    # El cliente reintenta el último turno y después la enseñanza
+    aprendiz.registrar_partida(arbol, estado)
+    aprendiz.registrar_partida(arbol, estado)
+    aprendiz.aprender(arbol, estado, "Un dragón", "¿Escupe fuego?", True)
+    aprendiz.aprender(arbol, estado, "Un dragón", "¿Escupe fuego?", True)
+    assert aprendiz.aprendidos == 1
+    dragon = arbol.si[estado.nodo]
+    assert arbol.texto(arbol.hoja[dragon]) == "Un dragón"
+    assert aprendiz.frecuencias == {dragon: 1}
+    aprendiz.pedir_rebalanceo()
+    aprendiz.cerrar()
+
+    aplicados = []
+    monkeypatch.setattr(Aprendiz, "aplicar_aprendizaje", lambda self, registro: aplicados.append(registro))
+    retomado = Aprendiz(Arbol20Q.cargar(), Bitacora(ruta), instantanea)
+    assert aplicados == []
+    assert retomado.bitacora.posicion == os.path.getsize(ruta)
+    assert retomado.arbol.como_dict() == aprendiz.arbol.como_dict()
+    assert list(retomado.anteriores) == list(aprendiz.anteriores)
+    assert retomado.traslados == aprendiz.traslados != {}
+    assert retomado.frecuencias == aprendiz.frecuencias and retomado.aprendidos == 1
+    # Un reintento que llega después de la instantánea tampoco cuenta
+    retomado.registrar_partida(arbol, estado)
+    retomado.sincronizar()
+    assert retomado.frecuencias == aprendiz.frecuencias
+    retomado.cerrar()
+
+
+def jugada(arbol, respuestas):
+    return arbol.deserializar_estado(f"{arbol.huella}.{respuestas}")
+
+
+def test_hojas_con_el_mismo_texto_se_distinguen_despues_de_rebalancear(tmp_path):
+    aprendiz = Aprendiz(Arbol20Q.cargar(), Bitacora(str(tmp_path / "bitacora.jsonl")))
+    viejo = aprendiz.arbol
+    # Dos hojas vacías (donde el juego se rinde): una bajo "¿Es más una emoción de
+    # juicio social?" y otra bajo "Q3: ¿Es un concepto espiritual o religioso?"
+    social, espiritual = jugada(viejo, "nssnssnn"), jugada(viejo, "nsnnnnn")
+    assert viejo.hoja[social.nodo] == viejo.hoja[espiritual.nodo]
+    for _ in range(3):
+        aprendiz.registrar_partida(viejo, social)
+    aprendiz.registrar_partida(viejo, espiritual)
+    aprendiz.sincronizar()
+    assert aprendiz.frecuencias == {social.nodo: 3, espiritual.nodo: 1}
+
+    # Otro proceso rebalancea entre el final de la partida y la enseñanza: lo
+    # espiritual, que era la última alternativa de su cadena, pasa a ser la primera
+    religioso = jugada(viejo, "nsnnnns")
+    while not viejo.es_hoja(religioso.nodo):
+        religioso = jugada(viejo, religioso.respuestas + "n")
+    for _ in range(5):
+        aprendiz.registrar_partida(viejo, religioso)
+    aprendiz.pedir_rebalanceo()
+    arbol = aprendiz.arbol
+    assert arbol.huella != viejo.huella
+    aprendiz.aprender(viejo, espiritual, "Un robot", "¿Es una máquina?", True)
+    assert (aprendiz.aprendidos, aprendiz.conflictos) == (1, 0)
+
+    robot = next(n for n in range(len(arbol)) if arbol.es_hoja(n) and arbol.texto(arbol.hoja[n]) == "Un robot")
+    padres = {hijo: (n, r) for n in range(len(arbol)) if not arbol.es_hoja(n)
+              for hijo, r in ((arbol.si[n], "s"), (arbol.no[n], "n"))}
+    camino, nodo = set(), robot
+    while nodo in padres:
+        nodo, r = padres[nodo]
+        camino.add((arbol.textos[arbol.pregunta[nodo]], r))
+    assert ("Q3: ¿Es un concepto espiritual o religioso?", "n") in camino
+    assert not any("juicio social" in pregunta for pregunta, _ in camino)
+    # La hoja vacía bajo juicio social conserva sus partidas; la espiritual pasó al robot
+    assert sorted(aprendiz.frecuencias.values()) == [1, 3, 5]
+    assert aprendiz.frecuencias[robot] == 1
+
+
+def test_hoja_repetida_de_un_arbol_olvidado_es_conflicto(tmp_path):
+    aprendiz = Aprendiz(Arbol20Q.cargar(), Bitacora(str(tmp_path / "bitacora.jsonl")))
+    aprendiz.bitacora.agregar({"t": "aprende", "base": "00000000", "ruta": "nsnnnnn", "hoja": "",
+                               "objeto": "Un robot", "pregunta": "¿Es una máquina?", "si": True})
+    aprendiz.sincronizar()
+    assert (aprendiz.aprendidos, aprendiz.conflictos) == (0, 1)
@@ -0,0 +1,33 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from ChatBot import GrabadorTranscripciones, HotelChatBot
+
+RAIZ = Path(__file__).resolve().parent
+
+
+def test_opciones_cambiadas_se_reportan_como_divergencia(tmp_path):
+    ruta = tmp_path / "spa.jsonl"
+    grabador = GrabadorTranscripciones(str(ruta))
+    bot = HotelChatBot(grabador=grabador)
+    for mensaje in ("masajes", "2", "salir"):
+        bot.respond(mensaje, "spa")
+    grabador.cerrar()
+
+    # Sólo cambian las opciones ofrecidas: mensajes, estado e intent quedan iguales
+    lineas = ruta.read_text(encoding="utf-8").splitlines()
+    turnos = [json.loads(linea) for linea in lineas[1:]]
+    cambiado = next(turno for turno in turnos if turno["o"])
+    cambiado["o"] = cambiado["o"][::-1]
+    ruta.write_text("\n".join([lineas[0]] + [json.dumps(t, ensure_ascii=False) for t in turnos]) + "\n",
+                    encoding="utf-8")
+
+    salida = tmp_path / "divergencias.jsonl"
+    resultado = subprocess.run([sys.executable, str(RAIZ / "reproducirChatBot.py"), str(ruta), "-o", str(salida)],
+                               cwd=RAIZ, capture_output=True, text=True)
+    assert resultado.returncode == 1, resultado.stderr
+    assert "opciones: 1" in resultado.stdout
+    divergencias = [json.loads(linea) for linea in salida.read_text(encoding="utf-8").splitlines()]
+    assert [d["campos"] for d in divergencias] == [["o"]]
@@ -0,0 +1,393 @@
+import argparse
+import asyncio
+import bisect
+import gc
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from ChatBot import (AlmacenSQLite, GrabadorTranscripciones, HotelChatBot, Instrumentacion, InventarioSQLite,
+                     SesionChat, cargar_modelo, cargar_modelo_validado)
+
+VNODOS = 160             # puntos de cada trabajador en el anillo; reparten las sesiones parejo
+MAX_LOTE = 256           # mensajes máximos que viajan juntos a un trabajador
+TIMEOUT_TERMINAR = 10.0  # segundos que se espera a que un trabajador entregue sus sesiones
+
+# fork: los hijos heredan el modelo ya cargado y lo comparten copy-on-write
+_ctx = multiprocessing.get_context("fork")
+
+
+def posicion(clave: str) -> int:
+    """Posición estable en el anillo (hash() de Python cambia entre procesos)"""
+    return int.from_bytes(hashlib.blake2b(clave.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class AnilloHash:
+    """Hashing consistente de session_id -> trabajador.
+
+    Cada trabajador ocupa VNODOS puntos del anillo y una sesión va al primer
+    punto que sigue a su hash. Así el estado de una conversación vive siempre
+    en el mismo proceso, y si cambia el número de trabajadores sólo se mueve
+    la fracción de sesiones que le toca al que entra o sale.
+    """
+
+    def __init__(self, nodos: Iterable[int], vnodos: int = VNODOS):
+        puntos = sorted((posicion(f"{nodo}#{v}"), nodo) for nodo in nodos for v in range(vnodos))
+        self.posiciones = [p for p, _ in puntos]
+        self.nodos = [n for _, n in puntos]
+
+    def nodo(self, clave: str) -> int:
+        i = bisect.bisect(self.posiciones, posicion(clave))
+        return self.nodos[i % len(self.nodos)]
+
+
+def ruta_por_proceso(ruta: str) -> str:
+    """transcripciones.jsonl.gz -> transcripciones.<pid>.jsonl.gz: cada trabajador escribe su archivo"""
+    carpeta, nombre = os.path.split(ruta)
+    base, punto, extension = nombre.partition(".")
+    return os.path.join(carpeta, f"{base}.{os.getpid()}{punto}{extension}")
+
+
+def _trabajador(conexion, modelo, sesiones: Dict[str, str], ruta_sesiones: Optional[str],
+                metricas: bool, heredadas: List, ruta_transcripciones: Optional[str] = None,
+                ruta_inventario: str = "inventario.db"):
+    """Cuerpo del proceso hijo: atiende lotes hasta que le piden terminar"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # el padre decide cuándo se termina
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    for otra in heredadas:
+        otra.close()
+
+    almacen = AlmacenSQLite(ruta_sesiones) if ruta_sesiones else None
+    grabador = GrabadorTranscripciones(ruta_por_proceso(ruta_transcripciones)) if ruta_transcripciones else None
+    # Las habitaciones son unas para todos: cada trabajador abre el mismo archivo
+    inventario = InventarioSQLite(ruta_inventario)
+    bot = HotelChatBot(modelo=modelo, almacen=almacen, grabador=grabador, inventario=inventario,
+                       instrumentacion=Instrumentacion() if metricas else None)
+    for session_id, datos in sesiones.items():
+        bot.sesiones[session_id] = SesionChat.deserializar(datos)
+    atendidos = 0
+
+    while True:
+        if almacen is not None and not conexion.poll(almacen.intervalo):
+            almacen.vaciar()
+            continue
+        try:
+            orden, carga = conexion.recv()
+        except EOFError:
+            break
+        if orden == "lote":
+            respuestas = []
+            for session_id, texto in carga:
+                respuesta = bot.respond(texto, session_id)
+                respuestas.append({"session_id": session_id, "mensajes": respuesta.mensajes,
+                                   "estado": respuesta.estado, "opciones": respuesta.opciones})
+            atendidos += len(carga)
+            conexion.send(respuestas)
+        elif orden == "salud":
+            conexion.send({"pid": os.getpid(), "atendidos": atendidos, "sesiones": len(bot.sesiones),
+                           "cache": bot.cache.estadisticas(), "modelo": bot.modelo.huella})
+        elif orden == "metricas":
+            conexion.send(bot.metricas())
+        elif orden == "terminar":
+            # Las sesiones viajan al reemplazo; con almacén además quedan escritas
+            if almacen is not None:
+                almacen.cerrar()
+            if grabador is not None:
+                grabador.cerrar()
+            inventario.cerrar()
+            conexion.send({sid: sesion.serializar() for sid, sesion in bot.sesiones.items()})
+            break
+    conexion.close()
+
+
+class Trabajador:
+    """Un proceso hijo visto desde el padre.
+
+    Los mensajes que llegan mientras el trabajador está ocupado se juntan y
+    viajan en un solo lote cuando responde, así el costo del pipe se reparte
+    entre muchos mensajes cuando hay carga y no agrega espera cuando no la hay.
+    """
+
+    def __init__(self, slot: int, pool: "PoolTrabajadores"):
+        self.slot = slot
+        self.pool = pool
+        self.proceso = None
+        self.conexion = None
+        self.cola: List = []             # (session_id, texto, futuro) que esperan lote
+        self.en_vuelo: deque = deque()   # por cada envío: lista de futuros (lote) o un futuro (orden)
+        self.lotes_en_vuelo = 0
+        self.pausado = False
+        self.reinicios = 0
+
+    def arrancar(self, sesiones: Dict[str, str]):
+        padre, hijo = _ctx.Pipe()
+        heredadas = [t.conexion for t in self.pool.trabajadores if t.conexion is not None]
+        self.proceso = _ctx.Process(target=_trabajador, name=f"chatbot-{self.slot}", daemon=True,
+                                    args=(hijo, self.pool.modelo, sesiones, self.pool.ruta_sesiones,
+                                          self.pool.metricas, heredadas, self.pool.ruta_transcripciones,
+                                          self.pool.ruta_inventario))
+        self.proceso.start()
+        hijo.close()
+        self.conexion = padre
+        asyncio.get_running_loop().add_reader(padre.fileno(), self.recibir)
+
+    def enviar(self, session_id: str, texto: str) -> asyncio.Future:
+        futuro = asyncio.get_running_loop().create_future()
+        self.cola.append((session_id, texto, futuro))
+        if len(self.cola) == 1 and not self.lotes_en_vuelo:
+            # Se despacha al final de esta vuelta del loop, junto con lo que llegue en ella
+            asyncio.get_running_loop().call_soon(self.despachar)
+        return futuro
+
+    def despachar(self):
+        if self.pausado or self.lotes_en_vuelo or not self.cola:
+            return
+        lote, self.cola = self.cola[:MAX_LOTE], self.cola[MAX_LOTE:]
+        self.en_vuelo.append([futuro for _, _, futuro in lote])
+        self.lotes_en_vuelo += 1
+        self.conexion.send(("lote", [(session_id, texto) for session_id, texto, _ in lote]))
+
+    def pedir(self, orden: str) -> asyncio.Future:
+        futuro = asyncio.get_running_loop().create_future()
+        self.en_vuelo.append(futuro)
+        self.conexion.send((orden, None))
+        return futuro
+
+    def recibir(self):
+        try:
+            datos = self.conexion.recv()
+        except (EOFError, OSError):
+            if self.pausado:
+                self.desconectar()  # cerró tras entregar sus sesiones
+            else:
+                self.caido()
+            return
+        pendiente = self.en_vuelo.popleft()
+        if isinstance(pendiente, list):
+            self.lotes_en_vuelo -= 1
+            for futuro, respuesta in zip(pendiente, datos):
+                if not futuro.done():
+                    futuro.set_result(respuesta)
+            self.despachar()
+        elif not pendiente.done():
+            pendiente.set_result(datos)
+
+    def desconectar(self):
+        asyncio.get_running_loop().remove_reader(self.conexion.fileno())
+        self.conexion.close()
+        self.conexion = None
+
+    def caido(self):
+        """El proceso murió sin avisar: falla lo que tenía en curso y se levanta otro"""
+        self.desconectar()
+        self.proceso.join(1)
+        print(f"Trabajador {self.slot} (pid {self.proceso.pid}) terminó con código {self.proceso.exitcode}; "
+              f"se reinicia sin sus sesiones en memoria", file=sys.stderr)
+        while self.en_vuelo:
+            pendiente = self.en_vuelo.popleft()
+            for futuro in pendiente if isinstance(pendiente, list) else [pendiente]:
+                if not futuro.done():
+                    futuro.set_exception(ConnectionError(f"trabajador {self.slot} caído"))
+        self.lotes_en_vuelo = 0
+        self.reinicios += 1
+        self.arrancar({})
+        self.despachar()
+
+    async def terminar(self) -> Dict[str, str]:
+        """Deja de mandarle lotes, espera lo que tiene en curso y recoge sus sesiones"""
+        self.pausado = True
+        try:
+            sesiones = await asyncio.wait_for(self.pedir("terminar"), TIMEOUT_TERMINAR)
+        except (asyncio.TimeoutError, ConnectionError):
+            sesiones = {}
+        if self.conexion is not None:
+            self.desconectar()
+        self.proceso.join(TIMEOUT_TERMINAR)
+        if self.proceso.is_alive():
+            self.proceso.kill()
+        return sesiones
+
+    async def reiniciar(self):
+        """Reinicio ordenado: los mensajes que llegan mientras tanto esperan en la cola"""
+        sesiones = await self.terminar()
+        self.arrancar(sesiones)
+        self.reinicios += 1
+        self.pausado = False
+        self.despachar()
+
+
+class PoolTrabajadores:
+    """N procesos que atienden sesiones en paralelo sobre un mismo modelo cargado una vez.
+
+    El padre carga el modelo y hace fork; los hijos lo comparten copy-on-write
+    (gc.freeze evita que el recolector toque sus páginas y las duplique). Cada
+    sesión va siempre al mismo trabajador por hashing consistente, así que su
+    estado no sale de ese proceso salvo en un reinicio, donde se entrega al
+    reemplazo.
+
+    Las habitaciones, en cambio, las venden todos: el inventario es un
+    InventarioSQLite en ruta_inventario que abren todos los trabajadores. Sin
+    ruta, el pool usa un archivo temporal que dura lo que dura el pool (los
+    reinicios de trabajadores no pierden reservas, el proceso padre sí).
+    """
+
+    def __init__(self, n_trabajadores: int, corrector: str = "symspell",
+                 ruta_sesiones: Optional[str] = None, metricas: bool = False,
+                 ruta_transcripciones: Optional[str] = None, ruta_inventario: Optional[str] = None):
+        self.corrector = corrector
+        self.ruta_sesiones = ruta_sesiones
+        self.ruta_transcripciones = ruta_transcripciones
+        self.inventario_temporal = ruta_inventario is None
+        if ruta_inventario is None:
+            descriptor, ruta_inventario = tempfile.mkstemp(prefix="inventario-", suffix=".db")
+            os.close(descriptor)
+        self.ruta_inventario = ruta_inventario
+        self.metricas = metricas
+        self.modelo = cargar_modelo(corrector)
+        self.anillo = AnilloHash(range(n_trabajadores))
+        self.trabajadores: List[Trabajador] = [Trabajador(i, self) for i in range(n_trabajadores)]
+        self.reiniciando = asyncio.Lock()
+
+    def iniciar(self):
+        gc.collect()
+        gc.freeze()
+        for trabajador in self.trabajadores:
+            trabajador.arrancar({})
+
+    def trabajador_de(self, session_id: str) -> Trabajador:
+        return self.trabajadores[self.anillo.nodo(session_id)]
+
+    def responder(self, session_id: str, texto: str) -> asyncio.Future:
+        return self.trabajador_de(session_id).enviar(session_id, texto)
+
+    async def reiniciar(self, recargar: bool = False) -> bool:
+        """Reinicio escalonado: uno a la vez, sin perder sesiones ni mensajes.
+
+        Con recargar, antes se arma el modelo desde intents.json y los nuevos
+        trabajadores nacen con él; si el archivo no es válido no se reinicia nada.
+        El modelo se arma en un hilo del ejecutor para que el loop siga
+        repartiendo mensajes a los trabajadores actuales mientras tanto.
+        """
+        async with self.reiniciando:
+            if recargar:
+                try:
+                    self.modelo = await asyncio.get_running_loop().run_in_executor(
+                        None, cargar_modelo_validado, self.corrector)
+                except (OSError, ValueError) as e:
+                    print(f"Recarga rechazada, se conserva el modelo anterior: {e}", file=sys.stderr)
+                    return False
+                gc.collect()
+                gc.freeze()
+            for trabajador in self.trabajadores:
+                await trabajador.reiniciar()
+            return True
+
+    async def salud(self) -> List[Dict]:
+        estados = await asyncio.gather(*(t.pedir("salud") for t in self.trabajadores), return_exceptions=True)
+        resultado = []
+        for trabajador, estado in zip(self.trabajadores, estados):
+            if isinstance(estado, Exception):
+                estado = {"error": str(estado)}
+            estado.update(slot=trabajador.slot, reinicios=trabajador.reinicios, cola=len(trabajador.cola))
+            resultado.append(estado)
+        return resultado
+
+    async def cerrar(self):
+        await asyncio.gather(*(t.terminar() for t in self.trabajadores))
+        if self.inventario_temporal:
+            for sufijo in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.ruta_inventario + sufijo)
+                except FileNotFoundError:
+                    pass
+
+
+# ------------------------------------ Escalamiento ------------------------------------ #
+
+async def conducir(pool: PoolTrabajadores, conversaciones: List[List[str]], n_sesiones: int,
+                   n_mensajes: int, latencias: List[float]):
+    """n_sesiones huéspedes simultáneos; cada uno espera la respuesta antes de su siguiente mensaje"""
+    por_sesion = n_mensajes // n_sesiones
+
+    async def huesped(num: int):
+        rng = random.Random(num)
+        session_id = f"escala-{num}"
+        enviados = 0
+        while enviados < por_sesion:
+            for texto in rng.choice(conversaciones):
+                inicio = time.perf_counter()
+                await pool.responder(session_id, texto)
+                latencias.append(time.perf_counter() - inicio)
+                enviados += 1
+                if enviados >= por_sesion:
+                    break
+
+    await asyncio.gather(*(huesped(i) for i in range(n_sesiones)))
+
+
+async def medir_escala(n_trabajadores: int, conversaciones: List[List[str]], n_sesiones: int,
+                       n_mensajes: int) -> Dict:
+    pool = PoolTrabajadores(n_trabajadores)
+    pool.iniciar()
+    try:
+        await conducir(pool, conversaciones, n_sesiones, min(n_mensajes, 50 * n_sesiones), [])  # calentamiento
+        latencias: List[float] = []
+        inicio = time.perf_counter()
+        await conducir(pool, conversaciones, n_sesiones, n_mensajes, latencias)
+        transcurrido = time.perf_counter() - inicio
+    finally:
+        await pool.cerrar()
+    ordenadas = sorted(latencias)
+    return {
+        "trabajadores": n_trabajadores,
+        "mensajes": len(latencias),
+        "mensajes_por_segundo": len(latencias) / transcurrido,
+        "p50_ms": ordenadas[len(ordenadas) // 2] * 1e3,
+        "p99_ms": ordenadas[min(len(ordenadas) - 1, int(0.99 * len(ordenadas)))] * 1e3,
+    }
+
+
+async def escalar(maximo: int, n_sesiones: int, n_mensajes: int, semilla: int) -> List[Dict]:
+    """Mensajes/segundo con 1, 2, ... maximo trabajadores y la misma carga"""
+    from cargaChatBot import ESCENARIOS, GeneradorConversaciones
+
+    bot = HotelChatBot()
+    generador = GeneradorConversaciones(bot, random.Random(semilla))
+    escenarios, pesos = list(ESCENARIOS), list(ESCENARIOS.values())
+    conversaciones = [generador.conversacion(e) for e in generador.rng.choices(escenarios, pesos, k=5000)]
+
+    resultados = []
+    for n in range(1, maximo + 1):
+        resultado = await medir_escala(n, conversaciones, n_sesiones, n_mensajes)
+        resultado["aceleracion"] = resultado["mensajes_por_segundo"] / (resultados or [resultado])[0]["mensajes_por_segundo"]
+        resultado["eficiencia"] = resultado["aceleracion"] / n
+        resultados.append(resultado)
+        print(f"{n:>3} trabajadores: {resultado['mensajes_por_segundo']:>8.0f} mensajes/s  "
+              f"x{resultado['aceleracion']:.2f} ({resultado['eficiencia']:.0%})  "
+              f"p50 {resultado['p50_ms']:.2f} ms  p99 {resultado['p99_ms']:.2f} ms")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escalamiento del pool de trabajadores de 1 a N núcleos")
+    parser.add_argument("--maximo", type=int, default=os.cpu_count() or 1, help="trabajadores en la última medición")
+    parser.add_argument("--sesiones", type=int, default=500, help="huéspedes simultáneos")
+    parser.add_argument("--mensajes", type=int, default=40000, help="mensajes por medición")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("-o", "--salida", help="archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    print(f"Núcleos disponibles: {os.cpu_count()}")
+    resultados = asyncio.run(escalar(args.maximo, args.sesiones, args.mensajes, args.semilla))
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"nucleos": os.cpu_count(), "parametros": vars(args), "resultados": resultados},
+                      f, ensure_ascii=False, indent=2)